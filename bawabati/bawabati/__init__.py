@@ -0,0 +1,7 @@
+# Prefer mysqlclient (the C driver Django recommends); PyMySQL is only a
+# pure-Python fallback for machines where mysqlclient cannot be built.
+try:
+    import MySQLdb  # noqa: F401
+except ImportError:
+    import pymysql
+    pymysql.install_as_MySQLdb()
@@ -1,6 +1,3 @@
-import pymysql
-pymysql.install_as_MySQLdb()
-
 """
 Django settings for bawabati project.
 
@@ -14,6 +11,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
+import json
 import os
 from dotenv import load_dotenv
 
@@ -59,6 +58,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'bawabati_app.middleware.TenantMiddleware',
+    'bawabati_app.middleware.MetricsMiddleware',
+    'bawabati_app.middleware.ProfilingMiddleware',
+    'bawabati_app.middleware.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.middleware.common.CommonMiddleware',
@@ -73,7 +76,8 @@ ROOT_URLCONF = 'bawabati.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend with render timing for the request metrics
+        'BACKEND': 'bawabati_app.metrics.MeteredDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],  # Add templates directory
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,13 +91,17 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'bawabati.wsgi.application'
+ASGI_APPLICATION = 'bawabati.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# The engine is Django's MySQL backend plus a process-wide connection pool
+# (bawabati_app/db_backends/pool.py); connections are returned to the pool at
+# the end of each request instead of being closed.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'bawabati_app.db_backends.mysql',
         'NAME': os.getenv('DB_NAME', 'bawabati_db'),
         'USER': os.getenv('DB_USER', 'root'),
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
@@ -102,10 +110,83 @@ DATABASES = {
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
-        }
+        },
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_SIZE', 10)),
+            'MAX_IDLE_TIME': 300,
+        },
     }
 }
 
+# Read replicas: a comma-separated list of hosts sharing the primary's credentials
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = {**DATABASES['default'], 'HOST': _host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+# Schools served by this deployment, see bawabati_app/tenancy.py. TENANTS is a
+# JSON object mapping each school's slug to its hosts and to the keys of the
+# default database settings its own database overrides, e.g.
+# {"north": {"HOSTS": ["north.example.edu"], "DATABASE": {"NAME": "bawabati_north"}}}
+TENANTS = json.loads(os.getenv('TENANTS', '{}'))
+for _slug, _tenant in TENANTS.items():
+    DATABASES[f'tenant_{_slug}'] = {**DATABASES['default'], **_tenant.get('DATABASE', {})}
+
+TENANCY = {
+    'HEADER': os.getenv('TENANT_HEADER') or None,
+    'REQUIRED': os.getenv('TENANT_REQUIRED', 'False') == 'True',
+}
+
+DATABASE_ROUTERS = ['bawabati_app.tenancy.TenantRouter', 'bawabati_app.routers.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it wrote
+REPLICA_PIN_SECONDS = 5
+
+# Caches: locmem by default, which is only right for a single process. With
+# several workers, point CACHE_BACKEND/CACHE_LOCATION at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache): object cache invalidations
+# (bawabati_app/object_cache.py) and token revocations only reach the other
+# workers through it.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'bawabati'),
+        # Keeps each tenant's entries apart
+        'KEY_FUNCTION': 'bawabati_app.tenancy.make_cache_key',
+    },
+    # Sessions, when SESSION_MODE is 'cached'; must be shared between workers
+    'sessions': {
+        'BACKEND': os.getenv('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('SESSION_CACHE_LOCATION', 'bawabati-sessions'),
+        'KEY_FUNCTION': 'bawabati_app.tenancy.make_cache_key',
+    },
+}
+
+# Where sessions live, see bawabati_app/sessions.py: 'db' (the django_session
+# table), 'cached' (that table read through the sessions cache) or 'signed'
+# (a signed cookie, no server-side storage). 'cached' is the default only
+# once the sessions cache is shared: with a per-process cache, a logout would
+# not reach the other workers.
+_SHARED_SESSION_CACHE = not CACHES['sessions']['BACKEND'].endswith('.LocMemCache')
+SESSION_MODE = os.getenv('SESSION_MODE', 'cached' if _SHARED_SESSION_CACHE else 'db')
+SESSION_ENGINE = f'bawabati_app.session_backends.{SESSION_MODE}'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSIONS = {
+    # Lifetime of sessions in a process-local sessions cache (development only)
+    'LOCAL_TIMEOUT': int(os.getenv('SESSION_LOCAL_TIMEOUT', 60)),
+    # Seconds between background purges of expired sessions
+    'PURGE_INTERVAL': int(os.getenv('SESSION_PURGE_INTERVAL', 60 * 60)),
+}
+
+# Two-tier object cache, see bawabati_app/object_cache.py
+OBJECT_CACHE = {
+    'TIMEOUT': 300,
+    'LOCAL_MAX_ENTRIES': 1000,
+    'LOCAL_TTL': 30,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,6 +205,70 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher is used for new passwords; older hashes are upgraded to it on
+# the next successful login. Django's other default hashers stay listed so
+# that existing Argon2 and bcrypt hashes still verify (and get upgraded).
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Login throttling, see bawabati_app/throttling.py for all options
+LOGIN_THROTTLE = {
+    'STORE': os.getenv('LOGIN_THROTTLE_STORE', 'memory'),
+}
+
+# Live update broker for api/events/, see bawabati_app/events.py. Use 'cache'
+# with a shared CACHES backend when running several ASGI workers.
+EVENTS = {
+    'BROKER': os.getenv('EVENTS_BROKER', 'memory'),
+}
+
+
+# On-demand request profiling, see bawabati_app/profiling.py for all options.
+# Each tenant's profiles are kept in its own directory under DIR.
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', 'True') == 'True',
+    'DIR': os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles')),
+}
+
+
+# Request metrics served on api/metrics/, see bawabati_app/metrics.py. Set
+# METRICS_DIR to a directory shared by the workers (and emptied on deploy) to
+# report every worker process, not only the one answering the scrape.
+METRICS = {
+    'DIR': os.getenv('METRICS_DIR') or None,
+}
+
+
+# Resumable note uploads, see bawabati_app/uploads.py. Run
+# `manage.py purge_uploads` periodically to remove abandoned partial uploads.
+UPLOADS = {
+    'DIR': os.getenv('UPLOADS_DIR', os.path.join(BASE_DIR, 'media', 'uploads')),
+    'CHUNK_SIZE': int(os.getenv('UPLOADS_CHUNK_SIZE', 8 * 1024 * 1024)),
+}
+
+
+# Semester report card archives, see bawabati_app/report_cards.py. They hold
+# every student's grades: keep REPORT_CARDS_DIR out of MEDIA_ROOT and any other
+# publicly served directory; admins download them through the API.
+REPORT_CARDS = {
+    'DIR': os.getenv('REPORT_CARDS_DIR', os.path.join(BASE_DIR, 'report_cards')),
+}
+
+
+# Static course catalogue, see bawabati_app/catalogue.py. Course changes
+# republish it; serve CATALOGUE_DIR from any static host or CDN, with
+# catalogue.json revalidated and shards/ cached forever.
+CATALOGUE = {
+    'DIR': os.getenv('CATALOGUE_DIR', os.path.join(BASE_DIR, 'catalogue')),
+    'URL': os.getenv('CATALOGUE_URL', '/catalogue/'),
+    'AUTO_PUBLISH': os.getenv('CATALOGUE_AUTO_PUBLISH', 'True') == 'True',
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -142,14 +287,27 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_DIRS = [
-    os.path.join(BASE_DIR, 'static'),
-]
+# Project-wide assets, once there are any, and the React production build
+# (npm run build:django) collected under frontend/; a missing directory is
+# left out rather than warned about (staticfiles.W004)
+STATICFILES_DIRS = []
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+if os.path.isdir(STATIC_DIR):
+    STATICFILES_DIRS.append(STATIC_DIR)
+FRONTEND_BUILD_DIR = os.path.join(BASE_DIR, 'frontend', 'build')
+if os.path.isdir(FRONTEND_BUILD_DIR):
+    STATICFILES_DIRS.append(('frontend', FRONTEND_BUILD_DIR))
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    # Each tenant's media in its own directory under MEDIA_ROOT
+    'default': {'BACKEND': 'bawabati_app.tenancy.TenantFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -173,12 +331,36 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'bawabati_app.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Chosen by the Accept header; JSON stays the default
+    'DEFAULT_RENDERER_CLASSES': [
+        'bawabati_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'bawabati_app.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+# application/msgpack is only offered with the optional msgpack package
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'bawabati_app.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('bawabati_app.renderers.MessagePackParser')
+
+# Signed API token lifetimes (seconds)
+API_TOKEN_ACCESS_LIFETIME = int(os.getenv('API_TOKEN_ACCESS_LIFETIME', 15 * 60))
+API_TOKEN_REFRESH_LIFETIME = int(os.getenv('API_TOKEN_REFRESH_LIFETIME', 7 * 24 * 60 * 60))
+# How long a worker trusts its cached token version: the longest a revoked
+# token keeps working on the other workers unless the default cache is shared
+API_TOKEN_VERSION_CACHE_TIMEOUT = int(os.getenv('API_TOKEN_VERSION_CACHE_TIMEOUT', 30))
+
+# Threads available to in-process background jobs (bawabati_app/jobs.py)
+BACKGROUND_JOB_WORKERS = int(os.getenv('BACKGROUND_JOB_WORKERS', 2))
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
@@ -0,0 +1,36 @@
+"""
+Production settings: the development settings without the development extras.
+
+    DJANGO_SETTINGS_MODULE=bawabati.settings_production gunicorn bawabati.wsgi
+
+* DEBUG is off and debug_toolbar (app, middleware and URLs) is not loaded;
+* the empty ``students``, ``teachers``, ``courses`` and ``grades`` apps are
+  not installed (they have no models or migrations);
+* URLs come from urls_production, which mounts the app URLs once;
+* collectstatic stores content-hashed, precompressed files that
+  PrecompressedStaticMiddleware serves with far-future cache headers (see
+  bawabati_app/staticfiles.py). Build the React app with
+  ``npm run build:django`` first to include it under /static/frontend/.
+
+``manage.py bench_startup --settings-modules bawabati.settings
+bawabati.settings_production`` compares worker boot times of the two.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE
+
+DEBUG = False
+
+DEVELOPMENT_APPS = ['debug_toolbar', 'students', 'teachers', 'courses', 'grades']
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEVELOPMENT_APPS]
+
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if not middleware.startswith('debug_toolbar.')]
+# Right after SecurityMiddleware, so asset requests skip the rest of the stack
+MIDDLEWARE.insert(1, 'bawabati_app.middleware.PrecompressedStaticMiddleware')
+
+STORAGES = {
+    'default': {'BACKEND': 'bawabati_app.tenancy.TenantFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'bawabati_app.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+ROOT_URLCONF = 'bawabati.urls_production'
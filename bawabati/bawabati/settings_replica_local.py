@@ -0,0 +1,30 @@
+"""
+Primary/replica setup on two local SQLite files.
+
+Used to exercise the read-replica router and the connection pool without a
+MySQL server::
+
+    DJANGO_SETTINGS_MODULE=bawabati.settings_replica_local python manage.py migrate
+    DJANGO_SETTINGS_MODULE=bawabati.settings_replica_local python manage.py migrate --database replica
+
+There is no replication between the two files. The test suite runs on the
+same layout with the replica mirroring the primary, see settings_test.py.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'bawabati_app.db_backends.sqlite3',
+        'NAME': BASE_DIR / 'primary.sqlite3',
+        'POOL': {'MAX_SIZE': 5},
+    },
+    'replica': {
+        'ENGINE': 'bawabati_app.db_backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'POOL': {'MAX_SIZE': 5},
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_REPLICAS = ['replica']
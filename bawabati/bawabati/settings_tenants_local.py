@@ -0,0 +1,41 @@
+"""
+Two schools on local SQLite databases, for trying out tenant routing (see
+bawabati_app/tenancy.py) without MySQL:
+
+    export DJANGO_SETTINGS_MODULE=bawabati.settings_tenants_local
+    python manage.py migrate
+    python manage.py tenant_command all migrate
+    python manage.py tenant_command north setup_admin
+    python manage.py runserver
+
+then open http://north.localhost:8000/ and http://south.localhost:8000/, or
+any other host for the default database. Every database is a file under
+tenants/, so deleting that directory starts over.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES
+
+TENANTS_DIR = os.path.join(BASE_DIR, 'tenants')
+os.makedirs(TENANTS_DIR, exist_ok=True)
+
+TENANTS = {
+    'north': {'HOSTS': ['north.localhost']},
+    'south': {'HOSTS': ['south.localhost']},
+}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(TENANTS_DIR, 'default.sqlite3'),
+    },
+}
+for _slug in TENANTS:
+    DATABASES[f'tenant_{_slug}'] = {**DATABASES['default'], 'NAME': os.path.join(TENANTS_DIR, f'{_slug}.sqlite3')}
+
+DATABASE_REPLICAS = []
+
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', '.localhost']
+
+CACHES = {alias: {**cache, 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'} for alias, cache in CACHES.items()}
@@ -0,0 +1,69 @@
+"""
+Settings for the test suite, on local SQLite databases only::
+
+    python manage.py test --settings=bawabati.settings_test
+
+``default`` is the primary and ``replica`` a second SQLite database that the
+test runner makes a ``MIRROR`` of it (see bawabati_app/routers.py). Both go
+through the connection pool. The mirror is a separate connection that only
+sees committed rows, so reads are only routed to it by the tests that enable
+it with ``override_settings(DATABASE_REPLICAS=['replica'])``.
+
+Two schools, ``north`` and ``south``, have their own SQLite databases for the
+tenant routing tests (see bawabati_app/tenancy.py).
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CATALOGUE, PROFILING, SESSIONS
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'bawabati_app.db_backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'primary.sqlite3'),
+        'POOL': {'MAX_SIZE': 5},
+    },
+    'replica': {
+        'ENGINE': 'bawabati_app.db_backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'POOL': {'MAX_SIZE': 5},
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_REPLICAS = []
+
+TENANTS = {
+    'north': {'HOSTS': ['north.testserver']},
+    'south': {'HOSTS': ['south.testserver']},
+}
+for _slug in TENANTS:
+    DATABASES[f'tenant_{_slug}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'{_slug}.sqlite3'),
+    }
+
+ALLOWED_HOSTS = ['testserver', '.testserver']
+
+CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}',
+            'KEY_FUNCTION': 'bawabati_app.tenancy.make_cache_key'}
+    for alias in ('default', 'sessions')
+}
+
+# Files written by the code under test stay out of the project
+TEST_FILES_DIR = tempfile.mkdtemp(prefix='bawabati-tests-')
+MEDIA_ROOT = os.path.join(TEST_FILES_DIR, 'media')
+UPLOADS = {'DIR': os.path.join(TEST_FILES_DIR, 'uploads')}
+REPORT_CARDS = {'DIR': os.path.join(TEST_FILES_DIR, 'report_cards')}
+CATALOGUE = {**CATALOGUE, 'DIR': os.path.join(TEST_FILES_DIR, 'catalogue'), 'AUTO_PUBLISH': False}
+PROFILING = {**PROFILING, 'ENABLED': False, 'DIR': os.path.join(TEST_FILES_DIR, 'profiles')}
+METRICS = {'DIR': None}
+
+# No background purge of expired sessions racing the tests' transactions
+SESSIONS = {**SESSIONS, 'PURGE_INTERVAL': 0}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -20,11 +20,17 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
 
+from bawabati_app import catalogue, tenancy
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('bawabati_app.urls')),  # Include the main app URLs
     path('api/', include('bawabati_app.urls')),  # API endpoints
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + static(settings.MEDIA_URL, view=tenancy.serve_media, document_root=settings.MEDIA_ROOT)
+
+# The published catalogue of the request's school, when it is not served by a static host
+urlpatterns += static(catalogue.get_config()['URL'], view=tenancy.serve_tenant_files,
+                      document_root=catalogue.get_config()['DIR'])
 
 # Add debug toolbar URLs if in debug mode
 if settings.DEBUG:
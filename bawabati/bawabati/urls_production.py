@@ -0,0 +1,16 @@
+"""
+URL configuration used by settings_production.
+
+Same routes as bawabati/urls.py, but the app URLs are mounted once: the
+development configuration also mounts them under ``api/``, which doubles the
+resolver tree (and every URL under ``/api/``) without serving anything the
+frontend uses. Media and debug toolbar routes are left to the web server and
+development setups.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('bawabati_app.urls')),
+]
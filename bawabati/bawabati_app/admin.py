@@ -1,29 +1,240 @@
-from django.contrib import admin
-from .models import UserProfile, Course, Note, Enrollment
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .models import UserProfile, Course, Note, Enrollment, CourseArchive, GradingPolicy, Grade, GradeReport
+from . import exports, grade_history, grading, rankings
 
-class UserProfileAdmin(admin.ModelAdmin):
+class InputFilter(admin.SimpleListFilter):
+    """A text box instead of a sidebar link for every row of a large related table.
+
+    A number matches the related row's id, anything else the start of its
+    ``search_field``. Build them with ``input_filter()``.
+    """
+    template = 'admin/bawabati_app/input_filter.html'
+    field = None
+    search_field = None
+
+    @property
+    def placeholder(self):
+        return f'ID or {self.search_field}'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(**{f'{self.field}_id': value})
+        return queryset.filter(**{f'{self.field}__{self.search_field}__istartswith': value})
+
+    def choices(self, changelist):
+        # The form resubmits the other filters, the search and the ordering, from the first page
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': [
+                (name, value)
+                for name, values in changelist.filter_params.items() if name != self.parameter_name
+                for value in values
+            ],
+        }
+
+def input_filter(field, search_field, title):
+    return type(f'{field.title().replace("_", "")}Filter', (InputFilter,), {
+        'field': field, 'search_field': search_field, 'title': title, 'parameter_name': field,
+    })
+
+def _estimated_rows(queryset):
+    """InnoDB's running estimate of the rows in ``queryset``'s table, or None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+class EstimatedCountPaginator(Paginator):
+    """Changelist paginator that does not ``COUNT(*)`` a whole large table.
+
+    Unfiltered changelists use the table's estimated row count on MySQL, so
+    the last page may be a little short or cut off. Filtered lists, tables
+    under ``exact_below`` rows and other databases are counted exactly.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where and not query.distinct and not query.combinator:
+            estimate = _estimated_rows(self.object_list)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables growing with the number of students."""
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) of the whole table behind "N total"
+    show_full_result_count = False
+
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'role')
     list_filter = ('role',)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email')
+    autocomplete_fields = ('user',)
+
+def _describe(summary):
+    return (
+        f"{summary['grades_changed']}/{summary['grades']} grades and "
+        f"{summary['reports_changed']}/{summary['reports']} reports change; "
+        f"mean final average {summary['mean_before']} -> {summary['mean_after']}, "
+        f"passing students {summary['passing_before']} -> {summary['passing_after']}."
+    )
 
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('title', 'assigned_teacher')
-    list_filter = ('assigned_teacher',)
+    list_display = ('title', 'assigned_teacher', 'grading_policy')
+    list_filter = (input_filter('assigned_teacher', 'username', 'teacher'), 'grading_policy')
+    list_select_related = ('assigned_teacher', 'grading_policy')
     search_fields = ('title', 'description')
+    autocomplete_fields = ('assigned_teacher', 'grading_policy')
+    actions = ['preview_recompute', 'recompute_grades']
+
+    def save_model(self, request, obj, form, change):
+        # Attributes the grades recomputed for a policy switch to the admin
+        obj._changed_by_id = request.user.pk
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Preview recomputing grades')
+    def preview_recompute(self, request, queryset):
+        summary = grading.preview(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, 'Preview: ' + _describe(summary))
 
-class NoteAdmin(admin.ModelAdmin):
+    @admin.action(description='Recompute grades with the current policy')
+    def recompute_grades(self, request, queryset):
+        summary = grading.recompute(list(queryset.values_list('pk', flat=True)), request.user.pk)
+        self.message_user(request, 'Recomputed: ' + _describe(summary), messages.SUCCESS)
+
+class GradingPolicyAdmin(admin.ModelAdmin):
+    list_display = ('name', 'written_weight', 'participation_weight', 'homework_weight',
+                    'continuous_weight', 'exam_weight', 'updated_at')
+    search_fields = ('name',)
+    actions = ['preview_policy']
+
+    @admin.action(description='Preview the effect on the courses using it')
+    def preview_policy(self, request, queryset):
+        for policy in queryset:
+            course_ids = list(policy.courses.values_list('pk', flat=True))
+            summary = grading.preview(course_ids, policy.weights)
+            self.message_user(request, f'{policy} ({len(course_ids)} courses): ' + _describe(summary))
+
+    def save_model(self, request, obj, form, change):
+        # Attributes the recomputed grades to the admin
+        obj._changed_by_id = request.user.pk
+        super().save_model(request, obj, form, change)
+        if change:
+            self.message_user(request, 'The grades of the courses using this policy are being recomputed.')
+
+class NoteAdmin(LargeTableAdmin):
     list_display = ('title', 'course', 'uploaded_by', 'created_at')
-    list_filter = ('course', 'uploaded_by')
+    list_filter = (input_filter('course', 'title', 'course'), input_filter('uploaded_by', 'username', 'uploaded by'))
+    list_select_related = ('course', 'uploaded_by')
     search_fields = ('title', 'course__title')
+    autocomplete_fields = ('course', 'uploaded_by')
     date_hierarchy = 'created_at'
 
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
     list_display = ('student', 'course', 'enrollment_date')
-    list_filter = ('course', 'enrollment_date')
+    list_filter = (input_filter('course', 'title', 'course'), input_filter('student', 'username', 'student'),
+                   'enrollment_date')
+    list_select_related = ('student', 'course')
     search_fields = ('student__username', 'course__title')
+    autocomplete_fields = ('student', 'course')
     date_hierarchy = 'enrollment_date'
 
+class CourseArchiveAdmin(admin.ModelAdmin):
+    list_display = ('title', 'teacher', 'end_date', 'student_count', 'grade_count', 'archived_at')
+    list_select_related = ('teacher',)
+    search_fields = ('title',)
+    date_hierarchy = 'end_date'
+    exclude = ('payload',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+def _course_ids(queryset):
+    return list(queryset.order_by().values_list('course_id', flat=True).distinct())
+
+class GradeAdmin(LargeTableAdmin):
+    list_display = ('student', 'course', 'semester', 'assessment_type', 'final_grade', 'graded_by', 'updated_at')
+    list_filter = ('semester', 'assessment_type', input_filter('course', 'title', 'course'),
+                   input_filter('student', 'username', 'student'))
+    list_select_related = ('student', 'course', 'graded_by')
+    search_fields = ('^student__username', '^course__title')
+    autocomplete_fields = ('student', 'course', 'graded_by')
+    readonly_fields = ('final_grade', 'created_at', 'updated_at')
+    # Newest first: the model's ordering sorts the whole table through a join
+    ordering = ('-id',)
+    actions = ['recompute_courses', 'export_csv']
+
+    @admin.action(description='Recompute the grades of the selected grades\' courses')
+    def recompute_courses(self, request, queryset):
+        summary = grading.recompute(_course_ids(queryset), request.user.pk)
+        self.message_user(request, 'Recomputed: ' + _describe(summary), messages.SUCCESS)
+
+    @admin.action(description='Export the selected grades as CSV')
+    def export_csv(self, request, queryset):
+        return exports.export_response('grades', [('Course', 'course__title')] + exports.GRADE_COLUMNS, queryset)
+
+    def delete_queryset(self, request, queryset):
+        """Delete the grades, writing their change log entries in batches."""
+        with grade_history.recording(changed_by_id=request.user.pk):
+            queryset.delete()
+
+class GradeReportAdmin(LargeTableAdmin):
+    list_display = ('student', 'course', 'semester', 'continuous_assessment_average', 'exam_grade',
+                    'final_average', 'updated_at')
+    list_filter = ('semester', input_filter('course', 'title', 'course'),
+                   input_filter('student', 'username', 'student'))
+    list_select_related = ('student', 'course')
+    search_fields = ('^student__username', '^course__title')
+    autocomplete_fields = ('student', 'course')
+    readonly_fields = ('continuous_assessment_average', 'final_average', 'created_at', 'updated_at')
+    ordering = ('-id',)
+    actions = ['recompute_courses', 'refresh_rankings', 'export_csv']
+
+    @admin.action(description='Recompute the reports of the selected reports\' courses')
+    def recompute_courses(self, request, queryset):
+        summary = grading.recompute(_course_ids(queryset), request.user.pk)
+        self.message_user(request, 'Recomputed: ' + _describe(summary), messages.SUCCESS)
+
+    @admin.action(description='Refresh the rankings of the selected reports\' courses')
+    def refresh_rankings(self, request, queryset):
+        pairs = list(queryset.order_by().values_list('course_id', 'semester').distinct())
+        for course_id, semester in pairs:
+            rankings.schedule_refresh(course_id, semester)
+        self.message_user(request, f'Refreshing {len(pairs)} course rankings.')
+
+    @admin.action(description='Export the selected reports as CSV')
+    def export_csv(self, request, queryset):
+        return exports.export_response('grade-reports', [('Course', 'course__title')] + exports.REPORT_COLUMNS,
+                                       queryset)
+
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(Course, CourseAdmin)
 admin.site.register(Note, NoteAdmin)
-admin.site.register(Enrollment, EnrollmentAdmin) 
\ No newline at end of file
+admin.site.register(Enrollment, EnrollmentAdmin)
+admin.site.register(CourseArchive, CourseArchiveAdmin)
+admin.site.register(GradingPolicy, GradingPolicyAdmin)
+admin.site.register(Grade, GradeAdmin)
+admin.site.register(GradeReport, GradeReportAdmin)
\ No newline at end of file
@@ -1,16 +1,32 @@
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
-from .models import UserProfile, Course, Note, Enrollment, Grade, GradeReport
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+import datetime
+import os
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.core.exceptions import ValidationError
+from .models import (
+    UserProfile, Course, Note, Enrollment, Grade, GradeReport, CourseArchive, GradingPolicy, UploadSession
+)
 from .serializers import (
     UserSerializer, UserCreateSerializer, UserProfileSerializer,
     CourseSerializer, NoteSerializer, EnrollmentSerializer,
-    GradeSerializer, GradeReportSerializer
+    GradeSerializer, GradeReportSerializer, CourseArchiveSerializer, GradeChangeSerializer, GradeRankingSerializer, current_user_data
 )
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from . import (archive, batch, events, exports, grade_history, grading, jobs, metrics, object_cache, profiling,
+               provisioning, rankings, report_cards, rosters, transcripts, uploads)
+from .db_backends.pool import pool_stats
+from .report_cards import build_archive
+from .routers import get_stats as routing_stats
+from .throttling import LoginThrottled, throttled_authenticate
+from .tokens import InvalidToken, TokenUser, issue_tokens, revoke_tokens, verify_access_token, verify_refresh_token
 
 # Authentication views
 @api_view(['POST'])
@@ -41,13 +57,21 @@ def login_user(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    user = authenticate(username=username, password=password)
+    try:
+        user = throttled_authenticate(request, username, password)
+    except LoginThrottled as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(e.retry_after)}
+        )
     
     if user:
         login(request, user)
         return Response({
             'user': UserSerializer(user).data,
-            'message': 'Login successful'
+            'message': 'Login successful',
+            **issue_tokens(user)
         })
     else:
         return Response(
@@ -55,6 +79,31 @@ def login_user(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def refresh_token(request):
+    token = request.data.get('refresh')
+    if not token:
+        return Response(
+            {'error': 'Please provide a refresh token'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        claims = verify_refresh_token(token)
+        user = User.objects.get(pk=claims['uid'], is_active=True)
+    except (InvalidToken, User.DoesNotExist):
+        return Response(
+            {'error': 'Invalid or expired refresh token'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    return Response(issue_tokens(user))
+
+@api_view(['POST'])
+def revoke_user_tokens(request):
+    revoke_tokens(request.user)
+    return Response({'message': 'All tokens revoked'})
+
 @api_view(['POST'])
 def logout_user(request):
     logout(request)
@@ -92,6 +141,21 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # The roster is validated here so errors come back immediately;
+        # hashing and inserting run as a background job.
+        roster = request.FILES.get('file')
+        if roster is None:
+            return Response({'error': 'A CSV file is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rows = provisioning.parse_roster(roster.read())
+        except (provisioning.RosterError, UnicodeDecodeError) as e:
+            errors = getattr(e, 'errors', ['The file must be UTF-8 encoded CSV.'])
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        job = jobs.submit('provision_users', provisioning.provision, rows)
+        return Response({**job, 'count': len(rows)}, status=status.HTTP_202_ACCEPTED)
+
 # Dashboard data views
 @api_view(['GET'])
 def admin_dashboard_data(request):
@@ -101,19 +165,17 @@ def admin_dashboard_data(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    users = User.objects.all()
-    admin_count = users.filter(userprofile__role='admin').count()
-    teacher_count = users.filter(userprofile__role='teacher').count()
-    student_count = users.filter(userprofile__role='student').count()
-    courses = Course.objects.all()
+    def compute():
+        users = User.objects.all()
+        return {
+            'admin_count': users.filter(userprofile__role='admin').count(),
+            'teacher_count': users.filter(userprofile__role='teacher').count(),
+            'student_count': users.filter(userprofile__role='student').count(),
+            'courses': CourseSerializer(Course.objects.all(), many=True).data,
+            'users': UserSerializer(users, many=True).data
+        }
     
-    return Response({
-        'admin_count': admin_count,
-        'teacher_count': teacher_count,
-        'student_count': student_count,
-        'courses': CourseSerializer(courses, many=True).data,
-        'users': UserSerializer(users, many=True).data
-    })
+    return Response(object_cache.get_or_set('admin_dashboard', ['courses', 'users'], compute))
 
 @api_view(['GET'])
 def teacher_dashboard_data(request):
@@ -123,11 +185,13 @@ def teacher_dashboard_data(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    courses = Course.objects.filter(assigned_teacher=request.user)
+    def compute():
+        courses = Course.objects.filter(assigned_teacher=request.user)
+        return {'courses': CourseSerializer(courses, many=True).data}
     
-    return Response({
-        'courses': CourseSerializer(courses, many=True).data
-    })
+    return Response(object_cache.get_or_set(
+        f'teacher_dashboard:{request.user.id}', ['courses', 'users'], compute
+    ))
 
 @api_view(['GET'])
 def student_dashboard_data(request):
@@ -137,32 +201,44 @@ def student_dashboard_data(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    enrollments = Enrollment.objects.filter(student=request.user)
+    def compute():
+        enrollments = Enrollment.objects.filter(student=request.user)
+        return {'enrollments': EnrollmentSerializer(enrollments, many=True).data}
     
-    return Response({
-        'enrollments': EnrollmentSerializer(enrollments, many=True).data
-    })
+    return Response(object_cache.get_or_set(
+        f'student_dashboard:{request.user.id}', ['courses', 'users'], compute
+    ))
+
+@api_view(['GET'])
+def student_transcript(request):
+    if not request.user.is_authenticated or request.user.userprofile.role != 'student':
+        return Response(
+            {'error': 'Student access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    # Invalidated by any grade or report change of this student, and by the
+    # course and user changes that rename what it embeds (see signals.py)
+    return Response(object_cache.get_or_set(
+        f'transcript:{request.user.id}', [f'student:{request.user.id}', 'courses', 'users'],
+        lambda: transcripts.build_transcript(request.user)
+    ))
 
 # Course views
 @api_view(['GET'])
 def course_list(request):
     try:
         specialisation = request.query_params.get('specialisation', None)
-        queryset = Course.objects.all()
         
-        if specialisation:
-            queryset = queryset.filter(specialisation=specialisation)
-            
-        # Add enrollment status for students
-        if request.user.is_authenticated and request.user.userprofile.role == 'student':
-            for course in queryset:
-                course.can_enroll = not Enrollment.objects.filter(
-                    student=request.user,
-                    course=course
-                ).exists()
+        def compute():
+            queryset = Course.objects.all()
+            if specialisation:
+                queryset = queryset.filter(specialisation=specialisation)
+            return CourseSerializer(queryset, many=True).data
         
-        serializer = CourseSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        courses = object_cache.get_or_set(f"course_list:{specialisation or ''}", ['courses', 'users'], compute)
+        # The cached serializations are shared, so add the per-request part to copies
+        current_user = current_user_data(request)
+        return Response([{**course, 'current_user': current_user} for course in courses])
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -172,9 +248,11 @@ def course_list(request):
 @api_view(['GET'])
 def course_detail(request, pk):
     try:
-        course = Course.objects.get(pk=pk)
-        serializer = CourseSerializer(course, context={'request': request})
-        return Response(serializer.data)
+        course = object_cache.get_or_set(
+            f'course:{pk}', [f'course:{pk}', 'users'],
+            lambda: CourseSerializer(Course.objects.get(pk=pk)).data
+        )
+        return Response({**course, 'current_user': current_user_data(request)})
     except Course.DoesNotExist:
         return Response(
             {'error': 'Course not found'},
@@ -285,12 +363,88 @@ def upload_note(request, course_id):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+# Resumable uploads, see uploads.py for the protocol
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_upload(request, course_id):
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not (request.user.userprofile.role == 'admin' or course.assigned_teacher == request.user):
+        return Response(
+            {'error': 'Only administrators and course teachers can upload notes'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        session = uploads.start(
+            course, request.user, request.data.get('title'), request.data.get('filename'),
+            request.data.get('size'), request.data.get('sha256') or '',
+        )
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response(uploads.describe(session), status=status.HTTP_201_CREATED)
+
+def _own_upload(request, upload_id):
+    """The user's upload session, or None."""
+    return UploadSession.objects.filter(pk=upload_id, uploaded_by=request.user).first()
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_detail(request, upload_id):
+    session = _own_upload(request, upload_id)
+    if session is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if request.method == 'DELETE':
+        uploads.abort(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(uploads.describe(session))
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id, index):
+    session = _own_upload(request, upload_id)
+    if session is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        content_length = int(request.META['CONTENT_LENGTH'])
+    except (KeyError, ValueError):
+        content_length = None
+    try:
+        # The raw body, read straight from the connection: request.data would
+        # buffer the whole chunk
+        uploads.write_chunk(session, index, request._request, content_length,
+                            request.META.get(uploads.CHECKSUM_HEADER))
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response({'index': index, 'received': len(uploads.received_chunks(session)),
+                     'chunk_count': session.chunk_count})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_upload(request, upload_id):
+    session = _own_upload(request, upload_id)
+    if session is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        note = uploads.complete(session)
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response({
+        'message': 'Note uploaded successfully',
+        'note': NoteSerializer(note).data
+    }, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 def list_notes(request, course_id):
     try:
-        course = Course.objects.get(pk=course_id)
-        notes = Note.objects.filter(course=course)
-        return Response(NoteSerializer(notes, many=True).data)
+        def compute():
+            course = Course.objects.get(pk=course_id)
+            return NoteSerializer(Note.objects.filter(course=course), many=True).data
+        
+        return Response(object_cache.get_or_set(
+            f'notes:{course_id}', [f'course:{course_id}:notes', f'course:{course_id}', 'users'], compute
+        ))
     except Course.DoesNotExist:
         return Response(
             {'error': 'Course not found'},
@@ -339,9 +493,6 @@ def create_course(request):
     serializer = CourseSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         course = serializer.save()
-        # Set enrolled students if provided
-        if 'student_ids' in request.data:
-            course.students.set(serializer.validated_data.get('students', []))
         return Response(CourseSerializer(course, context={'request': request}).data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -354,24 +505,46 @@ def update_course(request, pk):
         return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
     serializer = CourseSerializer(course, data=request.data, partial=(request.method == 'PATCH'), context={'request': request})
     if serializer.is_valid():
+        # Attributes the grades recomputed for a policy switch
+        course._changed_by_id = request.user.pk
         course = serializer.save()
-        # Set enrolled students if provided
-        if 'student_ids' in request.data:
-            course.students.set(serializer.validated_data.get('students', []))
         return Response(CourseSerializer(course, context={'request': request}).data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def list_teachers(request):
-    teachers = User.objects.filter(userprofile__role='teacher')
-    return Response(UserSerializer(teachers, many=True).data)
+    return Response(object_cache.get_or_set('teachers', ['users'], lambda: UserSerializer(
+        User.objects.filter(userprofile__role='teacher'), many=True
+    ).data))
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def list_students(request):
-    students = User.objects.filter(userprofile__role='student')
-    return Response(UserSerializer(students, many=True).data)
+    return Response(object_cache.get_or_set('students', ['users'], lambda: UserSerializer(
+        User.objects.filter(userprofile__role='student'), many=True
+    ).data))
+
+@api_view(['GET'])
+def search_students(request):
+    """A page of the students matching ``q``, for the course forms' student pickers.
+
+    ``after`` is the ``next`` of the previous page; ``course`` adds whether
+    each student is enrolled in that course.
+    """
+    # The HTML course form is for admins by role, the API one for staff
+    if not (request.user.is_staff or request.user.userprofile.role == 'admin'):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        page_size = min(int(request.query_params.get('page_size', rosters.PAGE_SIZE)), rosters.MAX_PAGE_SIZE)
+        course_id = request.query_params.get('course')
+        course_id = int(course_id) if course_id else None
+    except ValueError:
+        return Response({'error': 'page_size and course must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+    if page_size < 1:
+        return Response({'error': 'page_size must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(rosters.search_students(
+        request.query_params.get('q', ''), request.query_params.get('after'), page_size, course_id))
 
 @api_view(['GET'])
 def list_grades(request, course_id):
@@ -479,4 +652,268 @@ def add_grade(request, course_id, student_id):
     except User.DoesNotExist:
         return Response({'error': 'Student not found'}, status=404)
     except Exception as e:
-        return Response({'error': str(e)}, status=500) 
\ No newline at end of file
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+def course_rankings(request, course_id):
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not _is_course_staff(request.user, course):
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    semester = request.query_params.get('semester')
+    if semester is not None:
+        try:
+            semester = int(semester)
+        except ValueError:
+            semester = None
+        if semester not in dict(Grade.SEMESTER_CHOICES):
+            return Response({'error': 'A valid semester is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(GradeRankingSerializer(rankings.course_rankings(course.pk, semester), many=True).data)
+
+@api_view(['POST'])
+def preview_grading_policy(request, course_id):
+    """What the course's grades would become under the posted ``weights``, without saving them."""
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not _is_course_staff(request.user, course):
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    weights = request.data.get('weights')
+    if weights is not None:
+        if not isinstance(weights, dict) or set(weights) - set(GradingPolicy.DEFAULT_WEIGHTS):
+            return Response({'error': 'weights must map weight names to values.'}, status=status.HTTP_400_BAD_REQUEST)
+        # Strings, so JSON floats such as 0.9 are not read as 0.900000000000000022
+        policy = GradingPolicy(name='preview', **{name: str(value) for name, value in weights.items()})
+        try:
+            policy.full_clean(exclude=['name'])
+        except ValidationError as e:
+            return Response({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        weights = policy.weights
+    return Response(grading.preview([course.pk], weights))
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def generate_report_cards(request):
+    try:
+        semester = int(request.data.get('semester'))
+    except (TypeError, ValueError):
+        semester = None
+    if semester not in dict(Grade.SEMESTER_CHOICES):
+        return Response({'error': 'A valid semester is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    job = jobs.submit('report_cards', build_archive, semester)
+    return Response(job, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def download_report_cards(request, name):
+    path = report_cards.archive_path(name)
+    if path is None or not os.path.isfile(path):
+        return Response({'error': 'Archive not found'}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name, content_type='application/zip')
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def job_status(request, job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job)
+
+def _export_format(request):
+    file_format = request.query_params.get('filetype', 'csv')
+    return file_format if file_format in exports.CONTENT_TYPES else None
+
+def _is_course_staff(user, course):
+    role = user.userprofile.role
+    return role == 'admin' or (role == 'teacher' and course.assigned_teacher_id == user.id)
+
+@api_view(['GET'])
+def export_grades(request, course_id):
+    return _export_course(request, course_id, exports.course_grades_export)
+
+@api_view(['GET'])
+def export_reports(request, course_id):
+    return _export_course(request, course_id, exports.course_reports_export)
+
+def _export_course(request, course_id, export):
+    file_format = _export_format(request)
+    if file_format is None:
+        return Response({'error': 'Unsupported file type'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not _is_course_staff(request.user, course):
+        return Response(
+            {'error': 'You are not authorized to export grades for this course'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return export(course, file_format)
+
+@api_view(['GET'])
+def export_enrollments(request):
+    if request.user.userprofile.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    file_format = _export_format(request)
+    if file_format is None:
+        return Response({'error': 'Unsupported file type'}, status=status.HTTP_400_BAD_REQUEST)
+    # Checked before streaming: an error raised once the rows stream out would truncate a 200
+    course_id = request.query_params.get('course') or None
+    if course_id is not None:
+        try:
+            course_id = int(course_id)
+        except ValueError:
+            return Response({'error': 'course must be a course id'}, status=status.HTTP_400_BAD_REQUEST)
+    return exports.enrollments_export(course_id, file_format)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def database_stats(request):
+    return Response({
+        'pools': pool_stats(),
+        'routing': routing_stats(),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(object_cache.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Request metrics of every worker in the Prometheus text format."""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Archived (rolled over) courses. These decompress a whole course per request
+# and are meant for occasional look-ups, not dashboards.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def archived_course_list(request):
+    archives = archive.visible_archives(request.user).distinct()
+    return Response(CourseArchiveSerializer(archives, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def archived_course_detail(request, pk):
+    try:
+        course_archive = archive.visible_archives(request.user).distinct().get(pk=pk)
+    except CourseArchive.DoesNotExist:
+        return Response({'error': 'Archived course not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        **CourseArchiveSerializer(course_archive).data,
+        **archive.payload_for(course_archive, request.user),
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def rollover_courses(request):
+    before = request.data.get('before')
+    if before:
+        before = parse_date(str(before))
+        if before is None:
+            return Response({'error': 'before must be a YYYY-MM-DD date.'}, status=status.HTTP_400_BAD_REQUEST)
+    job = jobs.submit('rollover', archive.rollover, before)
+    return Response(job, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def profiling_token(request):
+    """A signed token that profiles the requests carrying it, see profiling.py."""
+    token = profiling.make_token(request.user)
+    if profiling.user_for_token(token) is None:
+        return Response({'error': 'Only admins can profile requests.'}, status=status.HTTP_403_FORBIDDEN)
+    return Response({
+        'token': token,
+        'header': 'X-Profile',
+        'query_param': profiling.QUERY_PARAM,
+        'expires_in': profiling.get_config()['TOKEN_MAX_AGE'],
+    })
+
+# Grade audit log
+def _can_view_grade_history(user, course_id):
+    role = user.userprofile.role
+    if role == 'admin':
+        return True
+    return role == 'teacher' and (
+        Course.objects.filter(pk=course_id, assigned_teacher=user).exists()
+        or CourseArchive.objects.filter(course_id=course_id, teacher=user).exists()
+    )
+
+def _parse_as_of(value):
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        # A bare date means the end of that day
+        when = datetime.datetime.combine(day, datetime.time.max)
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def grades_as_of(request, course_id):
+    if not _can_view_grade_history(request.user, course_id):
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    as_of = request.query_params.get('as_of')
+    when = _parse_as_of(as_of) if as_of else timezone.now()
+    if when is None:
+        return Response({'error': 'as_of must be an ISO date or datetime.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'course_id': course_id,
+        'as_of': when,
+        'grades': grade_history.grades_as_of(course_id, when),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def grade_change_history(request, grade_id):
+    changes = list(grade_history.history(grade_id))
+    if not changes:
+        return Response({'error': 'Grade not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not _can_view_grade_history(request.user, changes[0].course_id):
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    return Response(GradeChangeSerializer(changes, many=True).data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_requests(request):
+    try:
+        items = batch.parse(request.data)
+    except batch.BatchError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    user = request.user
+    # Load the profile once, before sub-requests share the user across threads
+    user.userprofile
+    return Response({'responses': batch.execute(request._request, items, user)})
+
+# Live updates. A plain async Django view rather than a DRF one: DRF views are
+# synchronous and would hold a worker thread for the lifetime of the stream.
+def _event_stream_channels(request):
+    user = request.user
+    if not user.is_authenticated:
+        # EventSource cannot send an Authorization header
+        token = request.GET.get('token')
+        if not token:
+            return None
+        try:
+            user = TokenUser(verify_access_token(token))
+        except InvalidToken:
+            return None
+    return events.channels_for(user)
+
+async def event_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Live updates require the ASGI server.'}, status=501)
+    channels = await sync_to_async(_event_stream_channels)(request)
+    if channels is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    response = StreamingHttpResponse(events.stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
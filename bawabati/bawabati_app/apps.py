@@ -5,4 +5,5 @@ class BawabatiAppConfig(AppConfig):
     name = 'bawabati_app'
     
     def ready(self):
-        import bawabati_app.signals 
\ No newline at end of file
+        import bawabati_app.signals
+        import bawabati_app.sessions  # Registers its system check 
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""Semester rollover: move ended courses out of the live tables.
+
+Each course whose ``end_date`` is past is serialized with its enrollments,
+grades, reports and notes into one zlib-compressed JSON document on a
+``CourseArchive`` row, indexed by ``ArchivedEnrollment`` rows per student, and
+then deleted, cascading to its live rows; the deleted grades are written to
+the grade change log in batches. The per-row delete receivers are skipped
+(see ``signals.bulk_delete()``): the course's caches are invalidated and the
+catalogue republished once per course, and no event is published for rows of
+a course that no longer exists. Uploaded note files are left on disk and stay
+referenced from the archive.
+"""
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import catalogue, grade_history, object_cache, signals
+from .models import ArchivedEnrollment, Course, CourseArchive, Enrollment, Grade, GradeReport, Note
+
+COURSE_FIELDS = ['id', 'title', 'description', 'assigned_teacher_id', 'assigned_teacher__username',
+                 'specialisation', 'capacity', 'start_date', 'end_date', 'created_at']
+ENROLLMENT_FIELDS = ['student_id', 'student__username', 'student__first_name', 'student__last_name',
+                     'enrollment_date']
+GRADE_FIELDS = ['student_id', 'semester', 'assessment_type', 'written_grade', 'participation', 'homework',
+                'final_grade', 'comments', 'graded_by_id', 'created_at', 'updated_at']
+REPORT_FIELDS = ['student_id', 'semester', 'continuous_assessment_average', 'exam_grade', 'final_average',
+                 'created_at', 'updated_at']
+NOTE_FIELDS = ['id', 'title', 'file', 'uploaded_by_id', 'content', 'created_at', 'updated_at']
+
+
+def ended_courses(before=None):
+    """Courses whose end date is before ``before`` (defaults to today)."""
+    return Course.objects.filter(end_date__lt=before or timezone.localdate())
+
+
+def build_payload(course_id):
+    return {
+        'course': Course.objects.filter(pk=course_id).values(*COURSE_FIELDS).get(),
+        'enrollments': list(Enrollment.objects.filter(course_id=course_id).values(*ENROLLMENT_FIELDS)),
+        'grades': list(Grade.objects.filter(course_id=course_id).order_by('pk').values(*GRADE_FIELDS)),
+        'reports': list(GradeReport.objects.filter(course_id=course_id).order_by('pk').values(*REPORT_FIELDS)),
+        'notes': list(Note.objects.filter(course_id=course_id).order_by('pk').values(*NOTE_FIELDS)),
+    }
+
+
+def compress(payload):
+    return zlib.compress(json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), 6)
+
+
+def load_payload(archive):
+    return json.loads(zlib.decompress(bytes(archive.payload)))
+
+
+def archive_course(course):
+    """Archive and delete one course; returns the new ``CourseArchive``."""
+    course_id = course.pk
+    with grade_history.recording(), signals.bulk_delete():
+        payload = build_payload(course_id)
+        archive = CourseArchive.objects.create(
+            course_id=course.pk,
+            title=course.title,
+            teacher_id=course.assigned_teacher_id,
+            start_date=course.start_date,
+            end_date=course.end_date,
+            student_count=len(payload['enrollments']),
+            grade_count=len(payload['grades']),
+            note_count=len(payload['notes']),
+            payload=compress(payload),
+        )
+        ArchivedEnrollment.objects.bulk_create([
+            ArchivedEnrollment(archive=archive, student_id=row['student_id'], enrollment_date=row['enrollment_date'])
+            for row in payload['enrollments']
+        ])
+        # Deleting the course cascades to its grades, reports, enrollments,
+        # notes and rankings
+        course.delete()
+        students = {row['student_id'] for key in ('grades', 'reports') for row in payload[key]}
+        object_cache.bump_on_commit('courses', f'course:{course_id}', f'course:{course_id}:notes',
+                                    *(f'student:{pk}' for pk in students))
+        catalogue.schedule_publish()
+    return archive
+
+
+def rollover(before=None, dry_run=False):
+    """Archive every ended course; returns a summary of what was (or would be) moved."""
+    summary = {'courses': 0, 'enrollments': 0, 'grades': 0, 'notes': 0, 'archived_bytes': 0}
+    for course in list(ended_courses(before).order_by('pk')):
+        if dry_run:
+            summary['courses'] += 1
+            summary['enrollments'] += Enrollment.objects.filter(course_id=course.pk).count()
+            summary['grades'] += Grade.objects.filter(course_id=course.pk).count()
+            summary['notes'] += Note.objects.filter(course_id=course.pk).count()
+            continue
+        archive = archive_course(course)
+        summary['courses'] += 1
+        summary['enrollments'] += archive.student_count
+        summary['grades'] += archive.grade_count
+        summary['notes'] += archive.note_count
+        summary['archived_bytes'] += len(archive.payload)
+    return summary
+
+
+def visible_archives(user):
+    """Archives ``user`` may read: all for admins, taught or taken otherwise."""
+    archives = CourseArchive.objects.select_related('teacher')
+    role = user.userprofile.role
+    if role == 'admin':
+        return archives
+    if role == 'teacher':
+        return archives.filter(teacher=user)
+    return archives.filter(enrollments__student=user)
+
+
+def payload_for(archive, user):
+    """The archived document, restricted to the student's own rows for students."""
+    payload = load_payload(archive)
+    if user.userprofile.role == 'student':
+        for key in ('enrollments', 'grades', 'reports'):
+            payload[key] = [row for row in payload[key] if row['student_id'] == user.id]
+    return payload
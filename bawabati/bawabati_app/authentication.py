@@ -0,0 +1,29 @@
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from .tokens import InvalidToken, TokenUser, verify_access_token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate ``Authorization: Bearer <access token>`` headers.
+
+    The token is checked with an HMAC signature and a cached version lookup, so
+    no password hashing or database query happens per request.
+    """
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword:
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            claims = verify_access_token(auth[1].decode())
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header.')
+        except InvalidToken as e:
+            raise AuthenticationFailed(str(e))
+        return (TokenUser(claims), claims)
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
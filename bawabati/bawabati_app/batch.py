@@ -0,0 +1,178 @@
+"""Run several API calls in one HTTP round trip.
+
+Each sub-request is resolved against the URLconf and handed straight to its
+view, skipping the middleware stack. Only the named API routes (``api_*``)
+can be called that way; everything else is refused. The user resolved for
+the batch request is forced onto every sub-request, so authentication and the
+profile lookup happen once. A sub-request that raises gets a 500 entry of its
+own and does not fail the batch. Runs of consecutive GETs execute concurrently on a small thread
+pool; any other method is a barrier that runs alone, in order, on the
+request's own thread and database connection.
+"""
+import contextvars
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+DEFAULTS = {
+    'MAX_REQUESTS': 20,
+    'MAX_WORKERS': 4,
+}
+
+ALLOWED_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Sub-requests skip the middleware, so only the API's own views, which
+# authenticate and check permissions themselves, may be batched
+URL_NAME_PREFIX = 'api_'
+
+# API views that cannot run inside a batch (chunk uploads take a raw body)
+EXCLUDED_URL_NAMES = {'api_batch', 'api_event_stream', 'api_upload_chunk'}
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(Exception):
+    pass
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'API_BATCH', {})}
+
+
+def parse(payload):
+    """Validate the ``requests`` list of a batch body and return it normalised."""
+    items = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('requests must be a non-empty list.')
+    limit = get_config()['MAX_REQUESTS']
+    if len(items) > limit:
+        raise BatchError(f'At most {limit} requests can be batched.')
+    normalised = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchError(f'Request {index} needs a path.')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in ALLOWED_METHODS:
+            raise BatchError(f'Request {index} has an unsupported method.')
+        normalised.append({
+            'id': item.get('id', index),
+            'method': method,
+            'path': item['path'],
+            'body': item.get('body'),
+        })
+    return normalised
+
+
+def _build_request(parent, item, user):
+    url = urlsplit(item['path'])
+    body = b'' if item['body'] is None else json.dumps(item['body']).encode()
+    environ = {
+        key: value for key, value in parent.META.items()
+        if key.startswith('HTTP_') or key in ('REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL')
+    }
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': url.path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        # Sub-responses are embedded in the JSON batch response, whatever the
+        # batch request itself asked for
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': parent.scheme,
+    })
+    request = WSGIRequest(environ)
+    request.user = user
+    request.session = getattr(parent, 'session', None)
+    # Picked up by DRF in place of its authenticators; the batch request was
+    # already authenticated (and CSRF-checked) as a whole.
+    request._force_auth_user = user
+    request._dont_enforce_csrf_checks = True
+    return request
+
+
+def _response_body(response):
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content or b'null')
+    return response.content.decode(response.charset or 'utf-8', errors='replace')
+
+
+def run_one(parent, item, user):
+    """Dispatch one sub-request and return its result entry."""
+    try:
+        match = resolve(urlsplit(item['path']).path)
+    except Resolver404:
+        return {'id': item['id'], 'status': 404, 'body': {'error': 'Not found'}}
+    if not (match.url_name or '').startswith(URL_NAME_PREFIX) or match.url_name in EXCLUDED_URL_NAMES:
+        return {'id': item['id'], 'status': 400, 'body': {'error': 'This endpoint cannot be batched.'}}
+    request = _build_request(parent, item, user)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.streaming:
+            return {'id': item['id'], 'status': 400, 'body': {'error': 'Streaming responses cannot be batched.'}}
+        return {'id': item['id'], 'status': response.status_code, 'body': _response_body(response)}
+    except Http404:
+        return {'id': item['id'], 'status': 404, 'body': {'error': 'Not found'}}
+    except Exception:
+        logger.exception('Batched %s %s failed', item['method'], item['path'])
+        return {'id': item['id'], 'status': 500, 'body': {'error': 'Internal server error'}}
+
+
+def _run_in_worker(context, parent, item, user):
+    try:
+        # Carries the request's routing state (replica pinning) into the thread
+        return context.run(run_one, parent, item, user)
+    finally:
+        # Hand the thread's connection back to the pool
+        connections.close_all()
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=get_config()['MAX_WORKERS'], thread_name_prefix='api-batch')
+    return _pool
+
+
+def execute(parent, items, user):
+    """Run ``items`` and return their result entries in order."""
+    results = [None] * len(items)
+    reads = []
+
+    def flush():
+        if len(reads) == 1:
+            index, item = reads[0]
+            results[index] = run_one(parent, item, user)
+        elif reads:
+            pool = _get_pool()
+            futures = [
+                (index, pool.submit(_run_in_worker, contextvars.copy_context(), parent, item, user))
+                for index, item in reads
+            ]
+            for index, future in futures:
+                results[index] = future.result()
+        reads.clear()
+
+    for index, item in enumerate(items):
+        if item['method'] == 'GET':
+            reads.append((index, item))
+            continue
+        flush()
+        results[index] = run_one(parent, item, user)
+    flush()
+    return results
@@ -0,0 +1,226 @@
+"""Static course catalogue.
+
+``publish()`` renders the catalogue (courses, teachers, specialisations and
+seats left) into files any static host or CDN can serve, so browsing courses
+does not reach Django or the database:
+
+* ``catalogue.json``, the manifest: every specialisation with the URLs of its
+  shard, the teachers and the totals. It is small and should be revalidated;
+* ``shards/<specialisation>.<hash>.json`` and ``.html``, one pair per
+  specialisation, named after a hash of their content so they can be cached
+  forever;
+* ``index.html``, linking the HTML shards.
+
+A shard whose content did not change keeps its file (and the caches holding
+it); only changed shards are rendered and written, then the manifest. Files
+of the previous manifest are kept for clients that still hold it.
+
+Each school's catalogue is written to its own ``tenants/<slug>/``
+subdirectory of ``DIR`` (see tenancy.py) and read by the frontend from
+``URL``, whatever the school. Django serves ``URL`` from the subdirectory of
+the request's school; a static host has to do the same, mapping each
+school's host to its subdirectory.
+
+Course, enrollment and teacher changes queue a publish through
+``schedule_publish()``; a burst of changes publishes once, ``DEBOUNCE``
+seconds after the first. ``manage.py publish_catalogue`` publishes at once.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import jobs, tenancy
+from .models import Course
+
+DEFAULTS = {
+    'DIR': os.path.join(settings.BASE_DIR, 'catalogue'),
+    'URL': '/catalogue/',
+    'AUTO_PUBLISH': True,
+    'DEBOUNCE': 5,
+}
+
+MANIFEST = 'catalogue.json'
+SHARD_DIR = 'shards'
+PENDING_KEY = 'catalogue:publish-pending'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CATALOGUE', {})}
+
+
+def output_dir():
+    return tenancy.tenant_path(get_config()['DIR'])
+
+
+def _course_entry(course):
+    teacher = course.assigned_teacher
+    return {
+        'id': course.pk,
+        'title': course.title,
+        'description': course.description,
+        'specialisation': course.specialisation,
+        'capacity': course.capacity,
+        'enrolled': course.enrolled,
+        'seats_left': max(course.capacity - course.enrolled, 0),
+        'start_date': course.start_date,
+        'end_date': course.end_date,
+        # Named like the API's field, so clients can use either source
+        'assigned_teacher': {'id': teacher.pk, 'first_name': teacher.first_name, 'last_name': teacher.last_name},
+    }
+
+
+def build():
+    """The catalogue data: ``{specialisation: [course entries]}`` and the teachers."""
+    courses = (
+        Course.objects
+        .select_related('assigned_teacher')
+        .annotate(enrolled=Count('enrollments'))
+        .order_by('specialisation', 'title', 'pk')
+    )
+    shards, teachers = {}, {}
+    for course in courses:
+        shards.setdefault(course.specialisation, []).append(_course_entry(course))
+        teacher = teachers.setdefault(course.assigned_teacher_id, {
+            'id': course.assigned_teacher_id,
+            'name': course.assigned_teacher.get_full_name() or course.assigned_teacher.username,
+            'courses': 0,
+        })
+        teacher['courses'] += 1
+    return shards, sorted(teachers.values(), key=lambda teacher: teacher['name'])
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _write(path, content):
+    """Replace ``path`` atomically, so a static host never serves a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def _slugs(names):
+    """A file name slug per specialisation, unique even when slugify collapses two names."""
+    slugs, used = {}, set()
+    for name in names:
+        base = slugify(name) or 'general'
+        slug, index = base, 2
+        while slug in used:
+            slug, index = f'{base}-{index}', index + 1
+        used.add(slug)
+        slugs[name] = slug
+    return slugs
+
+
+def load_manifest(directory=None):
+    try:
+        with open(os.path.join(directory or output_dir(), MANIFEST), 'rb') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _manifest_files(manifest):
+    if not manifest:
+        return set()
+    return {entry[kind] for entry in manifest['specialisations'] for kind in ('json', 'html')}
+
+
+def publish(force=False):
+    """Write the changed shards and a new manifest; returns what was done."""
+    directory = output_dir()
+    previous = load_manifest(directory)
+    shards, teachers = build()
+    slugs = _slugs(shards)
+    generated_at = timezone.now()
+
+    entries, written = [], 0
+    for name, courses in shards.items():
+        content = _dumps({'specialisation': name, 'courses': courses})
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        base = f'{SHARD_DIR}/{slugs[name]}.{digest}'
+        entry = {
+            'name': name,
+            'slug': slugs[name],
+            'hash': digest,
+            'courses': len(courses),
+            'seats_left': sum(course['seats_left'] for course in courses),
+            'json': f'{base}.json',
+            'html': f'{base}.html',
+        }
+        # The name holds the content hash: an existing file is already up to date
+        if force or not os.path.exists(os.path.join(directory, entry['html'])):
+            _write(os.path.join(directory, entry['json']), content)
+            html = render_to_string('bawabati_app/catalogue/shard.html', {'specialisation': name, 'courses': courses})
+            _write(os.path.join(directory, entry['html']), html.encode())
+            written += 1
+        entries.append(entry)
+
+    version = hashlib.sha256(''.join(entry['hash'] for entry in entries).encode()).hexdigest()[:12]
+    teachers_changed = not previous or previous.get('teachers') != teachers
+    if not force and previous and previous.get('version') == version and not teachers_changed:
+        return {'version': version, 'shards': len(entries), 'written': 0, 'removed': 0, 'changed': False}
+
+    manifest = {
+        'version': version,
+        'generated_at': generated_at,
+        'specialisations': entries,
+        'teachers': teachers,
+        'totals': {
+            'courses': sum(entry['courses'] for entry in entries),
+            'seats_left': sum(entry['seats_left'] for entry in entries),
+        },
+    }
+    # Shards first, then the manifest pointing at them
+    _write(os.path.join(directory, 'index.html'), render_to_string('bawabati_app/catalogue/index.html', {
+        'manifest': manifest, 'generated_at': generated_at,
+    }).encode())
+    _write(os.path.join(directory, MANIFEST), _dumps(manifest))
+    removed = _prune(directory, _manifest_files(manifest) | _manifest_files(previous))
+    return {'version': version, 'shards': len(entries), 'written': written, 'removed': removed, 'changed': True}
+
+
+def _prune(directory, keep):
+    removed = 0
+    shard_dir = os.path.join(directory, SHARD_DIR)
+    for name in os.listdir(shard_dir) if os.path.isdir(shard_dir) else ():
+        if f'{SHARD_DIR}/{name}' not in keep:
+            os.remove(os.path.join(shard_dir, name))
+            removed += 1
+    return removed
+
+
+def _debounced_publish():
+    time.sleep(get_config()['DEBOUNCE'])
+    # Changes committed from here on queue another publish
+    cache.delete(PENDING_KEY)
+    return publish()
+
+
+def _queue_publish():
+    config = get_config()
+    # At most one publish pending per tenant, across all workers
+    if cache.add(PENDING_KEY, 1, config['DEBOUNCE'] + 60):
+        jobs.submit('publish_catalogue', _debounced_publish)
+
+
+def schedule_publish():
+    """Publish the catalogue shortly after the current transaction commits."""
+    if get_config()['AUTO_PUBLISH']:
+        transaction.on_commit(_queue_publish, using=tenancy.db_alias())
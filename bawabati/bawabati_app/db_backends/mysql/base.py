@@ -0,0 +1,12 @@
+from django.db.backends.mysql import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def is_connection_alive(self, connection):
+        try:
+            connection.ping()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,129 @@
+"""Process-wide connection pooling for Django database backends.
+
+Django opens a new driver connection whenever a ``DatabaseWrapper`` connects
+and closes it again at the end of the request (``CONN_MAX_AGE = 0``). The mixin
+below hands those connections to a per-alias pool on close and takes them back
+on the next connect, so requests skip the TCP/auth handshake. Pool settings
+are read from the ``POOL`` key of each ``DATABASES`` entry::
+
+    'POOL': {'MAX_SIZE': 10, 'MAX_IDLE_TIME': 300, 'CHECK_AFTER': 30}
+"""
+import threading
+import time
+from collections import deque
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, alias, max_size=10, max_idle_time=300, check_after=30):
+        self.alias = alias
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.check_after = check_after
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def acquire(self, is_alive):
+        """Return an idle connection that passes ``is_alive``, or None."""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, released_at = self._idle.pop()
+            idle_for = now - released_at
+            if idle_for > self.max_idle_time or (idle_for > self.check_after and not is_alive(connection)):
+                self._discard(connection)
+                continue
+            with self._lock:
+                self.reused += 1
+                self._checked_out()
+            return connection
+
+    def opened(self):
+        with self._lock:
+            self.created += 1
+            self._checked_out()
+
+    def _checked_out(self):
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def release(self, connection, reusable=True):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+            if reusable and len(self._idle) < self.max_size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._discard(connection)
+
+    def _discard(self, connection):
+        with self._lock:
+            self.discarded += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+            }
+
+
+def get_pool(alias, settings_dict):
+    pool = _pools.get(alias)
+    if pool is None:
+        options = settings_dict.get('POOL', {})
+        with _pools_lock:
+            pool = _pools.setdefault(alias, ConnectionPool(
+                alias,
+                max_size=options.get('MAX_SIZE', 10),
+                max_idle_time=options.get('MAX_IDLE_TIME', 300),
+                check_after=options.get('CHECK_AFTER', 30),
+            ))
+    return pool
+
+
+def pool_stats():
+    """Return the metrics of every pool created in this process."""
+    return {alias: pool.stats() for alias, pool in _pools.items()}
+
+
+class PooledDatabaseWrapperMixin:
+    """Mixin for a backend ``DatabaseWrapper`` that recycles driver connections."""
+
+    def is_connection_alive(self, connection):
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict)
+        connection = pool.acquire(self.is_connection_alive)
+        if connection is None:
+            connection = super().get_new_connection(conn_params)
+            pool.opened()
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A connection closed mid-transaction or after an error is not trusted
+        reusable = not self.in_atomic_block and not (self.errors_occurred and not self.is_usable())
+        if reusable and not self.autocommit:
+            with self.wrap_database_errors:
+                self.connection.rollback()
+        get_pool(self.alias, self.settings_dict).release(self.connection, reusable)
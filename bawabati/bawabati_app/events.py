@@ -0,0 +1,220 @@
+"""Publish/subscribe for pushing grade and note updates to browsers.
+
+Writes publish small events on named channels (``student:<id>``,
+``course:<id>``, ``course:<id>:staff`` and ``all`` for admins) and the
+``api/events/`` server-sent events view streams them to the subscribed clients.
+
+Two brokers are available through ``settings.EVENTS['BROKER']``:
+
+* ``'memory'`` (default) fans events out inside the current process only,
+  which is enough for a single ASGI worker;
+* ``'cache'`` appends events to a short log in the shared Django cache that
+  every process polls, a stand-in for a real message broker when several
+  workers run behind one cache (it does nothing useful with locmem).
+
+Channel names carry the tenant's slug (see tenancy.py), so one broker serves
+every school of the process without mixing their events.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from . import tenancy
+
+DEFAULTS = {
+    'BROKER': 'memory',
+    'HEARTBEAT': 15,
+    'QUEUE_SIZE': 100,
+    'RELAY_INTERVAL': 0.5,
+    'RELAY_TTL': 60,
+}
+
+stats = Counter()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EVENTS', {})}
+
+
+class Subscription:
+    """A client's queue of events, owned by the event loop serving it."""
+
+    def __init__(self, channels, loop, maxsize):
+        self.channels = set(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop rather than let the queue grow without bound
+            stats['dropped'] += 1
+
+
+class MemoryBroker:
+    """Deliver events to the subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, asyncio.get_running_loop(), get_config()['QUEUE_SIZE'])
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({sub for subscribers in self._subscribers.values() for sub in subscribers})
+
+    def publish(self, channels, event_type, data):
+        self.dispatch(channels, {'id': next(self._ids), 'type': event_type, 'data': data})
+
+    def dispatch(self, channels, event):
+        """Hand ``event`` to every local subscriber of any of ``channels``; thread-safe."""
+        with self._lock:
+            targets = {sub for channel in channels for sub in self._subscribers.get(channel, ())}
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+        stats['published'] += 1
+        stats['delivered'] += len(targets)
+
+
+class CacheBroker(MemoryBroker):
+    """Share events between processes through a numbered log in the cache."""
+
+    SEQUENCE_KEY = 'events:seq'
+
+    def __init__(self):
+        super().__init__()
+        self._relays = set()
+
+    def _event_key(self, seq):
+        return f'events:{seq}'
+
+    def publish(self, channels, event_type, data):
+        # One log for all tenants, whose channels are already scoped
+        with tenancy.use_tenant(None):
+            cache.add(self.SEQUENCE_KEY, 0, None)
+            seq = cache.incr(self.SEQUENCE_KEY)
+            cache.set(self._event_key(seq), (list(channels), {'id': seq, 'type': event_type, 'data': data}),
+                      get_config()['RELAY_TTL'])
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        # One relay per event loop delivers the shared log to local subscribers
+        loop = subscription.loop
+        if loop not in self._relays:
+            self._relays.add(loop)
+            loop.create_task(self._relay(loop))
+        return subscription
+
+    async def _relay(self, loop):
+        interval = get_config()['RELAY_INTERVAL']
+        # The task runs in a copy of the first subscriber's context
+        tenancy.activate(None)
+        try:
+            last = await cache.aget(self.SEQUENCE_KEY) or 0
+            while self.subscriber_count():
+                await asyncio.sleep(interval)
+                current = await cache.aget(self.SEQUENCE_KEY) or 0
+                if current <= last:
+                    continue
+                keys = [self._event_key(seq) for seq in range(last + 1, current + 1)]
+                found = await cache.aget_many(keys)
+                for key in keys:
+                    if key in found:
+                        channels, event = found[key]
+                        self.dispatch(channels, event)
+                last = current
+        finally:
+            self._relays.discard(loop)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = CacheBroker() if get_config()['BROKER'] == 'cache' else MemoryBroker()
+    return _broker
+
+
+def publish(channels, event_type, data):
+    get_broker().publish([tenancy.scoped(channel) for channel in channels], event_type, data)
+
+
+def publish_on_commit(channels, event_type, data):
+    """Publish once the surrounding transaction commits, so clients never see rolled back writes."""
+    transaction.on_commit(lambda: publish(channels, event_type, data), using=tenancy.db_alias())
+
+
+def format_event(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream(channels):
+    """Async iterator of server-sent event frames for ``channels``."""
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    heartbeat = get_config()['HEARTBEAT']
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def channels_for(user):
+    """The channels ``user`` may listen to."""
+    return [tenancy.scoped(channel) for channel in _user_channels(user)]
+
+
+def _user_channels(user):
+    from .models import Course, Enrollment
+
+    role = user.userprofile.role
+    if role == 'admin':
+        return ['all']
+    if role == 'teacher':
+        course_ids = Course.objects.filter(assigned_teacher=user).values_list('id', flat=True)
+        return [channel for course_id in course_ids for channel in (f'course:{course_id}', f'course:{course_id}:staff')]
+    course_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
+    return [f'student:{user.pk}'] + [f'course:{course_id}' for course_id in course_ids]
@@ -0,0 +1,218 @@
+"""Streaming CSV/XLSX exports.
+
+Rows are read as ``values_list`` tuples in primary-key ordered batches (keyset
+pagination) and written to a ``StreamingHttpResponse`` as they arrive, so
+memory use does not depend on the number of rows. Keyset batches are used
+rather than one ``.iterator()`` call because the MySQL drivers buffer the whole
+result set of a single query client-side.
+"""
+import csv
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+from .models import Enrollment, Grade, GradeReport
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+GRADE_COLUMNS = [
+    ('Username', 'student__username'),
+    ('First name', 'student__first_name'),
+    ('Last name', 'student__last_name'),
+    ('Semester', 'semester'),
+    ('Assessment', 'assessment_type'),
+    ('Written', 'written_grade'),
+    ('Participation', 'participation'),
+    ('Homework', 'homework'),
+    ('Final grade', 'final_grade'),
+    ('Comments', 'comments'),
+    ('Graded by', 'graded_by__username'),
+    ('Updated at', 'updated_at'),
+]
+
+REPORT_COLUMNS = [
+    ('Username', 'student__username'),
+    ('First name', 'student__first_name'),
+    ('Last name', 'student__last_name'),
+    ('Semester', 'semester'),
+    ('Continuous assessment', 'continuous_assessment_average'),
+    ('Exam', 'exam_grade'),
+    ('Final average', 'final_average'),
+    ('Updated at', 'updated_at'),
+]
+
+ENROLLMENT_COLUMNS = [
+    ('Course ID', 'course_id'),
+    ('Course', 'course__title'),
+    ('Username', 'student__username'),
+    ('First name', 'student__first_name'),
+    ('Last name', 'student__last_name'),
+    ('Email', 'student__email'),
+    ('Enrolled at', 'enrollment_date'),
+]
+
+
+def iter_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yield ``values_list`` tuples of ``fields`` in pk-ordered batches."""
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+class _Echo:
+    """File-like object that hands back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _StreamBuffer:
+    """Write-only, unseekable buffer; zipfile then streams entries with data descriptors."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+# Characters XML 1.0 does not allow, even escaped; a cell containing one makes
+# the whole workbook unreadable
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        value = str(value)
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    return f'<c t="inlineStr"><is><t>{escape(XML_ILLEGAL.sub("", str(value)))}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def stream_xlsx(header, rows, flush_every=500):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(header).encode())
+            for count, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % flush_every == 0:
+                    yield buffer.pop()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.pop()
+
+
+def export_response(filename, columns, queryset, file_format='csv'):
+    """Build a streaming download of ``queryset`` restricted to ``columns``."""
+    header = [label for label, _field in columns]
+    rows = iter_rows(queryset, [field for _label, field in columns])
+    if file_format == 'xlsx':
+        content = stream_xlsx(header, rows)
+    else:
+        content = stream_csv(header, rows)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+def course_grades_export(course, file_format='csv'):
+    return export_response(f'course-{course.pk}-grades', GRADE_COLUMNS,
+                           Grade.objects.filter(course=course), file_format)
+
+
+def course_reports_export(course, file_format='csv'):
+    return export_response(f'course-{course.pk}-reports', REPORT_COLUMNS,
+                           GradeReport.objects.filter(course=course), file_format)
+
+
+def enrollments_export(course_id=None, file_format='csv'):
+    queryset = Enrollment.objects.all()
+    filename = 'enrollments'
+    if course_id:
+        queryset = queryset.filter(course_id=course_id)
+        filename = f'course-{course_id}-enrollments'
+    return export_response(filename, ENROLLMENT_COLUMNS, queryset, file_format)
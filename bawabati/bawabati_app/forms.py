@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import reverse_lazy
 from .models import UserProfile, Course, Note, Grade, GradeReport
+from . import rosters
 
 from django import forms
 from .models import UserProfile
@@ -34,20 +36,55 @@ class UserCreateForm(UserCreationForm):
         model = User
         fields = ['username', 'first_name', 'last_name', 'email', 'password1', 'password2', 'role']
 
+def student_label(user):
+    """How the student pickers show a student; student_picker.js builds the same from search results."""
+    name = f'{user.first_name} {user.last_name}'.strip()
+    return f'{name} ({user.username})' if name else user.username
+
+class StudentSearchWidget(forms.SelectMultiple):
+    """A multiple select holding only the chosen students.
+
+    student_picker.js turns it into a list of the chosen students and a
+    search box adding others from ``api/students/search/``, so the page no
+    longer holds every student of the school.
+    """
+    class Media:
+        js = ['bawabati_app/js/student_picker.js']
+
+    def __init__(self, attrs=None):
+        super().__init__({'data-student-picker': reverse_lazy('api_search_students'), **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [pk for pk in value if str(pk).isdigit()]
+        queryset = self.choices.queryset.filter(pk__in=selected) if selected else self.choices.queryset.none()
+        return [
+            (None, [self.create_option(name, *self.choices.choice(obj), True, index, attrs=attrs)], index)
+            for index, obj in enumerate(queryset)
+        ]
+
 class CourseForm(forms.ModelForm):
     class Meta:
         model = Course
         fields = ['title', 'description', 'assigned_teacher', 'students']
         widgets = {
-            'students': forms.CheckboxSelectMultiple(),
+            'students': StudentSearchWidget(),
         }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Only show teachers in the assigned_teacher dropdown
         self.fields['assigned_teacher'].queryset = User.objects.filter(userprofile__role='teacher')
-        # Only show students in the students selection
-        self.fields['students'].queryset = User.objects.filter(userprofile__role='student')
+        # Only accept students; the widget only loads the chosen ones
+        self.fields['students'].queryset = rosters.students()
+        self.fields['students'].label_from_instance = student_label
+
+    def _save_m2m(self):
+        # Only the changes to the roster are written, not students.set() of everyone chosen
+        students = self.cleaned_data.pop('students', None)
+        super()._save_m2m()
+        if students is not None:
+            self.cleaned_data['students'] = students
+            rosters.update_enrollments(self.instance, replace=students.values_list('pk', flat=True))
 
 class NoteForm(forms.ModelForm):
     class Meta:
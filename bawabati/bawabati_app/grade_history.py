@@ -0,0 +1,95 @@
+"""Append-only grade change log.
+
+``Grade.save`` records a ``GradeChange`` holding only the fields that changed,
+in the same transaction as the write. Deletions are recorded from
+``post_delete`` (see signals.py), so grades removed by ``QuerySet.delete()``
+or by the cascade of a deleted course or student are logged as well. Inside
+``recording()`` the changes of many saves and deletes are buffered and
+written with one ``bulk_create`` when the block exits. Grades are rebuilt for
+any past moment by replaying a course's changes up to it, using the
+``(course_id, changed_at)`` index.
+
+``QuerySet.update()`` and ``bulk_create()`` bypass ``Grade.save`` and are not
+logged; their callers write the entries themselves (see grading.py).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+
+from . import tenancy
+
+_buffer = ContextVar('grade_change_buffer', default=None)
+
+BATCH_SIZE = 500
+
+
+def record(change):
+    """Write ``change`` now, or buffer it when inside ``recording()``."""
+    buffer = _buffer.get()
+    if buffer is None:
+        change.save(force_insert=True)
+    else:
+        buffer.append(change)
+
+
+@contextmanager
+def recording(changed_by_id=None):
+    """Run a block in one transaction, writing its grade changes in batches.
+
+    Deletions logged in the block are attributed to ``changed_by_id``.
+    """
+    if _buffer.get() is not None:
+        # Nested: the outer block flushes
+        yield
+        return
+    buffer = []
+    token = _buffer.set(buffer)
+    try:
+        with transaction.atomic(using=tenancy.db_alias()):
+            yield
+            for change in buffer:
+                if change.action == change.DELETE:
+                    change.changed_by_id = changed_by_id
+            if buffer:
+                type(buffer[0]).objects.bulk_create(buffer, batch_size=BATCH_SIZE)
+    finally:
+        _buffer.reset(token)
+
+
+def replay(changes):
+    """Fold ordered ``GradeChange`` rows into ``{grade_id: fields}``."""
+    grades = {}
+    for change in changes:
+        if change.action == change.DELETE:
+            grades.pop(change.grade_id, None)
+            continue
+        state = grades.setdefault(change.grade_id, {
+            'id': change.grade_id,
+            'student_id': change.student_id,
+            'course_id': change.course_id,
+            'semester': change.semester,
+            'assessment_type': change.assessment_type,
+        })
+        state.update(change.changes)
+        state['updated_at'] = change.changed_at
+    return grades
+
+
+def grades_as_of(course_id, when):
+    """The grades of a course as they stood at ``when``."""
+    from .models import GradeChange
+
+    changes = (
+        GradeChange.objects
+        .filter(course_id=course_id, changed_at__lte=when)
+        .order_by('changed_at', 'id')
+    )
+    return sorted(replay(changes.iterator()).values(),
+                  key=lambda grade: (grade['semester'], grade['assessment_type'], grade['student_id']))
+
+
+def history(grade_id):
+    from .models import GradeChange
+
+    return GradeChange.objects.filter(grade_id=grade_id).order_by('changed_at', 'id')
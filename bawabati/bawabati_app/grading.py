@@ -0,0 +1,242 @@
+"""Recompute grades and reports when a grading policy changes.
+
+Recomputation is set-based: one ``UPDATE`` for the final grades of every
+course sharing a policy, and two for their reports (the control average and
+exam grade, then the final average), with the weights bound as parameters.
+Nothing is loaded into Python apart from the before/after values needed to
+log grade changes and report what moved.
+
+``preview()`` only reads: it selects the values those statements would
+write, built from the same expressions, so the what-if numbers are the ones
+``recompute()`` would write without locking or logging anything.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Case, DecimalField, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from . import object_cache, rankings, tenancy
+from .models import Course, Grade, GradeChange, GradeReport, GradingPolicy
+
+CONTROL_TYPES = ['control_1', 'control_2']
+PASS_MARK = Decimal('10')
+
+# Largest report changes listed in a preview
+PREVIEW_ROWS = 20
+
+
+def _weight(value):
+    return Value(Decimal(value), output_field=DecimalField(max_digits=3, decimal_places=2))
+
+
+def _rounded(expression):
+    return Round(expression, 2, output_field=DecimalField(max_digits=4, decimal_places=2))
+
+
+def _zero():
+    return Value(Decimal('0'), output_field=DecimalField(max_digits=4, decimal_places=2))
+
+
+def _same_report_grades():
+    return Grade.objects.filter(
+        student_id=OuterRef('student_id'),
+        course_id=OuterRef('course_id'),
+        semester=OuterRef('semester'),
+    ).order_by()
+
+
+def _final_grade(weights):
+    """A grade's final grade under ``weights``."""
+    return _rounded(
+        F('written_grade') * _weight(weights['written_weight'])
+        + Coalesce(F('participation'), _zero()) * _weight(weights['participation_weight'])
+        + Coalesce(F('homework'), _zero()) * _weight(weights['homework_weight'])
+    )
+
+
+def _report_parts(grades, field):
+    """The control average and exam grade of a report, from ``field`` of its ``grades``.
+
+    Also returns the report's controls, which ``_final_average`` needs.
+    """
+    controls = grades.filter(assessment_type__in=CONTROL_TYPES)
+    control_average = controls.values('student_id').annotate(average=Avg(field)).values('average')
+    exam = grades.filter(assessment_type='exam').values(field)[:1]
+    return (
+        Coalesce(_rounded(Subquery(control_average)), _zero()),
+        Coalesce(Subquery(exam), F('exam_grade')),
+        controls,
+    )
+
+
+def _final_average(weights, controls, continuous_field, exam_field):
+    # Same rule as GradeReport.save: no average without controls and an exam grade
+    return Case(
+        When(
+            Exists(controls) & ~Q(**{exam_field: 0}),
+            then=_rounded(
+                F(continuous_field) * _weight(weights['continuous_weight'])
+                + F(exam_field) * _weight(weights['exam_weight'])
+            ),
+        ),
+        default=Value(None),
+        output_field=DecimalField(max_digits=4, decimal_places=2),
+    )
+
+
+def _update_grades(course_ids, weights):
+    return Grade.objects.filter(course_id__in=course_ids).update(final_grade=_final_grade(weights))
+
+
+def _update_reports(course_ids, weights):
+    reports = GradeReport.objects.filter(course_id__in=course_ids)
+    continuous, exam, controls = _report_parts(_same_report_grades(), 'final_grade')
+    reports.update(continuous_assessment_average=continuous, exam_grade=exam)
+    reports.update(final_average=_final_average(weights, controls, 'continuous_assessment_average', 'exam_grade'))
+
+
+def _preview_snapshot(course_ids, weights):
+    """``_snapshot()`` as ``_update_grades`` and ``_update_reports`` would leave it, read-only."""
+    grades = dict(
+        Grade.objects.filter(course_id__in=course_ids)
+        .annotate(new_final_grade=_final_grade(weights))
+        .values_list('id', 'new_final_grade')
+    )
+    new_grades = _same_report_grades().annotate(new_final_grade=_final_grade(weights))
+    continuous, exam, controls = _report_parts(new_grades, 'new_final_grade')
+    reports = {
+        (student_id, course_id, semester): average
+        for student_id, course_id, semester, average in GradeReport.objects
+        .filter(course_id__in=course_ids)
+        .annotate(new_continuous=continuous, new_exam=exam)
+        .annotate(new_final_average=_final_average(weights, controls, 'new_continuous', 'new_exam'))
+        .values_list('student_id', 'course_id', 'semester', 'new_final_average')
+    }
+    return grades, reports
+
+
+def _snapshot(course_ids):
+    grades = dict(Grade.objects.filter(course_id__in=course_ids).values_list('id', 'final_grade'))
+    reports = {
+        (student_id, course_id, semester): average
+        for student_id, course_id, semester, average in GradeReport.objects
+        .filter(course_id__in=course_ids)
+        .values_list('student_id', 'course_id', 'semester', 'final_average')
+    }
+    return grades, reports
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def _passing(values):
+    return sum(1 for value in values if value is not None and value >= PASS_MARK)
+
+
+def _summarise(course_ids, before, after):
+    grades_before, reports_before = before
+    grades_after, reports_after = after
+    changed_reports = [
+        {'student_id': key[0], 'course_id': key[1], 'semester': key[2],
+         'before': reports_before.get(key), 'after': average}
+        for key, average in reports_after.items() if reports_before.get(key) != average
+    ]
+    changed_reports.sort(key=lambda row: abs((row['after'] or 0) - (row['before'] or 0)), reverse=True)
+    return {
+        'courses': len(course_ids),
+        'grades': len(grades_after),
+        'grades_changed': sum(1 for pk, grade in grades_after.items() if grades_before.get(pk) != grade),
+        'reports': len(reports_after),
+        'reports_changed': len(changed_reports),
+        'mean_before': _mean(reports_before.values()),
+        'mean_after': _mean(reports_after.values()),
+        'passing_before': _passing(reports_before.values()),
+        'passing_after': _passing(reports_after.values()),
+        'largest_changes': changed_reports[:PREVIEW_ROWS],
+    }
+
+
+def _log_grade_changes(grade_ids, changed_by_id):
+    """Append the recomputed final grades of ``grade_ids`` to the grade change log.
+
+    Entries hold the new value only, like those of ``Grade.save``, so replaying
+    the log rebuilds the grades; the old value is the previous entry's.
+    """
+    now = timezone.now()
+    rows = Grade.objects.filter(pk__in=grade_ids).values(
+        'id', 'course_id', 'student_id', 'semester', 'assessment_type', 'final_grade')
+    GradeChange.objects.bulk_create([
+        GradeChange(
+            grade_id=row['id'], course_id=row['course_id'], student_id=row['student_id'],
+            semester=row['semester'], assessment_type=row['assessment_type'], action=GradeChange.UPDATE,
+            changes={'final_grade': row['final_grade']},
+            changed_by_id=changed_by_id, changed_at=now,
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+def _apply(groups, changed_by_id=None):
+    """Rewrite the grades and reports of ``{weights: course_ids}`` groups; must run in a transaction."""
+    course_ids = [course_id for ids in groups.values() for course_id in ids]
+    before = _snapshot(course_ids)
+    for weights, ids in groups.items():
+        weights = dict(weights)
+        _update_grades(ids, weights)
+        _update_reports(ids, weights)
+    after = _snapshot(course_ids)
+
+    _log_grade_changes([pk for pk, grade in before[0].items() if after[0].get(pk) != grade], changed_by_id)
+    students = set()
+    for key, average in after[1].items():
+        if before[1].get(key) != average:
+            rankings.schedule_refresh(key[1], key[2])
+        students.add(key[0])
+    students.update(Grade.objects.filter(course_id__in=course_ids).values_list('student_id', flat=True).distinct())
+    # Only drop cached transcripts once the new grades are visible
+    object_cache.bump_on_commit(*(f'student:{pk}' for pk in students))
+    return _summarise(course_ids, before, after)
+
+
+def _groups(course_ids, weights=None):
+    """Group courses by the weights applying to them, overridden by ``weights`` when given."""
+    if weights is not None:
+        return {tuple(sorted(weights.items())): list(course_ids)} if course_ids else {}
+    groups = {}
+    courses = Course.objects.filter(pk__in=course_ids).select_related('grading_policy')
+    for course in courses:
+        policy_weights = course.grading_policy.weights if course.grading_policy else GradingPolicy.DEFAULT_WEIGHTS
+        groups.setdefault(tuple(sorted(policy_weights.items())), []).append(course.pk)
+    return groups
+
+
+def recompute(course_ids, changed_by_id=None):
+    """Recompute the grades and reports of ``course_ids`` under their current policies."""
+    with transaction.atomic(using=tenancy.db_alias()):
+        return _apply(_groups(course_ids), changed_by_id)
+
+
+def preview(course_ids, weights=None):
+    """Summarise what recomputing ``course_ids`` would change, without writing anything.
+
+    ``weights`` overrides the courses' policies, for trying out a policy
+    before saving it.
+    """
+    groups = _groups(course_ids, weights)
+    course_ids = [course_id for ids in groups.values() for course_id in ids]
+    after = ({}, {})
+    for weights, ids in groups.items():
+        grades, reports = _preview_snapshot(ids, dict(weights))
+        after[0].update(grades)
+        after[1].update(reports)
+    return _summarise(course_ids, _snapshot(course_ids), after)
+
+
+def apply_policy(policy_id, changed_by_id=None):
+    """Recompute every course using a policy; run as a background job."""
+    course_ids = list(Course.objects.filter(grading_policy_id=policy_id).values_list('pk', flat=True))
+    return recompute(course_ids, changed_by_id)
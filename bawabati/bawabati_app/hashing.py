@@ -0,0 +1,18 @@
+"""Password hashing for process-pool workers.
+
+Spawned workers import this module without the Django app registry, so it must
+not import models; each worker configures just enough settings for
+``make_password``.
+"""
+
+
+def init_worker(hashers):
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(PASSWORD_HASHERS=hashers)
+
+
+def hash_batch(passwords):
+    """Hash each password; ``None`` gives an unusable password."""
+    from django.contrib.auth.hashers import make_password
+    return [make_password(password) for password in passwords]
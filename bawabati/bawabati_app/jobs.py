@@ -0,0 +1,82 @@
+"""Minimal in-process background jobs.
+
+Jobs run on a small thread pool inside the web or management process. Their
+status is mirrored into the default cache so any worker can report on a job,
+whichever process started it. A job runs for the tenant that submitted it.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+from . import tenancy
+
+logger = logging.getLogger(__name__)
+
+JOB_TTL = 24 * 60 * 60
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_JOB_WORKERS', 2),
+            thread_name_prefix='bawabati-job',
+        )
+    return _executor
+
+
+def _cache_key(job_id):
+    return f'job:{job_id}'
+
+
+def _save(job):
+    cache.set(_cache_key(job['id']), job, JOB_TTL)
+
+
+def get_job(job_id):
+    """Return the status dict of a job, or None if it is unknown or expired."""
+    return cache.get(_cache_key(job_id))
+
+
+def _run(job, tenant, func, args, kwargs):
+    with tenancy.use_tenant(tenant):
+        _execute(job, func, args, kwargs)
+
+
+def _execute(job, func, args, kwargs):
+    job.update(status='running', started_at=timezone.now().isoformat())
+    _save(job)
+    try:
+        job['result'] = func(*args, **kwargs)
+        job['status'] = 'done'
+    except Exception as e:
+        logger.exception('Background job %s (%s) failed', job['id'], job['name'])
+        job.update(status='failed', error=str(e))
+    finally:
+        job['finished_at'] = timezone.now().isoformat()
+        _save(job)
+        connections.close_all()
+
+
+def submit(name, func, *args, **kwargs):
+    """Queue ``func(*args, **kwargs)`` and return its job status dict."""
+    job = {
+        'id': uuid.uuid4().hex,
+        'name': name,
+        'status': 'queued',
+        'created_at': timezone.now().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+        'result': None,
+        'error': None,
+    }
+    _save(job)
+    _get_executor().submit(_run, dict(job), tenancy.get_current(), func, args, kwargs)
+    return job
@@ -0,0 +1,50 @@
+import base64
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from bawabati_app import tenancy
+from bawabati_app.authentication import SignedTokenAuthentication
+from bawabati_app.tokens import issue_tokens, revoke_tokens
+
+
+class Command(BaseCommand):
+    help = 'Compares the per-request cost of HTTP Basic and signed token authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--basic-iterations', type=int, default=20)
+        parser.add_argument('--token-iterations', type=int, default=10000)
+
+    def _time(self, authenticator, django_request, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            user, _auth = authenticator.authenticate(Request(django_request))
+            user.pk
+        return (time.perf_counter() - start) / iterations
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        password = 'bench-auth-password'
+
+        # Everything runs inside a rolled back transaction so no user is left behind
+        with transaction.atomic(using=tenancy.db_alias()):
+            user = User.objects.create_user(username='bench-auth-user', password=password)
+            credentials = base64.b64encode(f'{user.username}:{password}'.encode()).decode()
+            basic_request = factory.get('/api/auth/user/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+            token_request = factory.get('/api/auth/user/', HTTP_AUTHORIZATION=f"Bearer {issue_tokens(user)['access']}")
+
+            basic = self._time(BasicAuthentication(), basic_request, options['basic_iterations'])
+            token = self._time(SignedTokenAuthentication(), token_request, options['token_iterations'])
+
+            # Also drops the cached token version of the throwaway user
+            revoke_tokens(user)
+            transaction.set_rollback(True, using=tenancy.db_alias())
+
+        self.stdout.write(f'Basic authentication:  {basic * 1000:10.3f} ms/request')
+        self.stdout.write(f'Signed token:          {token * 1_000_000:10.3f} us/request')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {basic / token:,.0f}x'))
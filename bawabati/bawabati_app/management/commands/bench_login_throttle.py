@@ -0,0 +1,85 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+
+class Command(BaseCommand):
+    help = ('Measures legitimate logins while a credential-stuffing burst guesses the passwords of the same '
+            'accounts from another address, with and without throttling')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attackers', type=int, default=8, help='Concurrent attacking threads')
+        parser.add_argument('--logins', type=int, default=10, help='Legitimate logins measured per phase')
+        parser.add_argument('--interval', type=float, default=0.02,
+                            help='Pause between requests of one attacker, standing in for network round-trips')
+        parser.add_argument('--warmup', type=float, default=5, help='Seconds the attack runs before measuring')
+
+    def _legit_logins(self, count, password):
+        client = Client(REMOTE_ADDR='10.0.0.10')
+        latencies = []
+        refused = 0
+        for i in range(count):
+            start = time.perf_counter()
+            response = client.post('/api/auth/login/', {'username': f'bench-login-{i}', 'password': password},
+                                   content_type='application/json')
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                refused += 1
+                self.stderr.write(f'Legitimate login {i} got HTTP {response.status_code}')
+        return latencies, refused
+
+    def _attack(self, stop, counts, interval, targets, number):
+        client = Client()
+        i = 0
+        try:
+            while not stop.is_set():
+                # Guesses the passwords of the very accounts that are logging in, from a
+                # new address each time as a botnet would
+                response = client.post('/api/auth/login/', {'username': f'bench-login-{i % targets}', 'password': 'guess'},
+                                       content_type='application/json', REMOTE_ADDR=f'10.6.{number}.{i % 250 + 1}')
+                counts[response.status_code] = counts.get(response.status_code, 0) + 1
+                i += 1
+                stop.wait(interval)
+        finally:
+            connection.close()
+
+    def _phase(self, label, options, password):
+        stop = threading.Event()
+        counts = {}
+        attackers = [threading.Thread(target=self._attack, args=(stop, counts, options['interval'], options['logins'], n))
+                     for n in range(options['attackers'])]
+        for thread in attackers:
+            thread.start()
+        try:
+            time.sleep(options['warmup'])
+            latencies, refused = self._legit_logins(options['logins'], password)
+        finally:
+            stop.set()
+            for thread in attackers:
+                thread.join()
+        self._report(label, latencies, refused, counts)
+
+    def _report(self, label, latencies, refused, counts=None):
+        latencies = [l * 1000 for l in latencies]
+        line = (f'{label:<28} median {statistics.median(latencies):8.1f} ms   max {max(latencies):8.1f} ms   '
+                f'refused {refused}/{len(latencies)}')
+        if counts:
+            line += '   attacker responses ' + ', '.join(f'{code}: {n}' for code, n in sorted(counts.items()))
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        password = 'bench-login-password'
+        users = [User.objects.create_user(username=f'bench-login-{i}', password=password)
+                 for i in range(options['logins'])]
+        try:
+            self._report('No attack', *self._legit_logins(options['logins'], password))
+            with override_settings(LOGIN_THROTTLE={'ENABLED': False}):
+                self._phase('Attack, throttling off', options, password)
+            self._phase('Attack, throttling on', options, password)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bawabati_app import api_views, renderers, tenancy
+from bawabati_app.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Compares the CPU time of the API renderers on real endpoint responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Renders timed per endpoint and renderer')
+        parser.add_argument('--user', help='Admin username to request as (default: the first admin)')
+        parser.add_argument('--course', type=int, help='Course whose grades are listed (default: the most graded)')
+
+    def _admin(self, username):
+        admins = User.objects.filter(userprofile__role='admin').order_by('id')
+        if username:
+            admins = admins.filter(username=username)
+        admin = admins.first()
+        if admin is None:
+            raise CommandError('An admin user is required.')
+        return admin
+
+    def _data(self, view, path, user, **kwargs):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        if response.status_code != 200:
+            raise CommandError(f'GET {path} returned {response.status_code}: {response.data}')
+        return response.data
+
+    def _time(self, render, data, iterations):
+        render(data)  # Warm up
+        start = time.process_time()
+        for _ in range(iterations):
+            output = render(data)
+        return (time.process_time() - start) / iterations, output
+
+    def handle(self, *args, **options):
+        admin = self._admin(options['user'])
+        course_id = options['course'] or (
+            Course.objects.annotate(grade_count=Count('grades')).order_by('-grade_count', 'id')
+            .values_list('id', flat=True).first())
+        if course_id is None:
+            raise CommandError('There are no courses to list grades for.')
+
+        # list_grades tops up missing reports; keep the database as it was
+        with transaction.atomic(using=tenancy.db_alias()):
+            endpoints = [
+                ('admin_dashboard_data', self._data(api_views.admin_dashboard_data, '/api/dashboard/admin/', admin)),
+                ('course_list', self._data(api_views.course_list, '/api/courses/', admin)),
+                (f'list_grades({course_id})', self._data(
+                    api_views.list_grades, f'/api/courses/{course_id}/grades/', admin, course_id=course_id)),
+            ]
+            transaction.set_rollback(True, using=tenancy.db_alias())
+
+        candidates = [
+            ('drf json', JSONRenderer().render),
+            ('fast json', renderers.FastJSONRenderer().render),
+        ]
+        if renderers.msgpack:
+            candidates.append(('msgpack', renderers.MessagePackRenderer().render))
+        self.stdout.write(
+            f"orjson {'installed' if renderers.orjson else 'not installed'}, "
+            f"msgpack {'installed' if renderers.msgpack else 'not installed'}, "
+            f"{options['iterations']} renders each")
+        for name, data in endpoints:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            baseline = None
+            for label, render in candidates:
+                seconds, output = self._time(render, data, options['iterations'])
+                if baseline is None:
+                    baseline, expected = seconds, output
+                    note = ''
+                elif label == 'msgpack':
+                    same = renderers.unpackb(output) == json.loads(expected)
+                    note = 'same values' if same else self.style.ERROR('VALUES DIFFER')
+                else:
+                    note = 'identical bytes' if output == expected else self.style.WARNING('bytes differ')
+                saved = (1 - seconds / baseline) * 100 if baseline else 0
+                self.stdout.write(
+                    f'  {label:<10} {seconds * 1000:8.3f} ms/render  {saved:+6.1f}% CPU saved  '
+                    f'{len(output):>9} bytes  {note}')
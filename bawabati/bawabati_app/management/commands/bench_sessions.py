@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from bawabati_app import sessions, tenancy
+
+PATHS = [
+    ('html', '/courses/'),
+    ('api', '/api/courses/'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Counts the database queries and time per authenticated request with each session mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests timed per mode and path')
+        parser.add_argument('--user', help='Username to request as (default: the first student)')
+
+    def _user(self, username):
+        users = User.objects.filter(is_active=True).order_by('id')
+        users = users.filter(username=username) if username else users.filter(userprofile__role='student')
+        user = users.first()
+        if user is None:
+            raise CommandError('An active user is required.')
+        return user
+
+    def _host(self):
+        slug = tenancy.get_current()
+        if slug:
+            return tenancy.get_tenants()[slug]['HOSTS'][0]
+        return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+    def _measure(self, client, path, requests):
+        response = client.get(path)  # Warm up: caches filled, middleware loaded
+        if response.status_code != 200:
+            raise CommandError(f'GET {path} returned {response.status_code}.')
+        queries = session_queries = 0
+        elapsed = 0.0
+        for _ in range(requests):
+            with CaptureQueriesContext(connections[tenancy.db_alias()]) as captured:
+                start = time.perf_counter()
+                client.get(path)
+                elapsed += time.perf_counter() - start
+            queries += len(captured)
+            session_queries += sum('django_session' in query['sql'] for query in captured)
+        return queries / requests, session_queries / requests, elapsed / requests
+
+    def handle(self, *args, **options):
+        user = self._user(options['user'])
+        requests = options['requests']
+        results = {}
+        # Logging in writes sessions; roll them back, and keep the purge job out of it
+        with transaction.atomic(using=tenancy.db_alias()), \
+                override_settings(SESSIONS={**sessions.get_config(), 'PURGE_INTERVAL': 0}):
+            for mode in sessions.MODES:
+                with override_settings(SESSION_ENGINE=sessions.engine(mode)):
+                    client = Client(HTTP_HOST=self._host())
+                    client.force_login(user)
+                    for label, path in PATHS:
+                        results[mode, label] = self._measure(client, path, requests)
+            transaction.set_rollback(True, using=tenancy.db_alias())
+
+        self.stdout.write(f'{user.username}, {requests} requests per mode and path')
+        for label, path in PATHS:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label} {path}'))
+            baseline = results['db', label]
+            for mode in sessions.MODES:
+                queries, session_queries, seconds = results[mode, label]
+                self.stdout.write(
+                    f'  {mode:<7} {queries:6.2f} queries/request  {session_queries:5.2f} on django_session  '
+                    f'{baseline[0] - queries:+6.2f} saved  {seconds * 1000:8.3f} ms/request')
@@ -0,0 +1,114 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so nothing is already imported or cached
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import django
+from django.conf import settings
+settings.INSTALLED_APPS  # imports the settings module
+imported = time.perf_counter()
+django.setup(set_prefix=False)
+apps_ready = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+handler_ready = time.perf_counter()
+
+
+def request(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer,
+        'wsgi.errors': sys.stderr,
+    }
+    status = []
+    began = time.perf_counter()
+    response = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+    b''.join(response)
+    response.close()
+    return time.perf_counter() - began, status[0]
+
+
+first, status = request(sys.argv[1])
+second, _status = request(sys.argv[1])
+print(json.dumps({
+    'import': imported - start,
+    'setup': apps_ready - imported,
+    'handler': handler_ready - apps_ready,
+    'first_request': first,
+    'second_request': second,
+    'status': status,
+    'apps': len(settings.INSTALLED_APPS),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measures worker startup: settings import, app registry, middleware loading and first request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-modules', nargs='+',
+                            help='Settings modules to compare (default: the current one)')
+        parser.add_argument('--path', default='/login/', help='URL requested after startup')
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh processes started per settings module')
+        parser.add_argument('--imports', type=int, default=10,
+                            help='Also list the slowest imports of the first run (0 to skip)')
+
+    def _run(self, module, path, importtime):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': module}
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE, path]
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+                                stdin=subprocess.DEVNULL)
+        wall = time.perf_counter() - started
+        if result.returncode != 0:
+            raise CommandError(f'{module} failed to start:\n{result.stderr[-2000:]}')
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process'] = wall
+        return timings, result.stderr
+
+    def _slowest_imports(self, stderr, count):
+        """The modules with the largest self time in ``-X importtime`` output."""
+        rows = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((int(self_us), int(cumulative_us), name.strip()))
+        return sorted(rows, reverse=True)[:count]
+
+    def handle(self, *args, **options):
+        modules = options['settings_modules'] or [os.environ.get('DJANGO_SETTINGS_MODULE', 'bawabati.settings')]
+        phases = ['import', 'setup', 'handler', 'first_request', 'second_request', 'process']
+        for module in modules:
+            runs = []
+            for index in range(options['repeat']):
+                # -X importtime slows the interpreter down, so only the first run uses it
+                importtime = index == 0 and options['imports'] > 0
+                timings, stderr = self._run(module, options['path'], importtime)
+                if importtime:
+                    slowest = self._slowest_imports(stderr, options['imports'])
+                else:
+                    runs.append(timings)
+            if not runs:
+                runs.append(timings)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{module}: {runs[0]['apps']} apps, GET {options['path']} -> {runs[0]['status']}, "
+                f"median of {len(runs)} runs"))
+            for phase in phases:
+                median = statistics.median(run[phase] for run in runs)
+                self.stdout.write(f'  {phase:<15} {median * 1000:9.1f} ms')
+            if options['imports'] > 0:
+                self.stdout.write('  slowest imports (self / cumulative ms):')
+                for self_us, cumulative_us, name in slowest:
+                    self.stdout.write(f'    {self_us / 1000:7.1f} {cumulative_us / 1000:8.1f}  {name}')
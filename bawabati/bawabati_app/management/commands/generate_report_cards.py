@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bawabati_app.models import Grade
+from bawabati_app.report_cards import build_archive
+
+
+class Command(BaseCommand):
+    help = 'Generates a ZIP archive with the PDF report card of every student for a semester'
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[value for value, _label in Grade.SEMESTER_CHOICES])
+        parser.add_argument('--output', help="Path of the ZIP file (defaults to REPORT_CARDS['DIR'])")
+        parser.add_argument('--workers', type=int, help='Rendering processes (defaults to the CPU count)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            result = build_archive(options['semester'], output=options['output'], workers=options['workers'])
+        except OSError as e:
+            raise CommandError(f'Could not write the archive: {e}')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {result['count']} report cards to {result['path']} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,91 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bawabati_app import profiling
+
+
+class Command(BaseCommand):
+    help = 'Lists and summarizes stored request profiles, and issues profiling tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'show', 'flame', 'token', 'prune'])
+        parser.add_argument('target', nargs='?', help='Profile id for show/flame, username for token')
+        parser.add_argument('--limit', type=int, default=25, help='Rows to print for list and show')
+        parser.add_argument('--sort', choices=['cumulative', 'tottime', 'calls'], default='cumulative')
+        parser.add_argument('--output', '-o', help='File to write flame graph data to (default: stdout)')
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_list(self, options):
+        profiles = profiling.list_profiles()[:options['limit']]
+        if not profiles:
+            self.stdout.write('No stored profiles.')
+            return
+        for summary in profiles:
+            self.stdout.write(
+                f"{summary['id']}  {summary['method']:6} {summary['status']}  {summary['time_ms']:>9.1f} ms  "
+                f"sql {summary['sql']['count']:>4} / {summary['sql']['time_ms']:.1f} ms  "
+                f"templates {summary['template_ms']:.1f} ms  {summary['path']}"
+            )
+
+    def _load(self, options):
+        if not options['target']:
+            raise CommandError('A profile id is required.')
+        try:
+            return profiling.load(options['target'])
+        except FileNotFoundError:
+            raise CommandError(f"No profile {options['target']}.")
+
+    def handle_show(self, options):
+        summary, stats = self._load(options)
+        sql = summary['sql']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{summary['method']} {summary['path']} -> {summary['status']}"))
+        self.stdout.write(
+            f"Total {summary['time_ms']:.1f} ms, templates {summary['template_ms']:.1f} ms, "
+            f"{sql['count']} queries in {sql['time_ms']:.1f} ms ({sql['duplicates']} repeated), "
+            f"{summary['samples']} stack samples"
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nTop functions by {options['sort']}"))
+        self.stdout.write(f"{'calls':>8} {'own ms':>10} {'cum ms':>10}  function")
+        for row in profiling.top_functions(stats, options['sort'], options['limit']):
+            self.stdout.write(f"{row['calls']:>8} {row['tottime_ms']:>10.2f} {row['cumtime_ms']:>10.2f}  {row['function']}")
+        if sql['slowest']:
+            self.stdout.write(self.style.MIGRATE_HEADING('\nSlowest queries'))
+            for query in sql['slowest'][:options['limit']]:
+                self.stdout.write(f"{query['time_ms']:>8.2f} ms  x{query['repeated']:<3} [{query['db']}] {query['sql'][:200]}")
+
+    def handle_flame(self, options):
+        if not options['target']:
+            raise CommandError('A profile id is required.')
+        try:
+            lines = profiling.folded_stacks(options['target'])
+        except FileNotFoundError:
+            raise CommandError(f"No flame graph data for {options['target']}.")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(lines)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote folded stacks to {options['output']} (render with flamegraph.pl or speedscope)"))
+        else:
+            self.stdout.write(lines, ending='')
+
+    def handle_token(self, options):
+        try:
+            user = User.objects.get(username=options['target'])
+        except User.DoesNotExist:
+            raise CommandError('A valid admin username is required.')
+        token = profiling.make_token(user)
+        if profiling.user_for_token(token) is None:
+            raise CommandError(f'{user.username} is not an admin.')
+        self.stdout.write(json.dumps({
+            'token': token,
+            'header': 'X-Profile',
+            'query_param': profiling.QUERY_PARAM,
+            'expires_in': profiling.get_config()['TOKEN_MAX_AGE'],
+        }, indent=2))
+
+    def handle_prune(self, options):
+        self.stdout.write(self.style.SUCCESS(f'Removed {profiling.prune()} expired profiles.'))
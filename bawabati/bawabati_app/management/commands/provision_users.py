@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bawabati_app.provisioning import RosterError, parse_roster, provision
+
+
+class Command(BaseCommand):
+    help = 'Creates teachers and students in bulk from a CSV roster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='CSV file with username, role and optional email, first_name, last_name, password columns')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (defaults to the CPU count)')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the roster')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['roster'], encoding='utf-8-sig', newline='') as roster:
+                rows = parse_roster(roster)
+        except OSError as e:
+            raise CommandError(f'Could not read the roster: {e}')
+        except RosterError as e:
+            raise CommandError('Invalid roster:\n' + '\n'.join(e.errors))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{len(rows)} users are valid; nothing was created'))
+            return
+
+        start = time.perf_counter()
+        count = provision(rows, workers=options['workers'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Created {count} users in {elapsed:.1f}s'))
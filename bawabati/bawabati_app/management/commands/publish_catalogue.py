@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from bawabati_app import catalogue
+
+
+class Command(BaseCommand):
+    help = 'Publishes the course catalogue as static JSON and HTML files, rewriting only the changed shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rewrite every shard and the manifest')
+
+    def handle(self, *args, **options):
+        result = catalogue.publish(force=options['force'])
+        if not result['changed']:
+            self.stdout.write(f"Catalogue {result['version']} is up to date.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Published catalogue {result['version']} to {catalogue.output_dir()}: "
+            f"{result['written']} of {result['shards']} shards written, {result['removed']} old files removed."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from bawabati_app import sessions
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions from the database, a batch at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help="Sessions deleted per query (default: SESSIONS['PURGE_BATCH_SIZE'])")
+
+    def handle(self, *args, **options):
+        removed = sessions.purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired sessions.'))
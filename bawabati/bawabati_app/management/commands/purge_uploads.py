@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from bawabati_app import uploads
+
+
+class Command(BaseCommand):
+    help = 'Removes resumable uploads that have not received a chunk for a while, with their chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=float,
+                            help="Age past which an upload is removed (default: UPLOADS['MAX_AGE_HOURS'])")
+
+    def handle(self, *args, **options):
+        removed = uploads.collect_garbage(options['max_age_hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed['sessions']} upload sessions ({removed['incomplete']} incomplete) "
+            f"and {removed['orphan_dirs']} orphaned chunk directories."))
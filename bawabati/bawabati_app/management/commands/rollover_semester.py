@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from bawabati_app.archive import rollover
+
+
+class Command(BaseCommand):
+    help = 'Archives courses that have ended and removes them from the live tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=parse_date, help='Archive courses ending before this date (YYYY-MM-DD, defaults to today)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        summary = rollover(before=options['before'], dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - start
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['courses']} courses ({summary['enrollments']} enrollments, "
+            f"{summary['grades']} grades, {summary['notes']} notes) in {elapsed:.1f}s"
+        ))
+        if summary['archived_bytes']:
+            self.stdout.write(f"Compressed archive size: {summary['archived_bytes'] / 1024:.1f} KiB")
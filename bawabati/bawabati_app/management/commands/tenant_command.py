@@ -0,0 +1,30 @@
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from bawabati_app import tenancy
+
+
+class Command(BaseCommand):
+    help = "Runs a management command for one tenant, or for every tenant with 'all'"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tenant', help="Tenant slug from settings.TENANTS, or 'all'")
+        parser.add_argument('command_name', help='Command to run, e.g. migrate or purge_uploads')
+        parser.add_argument('command_args', nargs=argparse.REMAINDER, help="The command's own arguments")
+
+    def handle(self, *args, **options):
+        tenants = tenancy.get_tenants()
+        slugs = list(tenants) if options['tenant'] == 'all' else [options['tenant']]
+        for slug in slugs:
+            if slug not in tenants:
+                raise CommandError(f'Unknown tenant {slug!r}; known tenants: {", ".join(tenants) or "none"}.')
+        for slug in slugs:
+            command_args = list(options['command_args'])
+            # migrate picks its database from --database rather than the routers
+            if options['command_name'] == 'migrate' and not any(a.startswith('--database') for a in command_args):
+                command_args.append(f'--database={tenancy.alias_for(slug)}')
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{slug}: {options['command_name']} {' '.join(command_args)}"))
+            with tenancy.use_tenant(slug):
+                call_command(options['command_name'], *command_args)
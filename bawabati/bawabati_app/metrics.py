@@ -0,0 +1,293 @@
+"""Request metrics in the Prometheus text format.
+
+``middleware.MetricsMiddleware`` records, per URL name and method, a latency histogram
+and response status counts, plus the number and time of the SQL queries, the
+time spent in DRF serializers (``TimedSerializerMixin``) and the time spent
+rendering templates (``MeteredDjangoTemplates``) while serving the request.
+
+Each process aggregates into its own registry. When ``METRICS['DIR']`` is set,
+every process also writes its registry to a file of its own there (at most
+once per ``FLUSH_INTERVAL``), and ``api/metrics/`` adds up all the files, so
+gunicorn or uvicorn workers are reported together. Files are never rewritten
+by another process, which keeps the counters monotonic across worker restarts;
+clear the directory when deploying.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+DEFAULTS = {
+    'DIR': None,
+    'FLUSH_INTERVAL': 1.0,
+    'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+}
+
+# Per-request accumulators, set by the middleware
+_current = ContextVar('request_metrics', default=None)
+
+# Label separator in registry keys; URL names never contain it
+SEP = '|'
+
+# Anything else is counted as OTHER, so clients cannot create label values
+METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+TIMINGS = {
+    'db_queries': ('bawabati_db_queries_total', 'counter', 'SQL queries run while serving requests.'),
+    'db_seconds': ('bawabati_db_query_seconds_total', 'counter', 'Time spent in SQL queries.'),
+    'serializer_seconds': ('bawabati_serializer_seconds_total', 'counter', 'Time spent in DRF serializers.'),
+    'template_seconds': ('bawabati_template_render_seconds_total', 'counter', 'Time spent rendering templates.'),
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Registry:
+    """The metrics of one process; every method is thread-safe."""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.responses = {}
+        self.timings = {name: {} for name in TIMINGS}
+
+    def observe(self, view, method, status, duration, timings):
+        bucket = next((i for i, bound in enumerate(self.buckets) if duration <= bound), len(self.buckets))
+        with self._lock:
+            histogram = self.requests.setdefault(
+                f'{view}{SEP}{method}', {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0})
+            histogram['buckets'][bucket] += 1
+            histogram['sum'] += duration
+            histogram['count'] += 1
+            key = f'{view}{SEP}{method}{SEP}{status}'
+            self.responses[key] = self.responses.get(key, 0) + 1
+            for name, value in timings.items():
+                if value:
+                    self.timings[name][view] = self.timings[name].get(view, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({
+                'buckets': self.buckets,
+                'requests': self.requests,
+                'responses': self.responses,
+                'timings': self.timings,
+            }))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+# Names this process's file in METRICS['DIR']; set with the registry, so a
+# worker forked from a server that imported this module (gunicorn --preload)
+# gets its own
+_worker_id = None
+_worker_pid = None
+_last_flush = 0.0
+
+
+def get_registry():
+    global _registry, _worker_id, _worker_pid
+    if _registry is None or _worker_pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _worker_pid != os.getpid():
+                _worker_pid = os.getpid()
+                _worker_id = f'{_worker_pid}-{int(time.time())}'
+                _registry = Registry(get_config()['BUCKETS'])
+                if get_config()['DIR']:
+                    atexit.register(flush)
+    return _registry
+
+
+def flush():
+    """Write this process's registry to ``METRICS['DIR']``, atomically."""
+    global _last_flush
+    directory = get_config()['DIR']
+    if not directory or _registry is None:
+        return
+    _last_flush = time.monotonic()
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(_registry.snapshot(), f)
+    os.replace(tmp_path, os.path.join(directory, f'{_worker_id}.json'))
+
+
+def _maybe_flush():
+    if get_config()['DIR'] and time.monotonic() - _last_flush >= get_config()['FLUSH_INTERVAL']:
+        flush()
+
+
+@contextmanager
+def timed(name):
+    """Add the block's duration to the current request's ``name`` timing; nested blocks count once."""
+    current = _current.get()
+    if current is None or current['depth'].get(name):
+        yield
+        return
+    current['depth'][name] = 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current['timings'][name] += time.perf_counter() - start
+        current['depth'][name] = 0
+
+
+class TimedSerializerMixin:
+    """Counts ``to_representation`` time towards the request's serializer time."""
+
+    def to_representation(self, instance):
+        with timed('serializer_seconds'):
+            return super().to_representation(instance)
+
+
+class MeteredTemplate:
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        if name == '_wrapped':
+            raise AttributeError(name)
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        with timed('template_seconds'):
+            return self._wrapped.render(context, request)
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each render for the metrics."""
+
+    def from_string(self, template_code):
+        return MeteredTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return MeteredTemplate(super().get_template(template_name))
+
+
+class QueryCounter:
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings['db_queries'] += 1
+            self.timings['db_seconds'] += time.perf_counter() - start
+
+
+@contextmanager
+def collect():
+    """Accumulate the timings of the code run in the block into the yielded dict."""
+    timings = dict.fromkeys(TIMINGS, 0)
+    token = _current.set({'timings': timings, 'depth': {}})
+    try:
+        with ExitStack() as stack:
+            counter = QueryCounter(timings)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            yield timings
+    finally:
+        _current.reset(token)
+
+
+def record(request, status, duration, timings):
+    """Add a served request to this process's registry."""
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name if match else None) or 'unmatched'
+    method = request.method if request.method in METHODS else 'OTHER'
+    get_registry().observe(view, method, status, duration, timings)
+    _maybe_flush()
+
+
+def _merged():
+    """The registries of every process, added up."""
+    config = get_config()
+    snapshots = [get_registry().snapshot()]
+    directory = config['DIR']
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            # This process's own file is older than its live registry
+            if name.endswith('.json') and name != f'{_worker_id}.json':
+                try:
+                    with open(os.path.join(directory, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+    merged = {'requests': {}, 'responses': {}, 'timings': {name: {} for name in TIMINGS}, 'workers': 0}
+    buckets = snapshots[0]['buckets']
+    for snapshot in snapshots:
+        if snapshot['buckets'] != buckets:
+            continue  # Written with other bucket settings, cannot be added up
+        merged['workers'] += 1
+        for key, histogram in snapshot['requests'].items():
+            total = merged['requests'].setdefault(key, {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+        for key, count in snapshot['responses'].items():
+            merged['responses'][key] = merged['responses'].get(key, 0) + count
+        for name, values in snapshot['timings'].items():
+            for view, value in values.items():
+                merged['timings'][name][view] = merged['timings'][name].get(view, 0) + value
+    merged['buckets'] = buckets
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render():
+    """All metrics of all workers in the Prometheus text exposition format."""
+    data = _merged()
+    lines = [
+        '# HELP bawabati_http_request_duration_seconds Request latency by URL name and method.',
+        '# TYPE bawabati_http_request_duration_seconds histogram',
+    ]
+    bounds = [str(bound) for bound in data['buckets']] + ['+Inf']
+    for key, histogram in sorted(data['requests'].items()):
+        view, method = key.split(SEP)
+        cumulative = 0
+        for bound, count in zip(bounds, histogram['buckets']):
+            cumulative += count
+            lines.append(f'bawabati_http_request_duration_seconds_bucket{_labels(view=view, method=method, le=bound)} {cumulative}')
+        lines.append(f"bawabati_http_request_duration_seconds_sum{_labels(view=view, method=method)} {histogram['sum']}")
+        lines.append(f"bawabati_http_request_duration_seconds_count{_labels(view=view, method=method)} {histogram['count']}")
+
+    lines += [
+        '# HELP bawabati_http_responses_total Responses by URL name, method and status code.',
+        '# TYPE bawabati_http_responses_total counter',
+    ]
+    for key, count in sorted(data['responses'].items()):
+        view, method, status = key.split(SEP)
+        lines.append(f'bawabati_http_responses_total{_labels(view=view, method=method, status=status)} {count}')
+
+    for name, (metric, kind, help_text) in TIMINGS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        for view, value in sorted(data['timings'][name].items()):
+            lines.append(f'{metric}{_labels(view=view)} {value}')
+
+    lines += [
+        '# HELP bawabati_metrics_workers Processes whose metrics are included.',
+        '# TYPE bawabati_metrics_workers gauge',
+        f"bawabati_metrics_workers {data['workers']}",
+    ]
+    return '\n'.join(lines) + '\n'
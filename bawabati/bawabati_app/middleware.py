@@ -0,0 +1,219 @@
+import mimetypes
+import os
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import metrics, profiling, routers, staticfiles, tenancy
+
+PIN_COOKIE = 'db_pin'
+
+
+class TenantMiddleware:
+    """Activate the request's tenant (see tenancy.py) while it is served.
+
+    Streamed content is produced after the view returns, so its iterator is
+    wrapped to keep querying the tenant's database.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            slug = tenancy.resolve(request)
+        except tenancy.UnknownTenant:
+            return JsonResponse({'error': 'Unknown school'}, status=404)
+        request.tenant = slug
+        token = tenancy.activate(slug)
+        try:
+            response = self.get_response(request)
+        finally:
+            tenancy.deactivate(token)
+        if slug and response.streaming and not isinstance(response, FileResponse):
+            if response.is_async:
+                response.streaming_content = _iterate_async_as(slug, response.streaming_content)
+            else:
+                response.streaming_content = _iterate_as(slug, response.streaming_content)
+        return response
+
+
+def _iterate_as(slug, iterator):
+    iterator = iter(iterator)
+    while True:
+        with tenancy.use_tenant(slug):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def _iterate_async_as(slug, iterator):
+    iterator = aiter(iterator)
+    while True:
+        with tenancy.use_tenant(slug):
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield chunk
+
+
+class PrimaryPinningMiddleware:
+    """Route a request's queries to the primary once it writes.
+
+    Unsafe methods are pinned from the start. After a write the client gets a
+    short-lived cookie that keeps its next requests on the primary until the
+    replicas have caught up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or PIN_COOKIE in request.COOKIES
+        token = routers.start_request(pinned=pinned)
+        try:
+            response = self.get_response(request)
+            if routers.has_written():
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                    httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            routers.end_request(token)
+
+
+class ProfilingMiddleware:
+    """Profile the requests carrying an admin's signed profiling token.
+
+    See profiling.py. The profile id is returned in the ``X-Profile-Id``
+    header; other requests only pay for one header lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = profiling.get_config()['ENABLED']
+
+    def __call__(self, request):
+        token = request.META.get(profiling.HEADER) or request.GET.get(profiling.QUERY_PARAM)
+        if not (self.enabled and token):
+            return self.get_response(request)
+        user = profiling.user_for_token(token)
+        if user is None:
+            return self.get_response(request)
+        try:
+            with profiling.Profile() as profile:
+                response = self.get_response(request)
+        except profiling.ProfilerBusy:
+            response = self.get_response(request)
+            response['X-Profile-Id'] = 'busy'
+            return response
+        response['X-Profile-Id'] = profiling.save(profile, request, response, user)['id']
+        return response
+
+
+class MetricsMiddleware:
+    """Record the latency, status and component timings of every request, see metrics.py."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        status = 500
+        with metrics.collect() as timings:
+            try:
+                response = self.get_response(request)
+                status = response.status_code
+                return response
+            finally:
+                metrics.record(request, status, time.perf_counter() - start, timings)
+
+
+class PrecompressedStaticMiddleware:
+    """Serve collected static files, precompressed and with long cache lifetimes.
+
+    Requests under STATIC_URL whose file exists in STATIC_ROOT are answered
+    here, before sessions and authentication run; see staticfiles.py.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+        self.root = settings.STATIC_ROOT
+        self._immutable = None
+
+    def immutable_names(self):
+        if self._immutable is None:
+            self._immutable = getattr(staticfiles_storage, 'immutable_names', set)()
+        return self._immutable
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix) or not self.root:
+            return self.get_response(request)
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return self.get_response(request)
+        if not name or not os.path.isfile(path):
+            return self.get_response(request)
+        return self.serve(request, name, path)
+
+    def serve(self, request, name, path):
+        accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding, served_path = None, path
+        for candidate, extension in staticfiles.ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + extension):
+                encoding, served_path = candidate, path + extension
+                break
+
+        immutable = staticfiles.is_immutable(name, self.immutable_names())
+        stat = os.stat(served_path)
+        if not immutable and not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        content_type, _encoding = mimetypes.guess_type(name)
+        response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream',
+                                filename=os.path.basename(name))
+        response['Content-Length'] = stat.st_size
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if staticfiles.compressible(name):
+            response['Vary'] = 'Accept-Encoding'
+        if immutable:
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
+
+
+def _accepted_encodings(header):
+    """Content codings the client accepts, ignoring ones explicitly refused with q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _sep, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bawabati_app', '0002_userprofile_token_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.PositiveIntegerField(unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('start_date', models.DateTimeField(null=True)),
+                ('end_date', models.DateField(db_index=True)),
+                ('student_count', models.PositiveIntegerField(default=0)),
+                ('grade_count', models.PositiveIntegerField(default=0)),
+                ('note_count', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('teacher', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_courses', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-end_date', 'title'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedEnrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrollment_date', models.DateTimeField(null=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_enrollments', to=settings.AUTH_USER_MODEL)),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='bawabati_app.coursearchive')),
+            ],
+            options={
+                'unique_together': {('student', 'archive')},
+            },
+        ),
+    ]
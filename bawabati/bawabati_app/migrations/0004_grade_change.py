@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:35
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+TRACKED_FIELDS = ['written_grade', 'participation', 'homework', 'final_grade', 'comments', 'graded_by_id']
+
+
+def record_baseline(apps, schema_editor):
+    """Log every existing grade as created at its last update."""
+    Grade = apps.get_model('bawabati_app', 'Grade')
+    GradeChange = apps.get_model('bawabati_app', 'GradeChange')
+    batch = []
+    for grade in Grade.objects.order_by('pk').iterator(chunk_size=2000):
+        batch.append(GradeChange(
+            grade_id=grade.pk,
+            course_id=grade.course_id,
+            student_id=grade.student_id,
+            semester=grade.semester,
+            assessment_type=grade.assessment_type,
+            action='create',
+            changes={name: getattr(grade, name) for name in TRACKED_FIELDS},
+            changed_by_id=grade.graded_by_id,
+            changed_at=grade.updated_at,
+        ))
+        if len(batch) >= 2000:
+            GradeChange.objects.bulk_create(batch)
+            batch = []
+    GradeChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bawabati_app', '0003_course_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade_id', models.PositiveIntegerField()),
+                ('course_id', models.PositiveIntegerField()),
+                ('student_id', models.PositiveIntegerField()),
+                ('semester', models.IntegerField(choices=[(1, 'First Semester'), (2, 'Second Semester')])),
+                ('assessment_type', models.CharField(choices=[('control_1', 'Premier Contrôle'), ('control_2', 'Deuxième Contrôle'), ('exam', 'Examen Final')], max_length=20)),
+                ('action', models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')], max_length=6)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course_id', 'changed_at'], name='bawabati_ap_course__2864c4_idx'), models.Index(fields=['grade_id', 'changed_at'], name='bawabati_ap_grade_i_457cd2_idx')],
+            },
+        ),
+        migrations.RunPython(record_baseline, migrations.RunPython.noop),
+    ]
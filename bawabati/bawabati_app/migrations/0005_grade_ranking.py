@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Window
+from django.db.models.functions import DenseRank, PercentRank, Rank
+
+
+def rank_existing_reports(apps, schema_editor):
+    """Materialize the rankings of every course and semester that has reports."""
+    GradeReport = apps.get_model('bawabati_app', 'GradeReport')
+    GradeRanking = apps.get_model('bawabati_app', 'GradeRanking')
+    order = F('final_average').desc()
+    partitions = GradeReport.objects.values_list('course_id', 'semester').distinct().order_by()
+    for course_id, semester in partitions:
+        rows = (
+            GradeReport.objects
+            .filter(course_id=course_id, semester=semester, final_average__isnull=False)
+            .annotate(
+                rank=Window(Rank(), order_by=order),
+                dense_rank=Window(DenseRank(), order_by=order),
+                percent_rank=Window(PercentRank(), order_by=order),
+                ranked_count=Window(Count('id')),
+            )
+            .values('student_id', 'final_average', 'rank', 'dense_rank', 'percent_rank', 'ranked_count')
+        )
+        GradeRanking.objects.bulk_create(
+            [GradeRanking(course_id=course_id, semester=semester, **row) for row in rows]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bawabati_app', '0004_grade_change'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.IntegerField(choices=[(1, 'First Semester'), (2, 'Second Semester')])),
+                ('final_average', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('rank', models.PositiveIntegerField()),
+                ('dense_rank', models.PositiveIntegerField()),
+                ('percent_rank', models.FloatField()),
+                ('ranked_count', models.PositiveIntegerField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='bawabati_app.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_rankings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['semester', 'rank', 'student__username'],
+                'unique_together': {('course', 'semester', 'student')},
+            },
+        ),
+        migrations.RunPython(rank_existing_reports, migrations.RunPython.noop),
+    ]
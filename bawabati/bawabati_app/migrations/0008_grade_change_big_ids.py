@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bawabati_app', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gradechange',
+            name='course_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='gradechange',
+            name='grade_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='gradechange',
+            name='student_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
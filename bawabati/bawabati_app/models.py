@@ -1,11 +1,13 @@
+import uuid
 from django.utils import  timezone
 from datetime import timedelta
-from django.db import models
+from django.db import models, router, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.core.validators import MinValueValidator, MaxValueValidator
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.exceptions import ValidationError
+from . import grade_history
 
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -24,17 +26,75 @@ class UserProfile(models.Model):
 
     # Student specific fields
 
+    # Bumped to revoke every signed API token issued to this user
+    token_version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets a role change revoke the user's API tokens
+        instance._loaded_role = instance.__dict__.get('role')
+        return instance
+
+    def role_changed(self):
+        return getattr(self, '_loaded_role', None) != self.role
+
     def __str__(self):
         return f"{self.user.username} - {self.role}"
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        role = 'admin' if instance.is_superuser else 'student'
-        UserProfile.objects.create(user=instance, role=role)
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
+WEIGHT_VALIDATORS = [MinValueValidator(0), MaxValueValidator(1)]
+
+class GradingPolicy(models.Model):
+    """Weights used to compute grades for the courses attached to this policy.
+
+    Courses without a policy use the school defaults (70/15/15 and 40/60).
+    Saving a policy recomputes every grade of its courses, see grading.py.
+    """
+    DEFAULT_WEIGHTS = {
+        'written_weight': Decimal('0.70'),
+        'participation_weight': Decimal('0.15'),
+        'homework_weight': Decimal('0.15'),
+        'continuous_weight': Decimal('0.40'),
+        'exam_weight': Decimal('0.60'),
+    }
+
+    name = models.CharField(max_length=100, unique=True)
+    written_weight = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.70'), validators=WEIGHT_VALIDATORS)
+    participation_weight = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.15'), validators=WEIGHT_VALIDATORS)
+    homework_weight = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.15'), validators=WEIGHT_VALIDATORS)
+    continuous_weight = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.40'), validators=WEIGHT_VALIDATORS)
+    exam_weight = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.60'), validators=WEIGHT_VALIDATORS)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'grading policies'
+
+    def clean(self):
+        if not all(isinstance(weight, Decimal) for weight in self.weights.values()):
+            return  # Already reported by clean_fields()
+        if self.written_weight + self.participation_weight + self.homework_weight != 1:
+            raise ValidationError('Written, participation and homework weights must add up to 1.')
+        if self.continuous_weight + self.exam_weight != 1:
+            raise ValidationError('Continuous assessment and exam weights must add up to 1.')
+
+    @property
+    def weights(self):
+        return {name: getattr(self, name) for name in self.DEFAULT_WEIGHTS}
+
+    @classmethod
+    def weights_for_course(cls, course_id):
+        """The weights applying to a course, in one query"""
+        policy = cls.objects.filter(courses__pk=course_id).first() if course_id else None
+        return policy.weights if policy else dict(cls.DEFAULT_WEIGHTS)
+
+    def __str__(self):
+        return self.name
+
+def round_grade(value):
+    """Round to two decimals, half away from zero like SQL ROUND on DECIMAL"""
+    return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
 def get_default_end_date():
     return timezone.now().date() + timedelta(days=90)
 class Course(models.Model):
@@ -48,6 +108,17 @@ class Course(models.Model):
     capacity = models.PositiveIntegerField(default=30)  # Or whatever default you want
     end_date = models.DateField(default=get_default_end_date)
     start_date=models.DateTimeField(auto_now_add=True)
+    grading_policy = models.ForeignKey(GradingPolicy, on_delete=models.SET_NULL, null=True, blank=True, related_name='courses')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets a policy switch trigger a recomputation of the course's grades
+        instance._loaded_grading_policy_id = instance.__dict__.get('grading_policy_id')
+        return instance
+
+    def grading_policy_changed(self):
+        return getattr(self, '_loaded_grading_policy_id', None) != self.grading_policy_id
 
     def __str__(self):
         return self.title
@@ -64,6 +135,40 @@ class Note(models.Model):
     def __str__(self):
         return self.title
 
+class UploadSession(models.Model):
+    """A resumable note upload, sent in numbered chunks and completed into a ``Note``.
+
+    The chunks are kept on disk until then, see ``uploads.py``.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='upload_sessions')
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=200)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Optional checksum of the whole file, verified on completion
+    sha256 = models.CharField(max_length=64, blank=True)
+    note = models.OneToOneField(Note, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Touched by every chunk, stale sessions are garbage-collected
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, index):
+        """Expected byte length of chunk ``index`` (numbered from 0)."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    @property
+    def is_complete(self):
+        return self.note_id is not None
+
+    def __str__(self):
+        return f"{self.filename} for {self.course.title}"
+
 class Enrollment(models.Model):
     student = models.ForeignKey(
         User, 
@@ -114,28 +219,102 @@ class Grade(models.Model):
         ordering = ['semester', 'assessment_type', 'student__username']
 
     def calculate_final_grade(self):
-        """Calculate final grade based on components"""
-        weights = {
-            'written': Decimal('0.70'),  # 70% written
-            'participation': Decimal('0.15'),  # 15% participation
-            'homework': Decimal('0.15'),  # 15% homework
-        }
+        """Calculate final grade based on components and the course's grading policy"""
+        weights = GradingPolicy.weights_for_course(self.course_id)
         
-        final = self.written_grade * weights['written']
+        final = self.written_grade * weights['written_weight']
         if self.participation:
-            final += self.participation * weights['participation']
+            final += self.participation * weights['participation_weight']
         if self.homework:
-            final += self.homework * weights['homework']
+            final += self.homework * weights['homework_weight']
             
-        return round(final, 2)
+        return round_grade(final)
+
+    # Fields whose changes are written to the GradeChange log
+    TRACKED_FIELDS = ['written_grade', 'participation', 'homework', 'final_grade', 'comments', 'graded_by_id']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: getattr(instance, name) for name in cls.TRACKED_FIELDS if name in instance.__dict__
+        }
+        return instance
+
+    def changed_fields(self):
+        """Tracked fields that differ from the values loaded from the database"""
+        loaded = {} if self._state.adding else getattr(self, '_loaded_values', {})
+        return {
+            name: getattr(self, name) for name in self.TRACKED_FIELDS
+            if name not in loaded or loaded[name] != getattr(self, name)
+        }
+
+    def _log_change(self, action, changes, changed_by_id=None):
+        grade_history.record(GradeChange(
+            grade_id=self.pk,
+            course_id=self.course_id,
+            student_id=self.student_id,
+            semester=self.semester,
+            assessment_type=self.assessment_type,
+            action=action,
+            changes=changes,
+            changed_by_id=changed_by_id,
+        ))
 
     def save(self, *args, **kwargs):
         self.final_grade = self.calculate_final_grade()
-        super().save(*args, **kwargs)
+        action = GradeChange.CREATE if self._state.adding else GradeChange.UPDATE
+        changes = self.changed_fields()
+        # savepoint=False: no extra SAVEPOINT round trips when already in a transaction
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if changes:
+                self._log_change(action, changes, self.graded_by_id)
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
+    def log_deletion(self):
+        """Log the grade's deletion; sent from ``post_delete`` so cascades and QuerySet deletes are logged too."""
+        self._log_change(GradeChange.DELETE, {})
 
     def __str__(self):
         return f"{self.student.username} - {self.course.title} - {self.get_assessment_type_display()} - {self.final_grade}/20"
 
+class GradeChange(models.Model):
+    """One append-only entry of the grade audit log.
+
+    ``changes`` only holds the tracked fields that changed. The grade's
+    identity is copied rather than referenced so entries outlive deleted
+    grades and archived courses.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (CREATE, 'Created'),
+        (UPDATE, 'Updated'),
+        (DELETE, 'Deleted'),
+    ]
+
+    grade_id = models.PositiveBigIntegerField()
+    course_id = models.PositiveBigIntegerField()
+    student_id = models.PositiveBigIntegerField()
+    semester = models.IntegerField(choices=Grade.SEMESTER_CHOICES)
+    assessment_type = models.CharField(max_length=20, choices=Grade.ASSESSMENT_TYPE_CHOICES)
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course_id', 'changed_at']),
+            models.Index(fields=['grade_id', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"Grade {self.grade_id} {self.action} at {self.changed_at:%Y-%m-%d %H:%M}"
+
 class GradeReport(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grade_reports', limit_choices_to={'userprofile__role': 'student'})
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='grade_reports')
@@ -163,13 +342,27 @@ class GradeReport(models.Model):
         )
         if not controls.exists():
             return None
-        return round(sum(g.final_grade for g in controls) / controls.count(), 2)
+        return round_grade(sum(g.final_grade for g in controls) / controls.count())
 
     def calculate_final_average(self):
-        """Calculate final average (40% continuous assessment + 60% exam)"""
+        """Calculate final average (continuous assessment and exam, 40/60 by default)"""
         if self.continuous_assessment_average is None or self.exam_grade is None:
             return None
-        return round((self.continuous_assessment_average * Decimal('0.4')) + (self.exam_grade * Decimal('0.6')), 2)
+        weights = GradingPolicy.weights_for_course(self.course_id)
+        return round_grade(
+            self.continuous_assessment_average * weights['continuous_weight']
+            + self.exam_grade * weights['exam_weight']
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the ranking refresh skip saves that leave the average unchanged
+        instance._loaded_final_average = instance.__dict__.get('final_average')
+        return instance
+
+    def final_average_changed(self):
+        return getattr(self, '_loaded_final_average', None) != self.final_average
 
     def save(self, *args, **kwargs):
         # Calculate continuous assessment average
@@ -183,6 +376,71 @@ class GradeReport(models.Model):
             self.final_average = None
             
         super().save(*args, **kwargs)
+        self._loaded_final_average = self.final_average
+
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title} - S{self.semester} - {self.final_average}/20" 
+
+class GradeRanking(models.Model):
+    """Materialized rank of a student's final average within a course and semester.
+
+    Maintained by ``rankings.py`` whenever a report's final average changes.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='rankings')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grade_rankings')
+    semester = models.IntegerField(choices=Grade.SEMESTER_CHOICES)
+    final_average = models.DecimalField(max_digits=4, decimal_places=2)
+    rank = models.PositiveIntegerField()
+    dense_rank = models.PositiveIntegerField()
+    percent_rank = models.FloatField()
+    ranked_count = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['course', 'semester', 'student']
+        ordering = ['semester', 'rank', 'student__username']
+
+    @property
+    def percentile(self):
+        """Share of the class ranked at or below this student, in percent"""
+        return round(100 * (1 - self.percent_rank), 1)
+
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title} - S{self.semester} - #{self.rank}/{self.ranked_count}"
+
+
+class CourseArchive(models.Model):
+    """Read-only snapshot of an ended course, written by the semester rollover.
+
+    The course, its enrollments, grades, reports and notes are kept as one
+    zlib-compressed JSON document so the live tables only hold current data.
+    """
+    course_id = models.PositiveIntegerField(unique=True)
+    title = models.CharField(max_length=200)
+    teacher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='archived_courses')
+    start_date = models.DateTimeField(null=True)
+    end_date = models.DateField(db_index=True)
+    student_count = models.PositiveIntegerField(default=0)
+    grade_count = models.PositiveIntegerField(default=0)
+    note_count = models.PositiveIntegerField(default=0)
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-end_date', 'title']
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class ArchivedEnrollment(models.Model):
+    """Index of which students took an archived course."""
+    archive = models.ForeignKey(CourseArchive, on_delete=models.CASCADE, related_name='enrollments')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_enrollments')
+    enrollment_date = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = ['student', 'archive']
 
     def __str__(self):
-        return f"{self.student.username} - {self.course.title} - S{self.semester} - {self.final_average}/20" 
\ No newline at end of file
+        return f"{self.student.username} took {self.archive.title}"
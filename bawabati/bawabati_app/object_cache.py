@@ -0,0 +1,209 @@
+"""Two-tier cache for serialized catalogue data.
+
+Values live in a small in-process LRU in front of the shared Django cache.
+Every entry depends on one or more *scopes* (``'courses'``, ``'course:12'``,
+``'users'``...) whose version counters are kept in the shared cache; the
+versions are part of the key, so bumping a scope (done by the signal handlers
+in ``signals.py``) makes every dependent entry unreachable in both tiers at
+once. Misses are computed by a single caller per key: threads of one process
+share a lock and processes coordinate through a short ``cache.add`` lock.
+
+Writers bump through ``bump_on_commit``: bumped inside the transaction, the
+new versions would let a concurrent reader, still seeing the rows from before
+the commit, cache them for ``TIMEOUT`` seconds.
+
+The version counters must live in a cache shared by every worker (Redis,
+Memcached, the database or file cache): with the default per-process
+``LocMemCache`` a bump only reaches the worker that wrote, and the others keep
+serving the old entries until they expire.
+"""
+import hashlib
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import tenancy
+
+DEFAULTS = {
+    'TIMEOUT': 300,
+    'LOCAL_MAX_ENTRIES': 1000,
+    'LOCAL_TTL': 30,
+    'LOCK_TIMEOUT': 10,
+    'LOCK_WAIT': 5,
+}
+
+metrics = Counter()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'OBJECT_CACHE', {})}
+
+
+class LocalLRU:
+    """Thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = None
+_key_locks = [threading.Lock() for _ in range(64)]
+
+
+def _get_local():
+    global _local
+    if _local is None:
+        config = get_config()
+        _local = LocalLRU(config['LOCAL_MAX_ENTRIES'], config['LOCAL_TTL'])
+    return _local
+
+
+def _version_key(scope):
+    return f'objver:{scope}'
+
+
+def get_versions(scopes):
+    """Return the current version of each scope, initialising missing ones."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            # Start from the clock so a scope evicted from the shared cache
+            # never comes back with a version an old entry was stored under.
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def bump(*scopes):
+    """Invalidate every cached entry depending on any of ``scopes``."""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    metrics['invalidations'] += len(scopes)
+
+
+_pending = threading.local()
+
+
+def bump_on_commit(*scopes):
+    """``bump(*scopes)`` once the active tenant's current transaction commits, or now outside one.
+
+    Scopes bumped several times in one transaction are bumped once.
+    """
+    using = tenancy.db_alias()
+    if not hasattr(_pending, 'scopes'):
+        _pending.scopes = {}
+    _pending.scopes.setdefault(using, set()).update(scopes)
+    # Registered every time: a rollback drops the callbacks, and the scopes
+    # left behind are then bumped with the next commit, which is harmless
+    transaction.on_commit(partial(_bump_pending, using), using=using)
+
+
+def _bump_pending(using):
+    scopes = _pending.scopes.pop(using, None)
+    if scopes:
+        bump(*scopes)
+
+
+def get_or_set(name, scopes, compute, timeout=None):
+    """Return the cached value for ``name`` or compute, store and return it.
+
+    The returned value is shared between callers and must not be mutated.
+    """
+    config = get_config()
+    versions = get_versions(scopes)
+    # The local tier is shared by every tenant of the process
+    raw = tenancy.scoped(name) + '|' + '|'.join(f'{scope}={version}' for scope, version in zip(scopes, versions))
+    key = 'obj:' + hashlib.md5(raw.encode()).hexdigest()
+    local = _get_local()
+
+    value = local.get(key)
+    if value is not None:
+        metrics['local_hits'] += 1
+        return value
+
+    with _key_locks[zlib.crc32(key.encode()) % len(_key_locks)]:
+        value = local.get(key)
+        if value is not None:
+            metrics['local_hits'] += 1
+            return value
+        value = cache.get(key)
+        if value is not None:
+            metrics['shared_hits'] += 1
+            local.set(key, value)
+            return value
+
+        lock_key = f'{key}:lock'
+        owns_lock = cache.add(lock_key, 1, config['LOCK_TIMEOUT'])
+        if not owns_lock:
+            # Another process is computing it; wait for its result
+            metrics['stampede_waits'] += 1
+            deadline = time.monotonic() + config['LOCK_WAIT']
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = cache.get(key)
+                if value is not None:
+                    metrics['shared_hits'] += 1
+                    local.set(key, value)
+                    return value
+        metrics['misses'] += 1
+        try:
+            value = compute()
+            cache.set(key, value, config['TIMEOUT'] if timeout is None else timeout)
+            local.set(key, value)
+        finally:
+            if owns_lock:
+                cache.delete(lock_key)
+        return value
+
+
+def stats():
+    hits = metrics['local_hits'] + metrics['shared_hits']
+    total = hits + metrics['misses']
+    return {
+        **metrics,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'local_entries': len(_get_local()),
+    }
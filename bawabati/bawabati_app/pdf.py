@@ -0,0 +1,126 @@
+"""Tiny dependency-free PDF writer for text-and-rules documents.
+
+This module deliberately does not import Django so it can be used from
+``spawn``-ed worker processes without setting up the app registry.
+"""
+import zlib
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+
+def _escape(text):
+    data = str(text).encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class Canvas:
+    """Collects drawing operations page by page."""
+
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self._ops = []
+        self.pages.append(self._ops)
+
+    def text(self, x, y, text, size=10, bold=False):
+        font = b'/F2' if bold else b'/F1'
+        self._ops.append(b'BT %s %d Tf %.2f %.2f Td (%s) Tj ET' % (font, size, x, y, _escape(text)))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self._ops.append(b'%.2f w %.2f %.2f m %.2f %.2f l S' % (width, x1, y1, x2, y2))
+
+    def render(self):
+        """Return the document as PDF bytes with compressed content streams."""
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # page tree, filled in once the page ids are known
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        page_ids = []
+        for ops in self.pages:
+            stream = zlib.compress(b'\n'.join(ops))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+            content_id = len(objects)
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+            )
+            page_ids.append(len(objects))
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+        objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_ids))
+
+        out = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            out += b'%010d 00000 n \n' % offset
+        out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
+
+
+REPORT_COLUMNS = [
+    ('Course', MARGIN, 'title'),
+    ('Teacher', 205, 'teacher'),
+    ('Control 1', 315, 'control_1'),
+    ('Control 2', 370, 'control_2'),
+    ('Exam', 425, 'exam'),
+    ('C.A. avg', 465, 'continuous_assessment_average'),
+    ('Final', 515, 'final_average'),
+]
+
+
+def _cell(value, width):
+    text = '-' if value is None else str(value)
+    return text if len(text) <= width else text[:width - 1] + '.'
+
+
+def render_report_card(card):
+    """Render one student's report card (a plain dict) to PDF bytes."""
+    canvas = Canvas()
+    y = PAGE_HEIGHT - MARGIN
+    canvas.text(MARGIN, y, 'Bawabati - Report Card', size=18, bold=True)
+    y -= 28
+    canvas.text(MARGIN, y, f"Student: {card['name']} ({card['username']})", size=11)
+    y -= 16
+    canvas.text(MARGIN, y, f"Semester: {card['semester_label']}", size=11)
+    y -= 24
+
+    def header(y):
+        for label, x, _key in REPORT_COLUMNS:
+            canvas.text(x, y, label, size=9, bold=True)
+        canvas.line(MARGIN, y - 4, PAGE_WIDTH - MARGIN, y - 4)
+        return y - 18
+
+    y = header(y)
+    for course in card['courses']:
+        if y < MARGIN + 40:
+            canvas.new_page()
+            y = header(PAGE_HEIGHT - MARGIN)
+        for _label, x, key in REPORT_COLUMNS:
+            width = {'title': 30, 'teacher': 20}.get(key, 8)
+            canvas.text(x, y, _cell(course.get(key), width), size=9)
+        y -= 14
+
+    canvas.line(MARGIN, y + 6, PAGE_WIDTH - MARGIN, y + 6)
+    y -= 10
+    canvas.text(MARGIN, y, f"Overall average: {_cell(card['overall_average'], 8)} / 20", size=11, bold=True)
+    return canvas.render()
+
+
+def render_report_cards(cards):
+    """Render a batch of report cards, returning ``(filename, pdf bytes)`` pairs.
+
+    Used as the unit of work for process pools, so it only takes and returns
+    picklable built-in types.
+    """
+    return [(card['filename'], render_report_card(card)) for card in cards]
@@ -0,0 +1,298 @@
+"""On-demand profiling of single requests.
+
+An admin gets a signed token (``manage.py profiles token`` or
+``POST api/profiling/token/``) and sends it in the ``X-Profile`` header or the
+``_profile`` query parameter. ``ProfilingMiddleware`` then runs that request
+under cProfile and times every SQL query through the connections'
+``execute_wrapper``. Template render time is read from the profile itself (the
+cumulative time of ``Template.render``), so nothing is patched. A sampling
+thread records the request thread's call stacks alongside for flame graphs:
+cProfile only keeps caller/callee pairs, which cannot tell the nested
+middleware calls apart.
+
+Each profile is stored in the tenant's subdirectory of ``PROFILING['DIR']``
+as a pstats dump, the sampled stacks in folded format and a JSON summary; the
+oldest are pruned past ``MAX_PROFILES`` or ``MAX_AGE_DAYS``. Like the other
+management commands, ``manage.py profiles`` works on one tenant's profiles
+(run it through ``tenant_command``).
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+
+from . import tenancy
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': os.path.join(settings.BASE_DIR, 'profiles'),
+    'MAX_PROFILES': 200,
+    'MAX_AGE_DAYS': 7,
+    'TOKEN_MAX_AGE': 60 * 60,
+    'SLOW_QUERIES': 20,
+    'SAMPLE_INTERVAL': 0.005,
+}
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAM = '_profile'
+TOKEN_SALT = 'bawabati.profiling'
+
+EXTENSIONS = ('json', 'prof', 'folded')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def profile_dir():
+    return tenancy.tenant_path(get_config()['DIR'])
+
+
+def make_token(user):
+    """A token letting ``user``'s requests be profiled until it expires."""
+    return signing.dumps({'u': user.pk}, salt=tenancy.scoped(TOKEN_SALT))
+
+
+def user_for_token(token):
+    """The admin a profiling token was issued to, or None."""
+    try:
+        payload = signing.loads(token, salt=tenancy.scoped(TOKEN_SALT), max_age=get_config()['TOKEN_MAX_AGE'])
+    except signing.BadSignature:
+        return None
+    user = User.objects.filter(pk=payload.get('u'), is_active=True).select_related('userprofile').first()
+    if user is None or not (user.is_superuser or getattr(user.userprofile, 'role', None) == 'admin'):
+        return None
+    return user
+
+
+class QueryTimer:
+    """``execute_wrapper`` hook recording the duration of every query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def wrapper_for(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((alias, sql, time.perf_counter() - start))
+        return wrapper
+
+    def summary(self, slowest):
+        by_sql = Counter(sql for _alias, sql, _duration in self.queries)
+        ranked = sorted(self.queries, key=lambda query: query[2], reverse=True)[:slowest]
+        return {
+            'count': len(self.queries),
+            'time_ms': round(sum(duration for *_rest, duration in self.queries) * 1000, 2),
+            'duplicates': sum(count - 1 for count in by_sql.values()),
+            'slowest': [
+                {'db': alias, 'sql': sql, 'time_ms': round(duration * 1000, 2), 'repeated': by_sql[sql]}
+                for alias, sql, duration in ranked
+            ],
+        }
+
+
+class StackSampler:
+    """Counts the call stacks of one thread, sampled every ``interval`` seconds."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """Flame graph data: one ``frame;frame;frame <samples>`` line per stack."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfilerBusy(Exception):
+    """Another profiler is active (Python 3.12+ allows one per process)."""
+
+
+class Profile:
+    """Profiles the code run inside ``with Profile() as profile:``."""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.queries = QueryTimer()
+        self.sampler = StackSampler(threading.get_ident(), get_config()['SAMPLE_INTERVAL'])
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.queries.wrapper_for(connection.alias)))
+        self.started = time.perf_counter()
+        try:
+            self.profiler.enable()
+        except ValueError:
+            self._stack.close()
+            raise ProfilerBusy
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        self._stack.close()
+
+    def stats(self):
+        return pstats.Stats(self.profiler)
+
+
+def template_time(stats):
+    """Seconds spent rendering Django templates, from the profile's cumulative times."""
+    from django.template.base import Template
+
+    # cProfile only counts the outermost call of a recursive function, so
+    # included templates are not counted twice.
+    code = Template.render.__code__
+    return sum(
+        ct for (filename, line, name), (_cc, _nc, _tt, ct, _callers) in stats.stats.items()
+        if name == 'render' and line == code.co_firstlineno and filename == code.co_filename
+    )
+
+
+def _path_without_token(request):
+    query = request.GET.copy()
+    query.pop(QUERY_PARAM, None)
+    return f'{request.path}?{query.urlencode()}' if query else request.path
+
+
+def save(profile, request, response, user):
+    """Write a profile and its summary to disk and return the summary."""
+    config = get_config()
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    stats = profile.stats()
+    stats.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+    with open(os.path.join(directory, f'{profile_id}.folded'), 'w') as f:
+        f.write(profile.sampler.folded())
+    summary = {
+        'id': profile_id,
+        'created_at': timezone.now(),
+        'method': request.method,
+        'path': _path_without_token(request),
+        'status': response.status_code,
+        'user': user.username,
+        'time_ms': round(profile.duration * 1000, 2),
+        'template_ms': round(template_time(stats) * 1000, 2),
+        'samples': sum(profile.sampler.stacks.values()),
+        'sample_interval_ms': config['SAMPLE_INTERVAL'] * 1000,
+        'sql': profile.queries.summary(config['SLOW_QUERIES']),
+    }
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+        json.dump(summary, f, cls=DjangoJSONEncoder, indent=2)
+    prune()
+    return summary
+
+
+def _profile_ids(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+
+
+def prune():
+    """Delete profiles beyond the retention limits; returns how many were removed."""
+    config = get_config()
+    directory = profile_dir()
+    ids = _profile_ids(directory)
+    cutoff = time.time() - config['MAX_AGE_DAYS'] * 24 * 60 * 60
+    expired = set(ids[:max(len(ids) - config['MAX_PROFILES'], 0)])
+    for profile_id in ids:
+        if os.path.getmtime(os.path.join(directory, f'{profile_id}.json')) < cutoff:
+            expired.add(profile_id)
+    for profile_id in expired:
+        for extension in EXTENSIONS:
+            try:
+                os.remove(os.path.join(directory, f'{profile_id}.{extension}'))
+            except FileNotFoundError:
+                pass
+    return len(expired)
+
+
+def list_profiles():
+    """Stored profile summaries, newest first."""
+    directory = profile_dir()
+    summaries = []
+    for profile_id in reversed(_profile_ids(directory)):
+        try:
+            with open(os.path.join(directory, f'{profile_id}.json')) as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+def _path(profile_id, extension):
+    if not re.fullmatch(r'[\w-]+', profile_id):
+        raise FileNotFoundError(profile_id)
+    return os.path.join(profile_dir(), f'{profile_id}.{extension}')
+
+
+def load(profile_id):
+    """``(summary, pstats.Stats)`` of a stored profile; raises FileNotFoundError."""
+    with open(_path(profile_id, 'json')) as f:
+        summary = json.load(f)
+    return summary, pstats.Stats(_path(profile_id, 'prof'))
+
+
+def folded_stacks(profile_id):
+    """The sampled stacks of a stored profile, ready for flamegraph.pl or speedscope."""
+    with open(_path(profile_id, 'folded')) as f:
+        return f.read()
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{line}({name})'
+
+
+def top_functions(stats, sort='cumulative', limit=25):
+    """The ``limit`` most expensive functions as dicts."""
+    key = {'cumulative': 3, 'tottime': 2, 'calls': 1}[sort]
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+    return [
+        {'function': _label(func), 'calls': nc, 'tottime_ms': round(tt * 1000, 2), 'cumtime_ms': round(ct * 1000, 2)}
+        for func, (_cc, nc, tt, ct, _callers) in ranked
+    ]
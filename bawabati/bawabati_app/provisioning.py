@@ -0,0 +1,126 @@
+"""Bulk user provisioning from a CSV roster.
+
+The roster has a header row with ``username`` and ``role`` columns and
+optional ``email``, ``first_name``, ``last_name`` and ``password`` columns.
+Every value is checked against the ``User`` field it goes into, and usernames
+are compared case-insensitively (as MySQL's collation does) with each other
+and with existing users, so a roster that parses is one the bulk insert
+accepts. Passwords are hashed on a process pool, then Users and their UserProfiles are
+written with ``bulk_create`` in one transaction. ``bulk_create`` sends no
+``post_save`` signals, so the per-user profile handlers are skipped entirely
+and the object cache is invalidated once at the end.
+"""
+import csv
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import object_cache, tenancy
+from .hashing import hash_batch, init_worker
+from .models import UserProfile
+
+ROSTER_ROLES = {'teacher', 'student'}
+BATCH_SIZE = 500
+
+# Roster columns checked against the validators of the User field of that name
+VALIDATED_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+class RosterError(Exception):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def parse_roster(file):
+    """Read and validate a roster; raise ``RosterError`` listing every problem."""
+    if isinstance(file, bytes):
+        file = file.decode('utf-8-sig')
+    if isinstance(file, str):
+        file = io.StringIO(file)
+    reader = csv.DictReader(file)
+    missing = {'username', 'role'} - set(reader.fieldnames or [])
+    if missing:
+        raise RosterError([f"Missing column(s): {', '.join(sorted(missing))}"])
+
+    rows, errors, seen = [], [], set()
+    for line, row in enumerate(reader, start=2):
+        username = User.normalize_username((row.get('username') or '').strip())
+        role = (row.get('role') or '').strip().lower()
+        if not username:
+            errors.append(f'Line {line}: username is required')
+            continue
+        if role not in ROSTER_ROLES:
+            errors.append(f"Line {line}: role must be one of {', '.join(sorted(ROSTER_ROLES))}")
+        if username.lower() in seen:
+            errors.append(f'Line {line}: duplicate username {username}')
+        seen.add(username.lower())
+        values = {
+            'username': username,
+            'email': User.objects.normalize_email((row.get('email') or '').strip()),
+            'first_name': (row.get('first_name') or '').strip(),
+            'last_name': (row.get('last_name') or '').strip(),
+        }
+        for name in VALIDATED_FIELDS:
+            if values[name]:
+                try:
+                    User._meta.get_field(name).run_validators(values[name])
+                except ValidationError as e:
+                    errors += [f'Line {line}: {name}: {message}' for message in e.messages]
+        rows.append({**values, 'line': line, 'role': role, 'password': row.get('password') or None})
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = {row['username'].lower(): row for row in rows[start:start + BATCH_SIZE]}
+        existing = User.objects.annotate(username_lower=Lower('username')).filter(username_lower__in=batch)
+        for username in existing.values_list('username_lower', flat=True):
+            errors.append(f"Line {batch[username]['line']}: user {batch[username]['username']} already exists")
+    if errors:
+        raise RosterError(errors)
+    return rows
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash ``passwords`` (None gives an unusable password) across processes."""
+    batches = [passwords[start:start + 50] for start in range(0, len(passwords), 50)]
+    # spawn rather than fork: this may run on a thread of a multi-threaded server
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(settings.PASSWORD_HASHERS,)) as pool:
+        return [hashed for batch in pool.map(hash_batch, batches) for hashed in batch]
+
+
+def provision(rows, workers=None):
+    """Create the users of a parsed roster; return how many were created."""
+    hashes = hash_passwords([row['password'] for row in rows], workers=workers)
+    users = [
+        User(
+            username=row['username'],
+            email=row['email'],
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            password=hashed,
+        )
+        for row, hashed in zip(rows, hashes)
+    ]
+    roles = {user.username: row['role'] for user, row in zip(users, rows)}
+
+    with transaction.atomic(using=tenancy.db_alias()):
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        # MySQL does not return primary keys from bulk inserts, so read them back
+        profiles = []
+        usernames = list(roles)
+        for start in range(0, len(usernames), BATCH_SIZE):
+            batch = usernames[start:start + BATCH_SIZE]
+            profiles += [
+                UserProfile(user_id=user_id, role=roles[username])
+                for username, user_id in User.objects.filter(username__in=batch).values_list('username', 'id')
+            ]
+        UserProfile.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+        object_cache.bump_on_commit('users')
+    return len(users)
@@ -0,0 +1,78 @@
+"""Course rankings computed with SQL window functions.
+
+``GradeRanking`` holds one row per student, course and semester with the
+``RANK``, ``DENSE_RANK`` and ``PERCENT_RANK`` of the student's final average.
+A partition (course, semester) is recomputed in one window query whenever a
+report's final average changes; the refresh runs once per partition after the
+writing transaction commits, however many reports it saved.
+"""
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import DenseRank, PercentRank, Rank
+
+from . import tenancy
+from .models import GradeRanking, GradeReport
+
+
+def ranking_rows(course_id, semester):
+    """Window-function ranking of the reports of one course and semester, best first."""
+    order = F('final_average').desc()
+    return (
+        GradeReport.objects
+        .filter(course_id=course_id, semester=semester, final_average__isnull=False)
+        .annotate(
+            rank=Window(Rank(), order_by=order),
+            dense_rank=Window(DenseRank(), order_by=order),
+            percent_rank=Window(PercentRank(), order_by=order),
+            ranked_count=Window(Count('id')),
+        )
+        .values('student_id', 'final_average', 'rank', 'dense_rank', 'percent_rank', 'ranked_count')
+    )
+
+
+def refresh(course_id, semester):
+    """Recompute the materialized rankings of one course and semester."""
+    rows = [GradeRanking(course_id=course_id, semester=semester, **row) for row in ranking_rows(course_id, semester)]
+    with transaction.atomic(using=tenancy.db_alias()):
+        GradeRanking.objects.filter(course_id=course_id, semester=semester).delete()
+        GradeRanking.objects.bulk_create(rows)
+    return len(rows)
+
+
+_pending = threading.local()
+
+
+def schedule_refresh(course_id, semester):
+    """Refresh a partition once the current transaction commits, at most once per transaction."""
+    using = tenancy.db_alias()
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = {}
+    _pending.keys.setdefault(using, set()).add((course_id, semester))
+    # Registered every time, like object_cache.bump_on_commit: the first
+    # callback to run refreshes every pending partition and the others find
+    # nothing left. Partitions left behind by a rollback are refreshed with
+    # the next commit, which recomputes them from unchanged rows.
+    transaction.on_commit(partial(_refresh_pending, using), using=using)
+
+
+def _refresh_pending(using):
+    for course_id, semester in sorted(_pending.keys.pop(using, ())):
+        refresh(course_id, semester)
+
+
+def course_rankings(course_id, semester=None):
+    rankings = GradeRanking.objects.filter(course_id=course_id).select_related('student')
+    if semester is not None:
+        rankings = rankings.filter(semester=semester)
+    return rankings
+
+
+def rankings_by_semester(course_id):
+    """``{semester: {student_id: GradeRanking}}`` for the grades page."""
+    grouped = {}
+    for ranking in GradeRanking.objects.filter(course_id=course_id):
+        grouped.setdefault(ranking.semester, {})[ranking.student_id] = ranking
+    return grouped
@@ -0,0 +1,118 @@
+"""Faster JSON and compact MessagePack renderers and parsers for the API.
+
+DRF picks the renderer from the ``Accept`` header (or ``?format=``):
+``application/json`` gets ``FastJSONRenderer`` and ``application/msgpack``
+gets ``MessagePackRenderer``. Both convert Decimals, datetimes and the other
+types DRF knows exactly as ``rest_framework.utils.encoders.JSONEncoder`` does,
+so a client sees the same values whichever format it asks for.
+
+``orjson`` and ``msgpack`` are optional. Without orjson, the JSON renderer
+is DRF's own, with a converter that checks the common types first. The
+MessagePack renderer and parser are only enabled in settings.py when msgpack
+is installed.
+"""
+import datetime
+import decimal
+
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class FastJSONEncoder(encoders.JSONEncoder):
+    """DRF's encoder, checking the types API payloads are made of first."""
+
+    def default(self, obj):
+        kind = type(obj)
+        if kind is decimal.Decimal:
+            return float(obj)
+        if kind is datetime.datetime:
+            representation = obj.isoformat()
+            if representation.endswith('+00:00'):
+                representation = representation[:-6] + 'Z'
+            return representation
+        if kind is datetime.date:
+            return obj.isoformat()
+        return super().default(obj)
+
+
+_default = FastJSONEncoder().default
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """DRF's ``JSONRenderer``, with orjson when it is installed.
+
+    orjson renders the same bytes except for floats. Those Python prints in
+    exponent notation (under 1e-4 or from 1e16) are spelled differently but
+    parse to the same numbers: ``1e16`` rather than ``1e+16``, ``0.00001``
+    rather than ``1e-05``. NaN and the infinities, which DRF refuses to
+    render, come out as ``null``.
+    """
+
+    encoder_class = FastJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Indented output (the browsable API, ?indent=) is left to DRF
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # Integers over 64 bits, keys orjson cannot convert: let DRF have a go
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like DRF, escape the separators that are invalid in JavaScript strings
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            # orjson rejects NaN and Infinity, like DRF's strict parsing
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+def packb(data):
+    return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def unpackb(content):
+    return msgpack.unpackb(content, raw=False, strict_map_key=False)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return unpackb(stream.read())
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
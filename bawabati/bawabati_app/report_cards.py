@@ -0,0 +1,134 @@
+"""Batch report card generation for a whole semester.
+
+All grade data for the semester is loaded in two queries and turned into plain
+dicts, PDFs are rendered on a process pool, and the results are streamed into a
+ZIP archive in the active tenant's directory of ``REPORT_CARDS['DIR']``. The
+archives hold every student's grades, so that directory must not be served
+publicly: admins download them through ``api/report-cards/<name>/``, which
+only finds the archives of their own school.
+"""
+import multiprocessing
+import os
+import re
+import uuid
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import tenancy
+from .models import Grade, GradeReport
+from .pdf import render_report_cards
+
+DEFAULTS = {
+    'DIR': os.path.join(settings.BASE_DIR, 'report_cards'),
+}
+
+BATCH_SIZE = 50
+
+ARCHIVE_NAME = re.compile(r'^semester-\d+-\d{8}-\d{6}-[0-9a-f]{8}\.zip$')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REPORT_CARDS', {})}
+
+
+def archive_path(name):
+    """The path of the generated archive ``name``, or None if ``name`` is not one."""
+    if not ARCHIVE_NAME.match(name):
+        return None
+    return os.path.join(tenancy.tenant_path(get_config()['DIR']), name)
+
+
+def load_report_cards(semester):
+    """Return one report card dict per student with grades in ``semester``."""
+    grades = defaultdict(dict)
+    for student_id, course_id, assessment_type, final_grade in Grade.objects.filter(
+        semester=semester
+    ).order_by().values_list('student_id', 'course_id', 'assessment_type', 'final_grade'):
+        grades[student_id, course_id][assessment_type] = final_grade
+
+    reports = GradeReport.objects.filter(semester=semester).order_by(
+        'student__last_name', 'student__first_name', 'student__username', 'course__title'
+    ).values_list(
+        'student_id', 'student__username', 'student__first_name', 'student__last_name',
+        'course_id', 'course__title', 'course__assigned_teacher__first_name',
+        'course__assigned_teacher__last_name', 'course__assigned_teacher__username',
+        'continuous_assessment_average', 'final_average',
+    )
+
+    semester_label = dict(Grade.SEMESTER_CHOICES)[int(semester)]
+    cards = {}
+    for (student_id, username, first_name, last_name, course_id, title, teacher_first,
+         teacher_last, teacher_username, ca_average, final_average) in reports:
+        card = cards.get(student_id)
+        if card is None:
+            card = cards[student_id] = {
+                'filename': f'{username}-S{semester}.pdf',
+                'username': username,
+                'name': f'{first_name} {last_name}'.strip() or username,
+                'semester_label': semester_label,
+                'courses': [],
+            }
+        course_grades = grades.get((student_id, course_id), {})
+        card['courses'].append({
+            'title': title,
+            'teacher': f'{teacher_first} {teacher_last}'.strip() or teacher_username,
+            'control_1': course_grades.get('control_1'),
+            'control_2': course_grades.get('control_2'),
+            'exam': course_grades.get('exam'),
+            'continuous_assessment_average': ca_average,
+            'final_average': final_average,
+        })
+
+    for card in cards.values():
+        finals = [c['final_average'] for c in card['courses'] if c['final_average'] is not None]
+        card['overall_average'] = round(sum(finals) / len(finals), 2) if finals else None
+        for course in card['courses']:
+            for key, value in course.items():
+                if isinstance(value, Decimal):
+                    course[key] = str(value)
+        if card['overall_average'] is not None:
+            card['overall_average'] = str(card['overall_average'])
+    return list(cards.values())
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def build_archive(semester, output=None, workers=None):
+    """Render every report card of ``semester`` into a ZIP file.
+
+    Returns a dict with the archive path, the number of cards and, for
+    archives written to ``REPORT_CARDS['DIR']``, the URL admins download it from.
+    """
+    cards = load_report_cards(semester)
+    name = None
+    if output is None:
+        directory = tenancy.tenant_path(get_config()['DIR'])
+        os.makedirs(directory, exist_ok=True)
+        # The random part keeps archives started in the same second apart
+        stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        name = f'semester-{semester}-{stamp}-{uuid.uuid4().hex[:8]}.zip'
+        output = os.path.join(directory, name)
+
+    # spawn rather than fork: this may run on a thread of a multi-threaded server
+    context = multiprocessing.get_context('spawn')
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # The PDF content streams are already compressed by the workers
+        for rendered in pool.map(render_report_cards, _batches(cards, BATCH_SIZE)):
+            for filename, data in rendered:
+                archive.writestr(filename, data)
+
+    result = {'path': output, 'count': len(cards)}
+    if name is not None:
+        result['name'] = name
+        result['url'] = reverse('api_download_report_cards', args=[name])
+    return result
@@ -0,0 +1,85 @@
+"""Course rosters: finding students and changing who is enrolled.
+
+``search_students()`` backs the search-as-you-type student pickers of the
+course forms (``StudentSearchWidget`` and the frontend's ``StudentPicker``).
+It matches the start of usernames, names and emails and pages by username,
+so a page costs the same whether the school has a hundred students or fifty
+thousand, and no page needs a ``COUNT(*)``.
+
+``update_enrollments()`` writes only what changed, with one ``DELETE`` and
+one ``INSERT``, instead of handing ``course.students.set()`` every enrolled
+student. Bulk writes skip the ``Enrollment`` signals, so it drops the cached
+course serializations and republishes the catalogue itself.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from . import catalogue, object_cache, tenancy
+from .models import Enrollment
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+RESULT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email')
+
+# Words of a search that are matched; more only slow the query down
+MAX_SEARCH_WORDS = 4
+
+
+def students():
+    return User.objects.filter(userprofile__role='student')
+
+
+def search_students(term='', after=None, page_size=PAGE_SIZE, course_id=None):
+    """A page of students matching every word of ``term``, after the username ``after``.
+
+    With ``course_id``, each result says whether the student is enrolled in
+    that course. ``next`` is the ``after`` of the following page, or None.
+    """
+    queryset = students()
+    for word in term.split()[:MAX_SEARCH_WORDS]:
+        matches = Q()
+        for field in SEARCH_FIELDS:
+            matches |= Q(**{f'{field}__istartswith': word})
+        queryset = queryset.filter(matches)
+    if after:
+        queryset = queryset.filter(username__gt=after)
+    fields = list(RESULT_FIELDS)
+    if course_id is not None:
+        queryset = queryset.annotate(enrolled=Exists(
+            Enrollment.objects.filter(course_id=course_id, student_id=OuterRef('pk'))))
+        fields.append('enrolled')
+    # One row more than the page tells whether there is a next page
+    rows = list(queryset.order_by('username').values(*fields)[:page_size + 1])
+    return {
+        'results': rows[:page_size],
+        'next': rows[page_size - 1]['username'] if len(rows) > page_size else None,
+    }
+
+
+def update_enrollments(course, add=(), remove=(), replace=None):
+    """Enroll the ``add`` and unenroll the ``remove`` student ids, or make ``replace`` the course's students.
+
+    Returns the number of students enrolled and unenrolled.
+    """
+    with transaction.atomic(using=tenancy.db_alias()):
+        enrollments = Enrollment.objects.filter(course=course)
+        if replace is not None:
+            current = set(enrollments.values_list('student_id', flat=True))
+            add, remove = set(replace) - current, current - set(replace)
+        else:
+            remove = set(remove)
+            add = set(add) - remove
+            if add:
+                add -= set(enrollments.filter(student_id__in=add).values_list('student_id', flat=True))
+        removed = enrollments.filter(student_id__in=remove).delete()[0] if remove else 0
+        if add:
+            # ignore_conflicts: a student enrolling themselves meanwhile is not an error
+            Enrollment.objects.bulk_create(
+                [Enrollment(course=course, student_id=pk) for pk in add], batch_size=500, ignore_conflicts=True)
+        if add or removed:
+            object_cache.bump_on_commit('courses', f'course:{course.pk}')
+            catalogue.schedule_publish()
+    return {'enrolled': len(add), 'unenrolled': removed}
@@ -0,0 +1,103 @@
+"""Primary/replica database routing.
+
+Reads go to one of the aliases listed in ``settings.DATABASE_REPLICAS`` and
+writes go to ``default``. As soon as a request writes, every later query of
+that request is pinned to the primary so it reads its own writes;
+``PrimaryPinningMiddleware`` also keeps the client on the primary for a few
+seconds afterwards to cover replication lag.
+
+Only requests are routed to replicas. Code running outside a request scope
+(management commands, background jobs, ``on_commit`` callbacks after the
+request has returned) reads from the primary, as it usually reads right
+after writing.
+"""
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Apps whose tables are always read from the primary
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# A mutable dict rather than a plain flag so a pin set inside a copied context
+# (e.g. a view run through sync_to_async) is still seen by the middleware.
+_state = ContextVar('db_routing_state', default=None)
+
+stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(stats)
+
+
+def start_request(pinned=False):
+    """Begin a routing scope; returns a token for ``end_request``."""
+    return _state.set({'pinned': pinned, 'wrote': False})
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def pin_to_primary():
+    state = _state.get()
+    if state is not None:
+        state['pinned'] = True
+
+
+def is_pinned():
+    """Whether reads go to the primary: after a write, or outside any request scope."""
+    state = _state.get()
+    return state is None or state['pinned']
+
+
+def has_written():
+    state = _state.get()
+    return bool(state and state['wrote'])
+
+
+@contextmanager
+def use_primary():
+    """Send every query inside the block to the primary."""
+    token = start_request(pinned=True)
+    try:
+        yield
+    finally:
+        end_request(token)
+
+
+class PrimaryReplicaRouter:
+    def _replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def db_for_read(self, model, **hints):
+        replicas = self._replicas()
+        if not replicas or is_pinned() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            _count('reads_primary')
+            return 'default'
+        _count('reads_replica')
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['pinned'] = state['wrote'] = True
+        _count('writes')
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
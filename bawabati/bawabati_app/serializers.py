@@ -1,13 +1,29 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import UserProfile, Course, Note, Enrollment, Grade, GradeReport
+from .models import UserProfile, Course, Note, Enrollment, Grade, GradeReport, CourseArchive, GradeChange, GradeRanking
+from .metrics import TimedSerializerMixin
+from . import rosters
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class ModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Base of the API serializers; their output time is reported in the request metrics."""
+
+def current_user_data(request):
+    """The ``current_user`` block embedded in serialized courses."""
+    if request and request.user.is_authenticated:
+        return {
+            'id': request.user.id,
+            'userprofile': {
+                'role': request.user.userprofile.role
+            }
+        }
+    return None
+
+class UserProfileSerializer(ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['role', 'profile_image', 'phone_number', 'bio', 'specialisation']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ModelSerializer):
     userprofile = UserProfileSerializer(read_only=True)
     
     class Meta:
@@ -15,7 +31,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'userprofile']
         read_only_fields = ['id']
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(ModelSerializer):
     password = serializers.CharField(write_only=True)
     role = serializers.CharField(write_only=True)
     
@@ -25,12 +41,17 @@ class UserCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         role = validated_data.pop('role')
-        user = User.objects.create_user(**validated_data)
-        user.userprofile.role = role
-        user.userprofile.save()
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.username = User.normalize_username(user.username)
+        user.email = User.objects.normalize_email(user.email)
+        user.set_password(password)
+        # Picked up by the create_user_profile signal
+        user._profile_role = role
+        user.save()
         return user
 
-class EnrolledStudentSerializer(serializers.ModelSerializer):
+class EnrolledStudentSerializer(ModelSerializer):
     enrollment_date = serializers.SerializerMethodField()
 
     class Meta:
@@ -45,7 +66,18 @@ class EnrolledStudentSerializer(serializers.ModelSerializer):
                 return enrollment.enrollment_date
         return None
 
-class CourseSerializer(serializers.ModelSerializer):
+class StudentIdsField(serializers.ListField):
+    """Ids of students, checked with one query rather than one per id."""
+    child = serializers.IntegerField(min_value=1)
+
+    def to_internal_value(self, data):
+        ids = set(super().to_internal_value(data))
+        missing = ids - set(rosters.students().filter(pk__in=ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Invalid pk "{min(missing)}" - object does not exist.')
+        return ids
+
+class CourseSerializer(ModelSerializer):
     assigned_teacher = UserSerializer(read_only=True)
     assigned_teacher_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(userprofile__role='teacher'),
@@ -53,41 +85,57 @@ class CourseSerializer(serializers.ModelSerializer):
         write_only=True,
         required=True
     )
-    student_ids = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.filter(userprofile__role='student'),
-        source='students',
-        many=True,
-        write_only=True,
-        required=False
-    )
+    # Every student of the course; only the difference with the current ones is written
+    student_ids = StudentIdsField(write_only=True, required=False)
+    # Or just the changes, so a client never has to send the whole roster
+    add_student_ids = StudentIdsField(write_only=True, required=False)
+    remove_student_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
     enrolled_students = serializers.SerializerMethodField()
     current_user = serializers.SerializerMethodField()
 
+    ROSTER_FIELDS = ('student_ids', 'add_student_ids', 'remove_student_ids')
+
     class Meta:
         model = Course
         fields = [
             'id', 'title', 'description', 'specialisation', 'capacity',
             'start_date', 'end_date', 'created_at', 'assigned_teacher',
-            'assigned_teacher_id', 'student_ids', 'enrolled_students', 'current_user'
+            'assigned_teacher_id', 'student_ids', 'add_student_ids', 'remove_student_ids',
+            'enrolled_students', 'current_user'
         ]
 
+    def validate(self, attrs):
+        if 'student_ids' in attrs and ('add_student_ids' in attrs or 'remove_student_ids' in attrs):
+            raise serializers.ValidationError('Send either student_ids or add/remove_student_ids, not both.')
+        return attrs
+
+    @staticmethod
+    def _save_roster(course, roster):
+        if roster:
+            rosters.update_enrollments(course, add=roster.get('add_student_ids', ()),
+                                       remove=roster.get('remove_student_ids', ()), replace=roster.get('student_ids'))
+
+    def create(self, validated_data):
+        roster = {name: validated_data.pop(name) for name in self.ROSTER_FIELDS if name in validated_data}
+        course = super().create(validated_data)
+        self._save_roster(course, roster)
+        return course
+
+    def update(self, instance, validated_data):
+        roster = {name: validated_data.pop(name) for name in self.ROSTER_FIELDS if name in validated_data}
+        course = super().update(instance, validated_data)
+        self._save_roster(course, roster)
+        return course
+
     def get_enrolled_students(self, obj):
         enrollments = Enrollment.objects.filter(course=obj)
         students = [enrollment.student for enrollment in enrollments]
         return EnrolledStudentSerializer(students, many=True, context={'course': obj}).data
 
     def get_current_user(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return {
-                'id': request.user.id,
-                'userprofile': {
-                    'role': request.user.userprofile.role
-                }
-            }
-        return None
+        return current_user_data(self.context.get('request'))
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(ModelSerializer):
     uploaded_by = UserSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     course_id = serializers.PrimaryKeyRelatedField(
@@ -102,7 +150,7 @@ class NoteSerializer(serializers.ModelSerializer):
                  'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'uploaded_by', 'created_at', 'updated_at']
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(ModelSerializer):
     student = UserSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     student_id = serializers.PrimaryKeyRelatedField(
@@ -121,7 +169,7 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         fields = ['id', 'student', 'student_id', 'course', 'course_id', 'enrollment_date']
         read_only_fields = ['id', 'enrollment_date']
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeSerializer(ModelSerializer):
     student = UserSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     graded_by = UserSerializer(read_only=True)
@@ -133,7 +181,7 @@ class GradeSerializer(serializers.ModelSerializer):
                  'comments', 'created_at', 'updated_at', 'graded_by']
         read_only_fields = ['id', 'final_grade', 'created_at', 'updated_at', 'graded_by', 'student', 'course']
 
-class GradeReportSerializer(serializers.ModelSerializer):
+class GradeReportSerializer(ModelSerializer):
     student = UserSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     
@@ -142,4 +190,34 @@ class GradeReportSerializer(serializers.ModelSerializer):
         fields = ['id', 'student', 'course', 'semester', 'continuous_assessment_average', 
                  'exam_grade', 'final_average', 'created_at', 'updated_at']
         read_only_fields = ['id', 'continuous_assessment_average', 'final_average', 
-                           'created_at', 'updated_at'] 
\ No newline at end of file
+                           'created_at', 'updated_at'] 
+
+class CourseArchiveSerializer(ModelSerializer):
+    teacher = UserSerializer(read_only=True)
+
+    class Meta:
+        model = CourseArchive
+        fields = ['id', 'course_id', 'title', 'teacher', 'start_date', 'end_date',
+                  'student_count', 'grade_count', 'note_count', 'archived_at']
+
+class GradeChangeSerializer(ModelSerializer):
+    class Meta:
+        model = GradeChange
+        fields = ['id', 'grade_id', 'course_id', 'student_id', 'semester', 'assessment_type',
+                  'action', 'changes', 'changed_by', 'changed_at']
+
+class GradeRankingSerializer(ModelSerializer):
+    student = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GradeRanking
+        fields = ['student', 'course', 'semester', 'final_average', 'rank', 'dense_rank',
+                  'percent_rank', 'percentile', 'ranked_count', 'refreshed_at']
+
+    def get_student(self, obj):
+        return {
+            'id': obj.student.id,
+            'username': obj.student.username,
+            'first_name': obj.student.first_name,
+            'last_name': obj.student.last_name,
+        }
@@ -0,0 +1,87 @@
+import logging
+
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache.backends.locmem import LocMemCache
+
+from ..sessions import PurgeExpiredMixin, get_config
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(PurgeExpiredMixin, cached_db.SessionStore):
+    """Django's cached database sessions, bounded in a process-local cache and surviving a cache outage."""
+
+    cache_key_prefix = 'bawabati_app.session_backends.cached'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Another worker's changes only reach this one's memory when the entry expires
+        self._local = isinstance(self._cache, LocMemCache)
+
+    def _cache_timeout(self, expiry=None):
+        age = self.get_expiry_age(expiry=expiry)
+        return min(age, get_config()['LOCAL_TIMEOUT']) if self._local else age
+
+    def _from_cache(self, cache_key):
+        try:
+            return self._cache.get(cache_key)
+        except Exception:
+            logger.warning('Session cache unavailable (%s), reading the database', self._cache, exc_info=True)
+            return None
+
+    def _to_cache(self, cache_key, data, expiry=None):
+        try:
+            self._cache.set(cache_key, data, self._cache_timeout(expiry))
+        except Exception:
+            logger.warning('Session cache unavailable (%s)', self._cache, exc_info=True)
+
+    def load(self):
+        data = self._from_cache(self.cache_key)
+        if data is None:
+            s = self._get_session_from_db()
+            if s is None:
+                return {}
+            data = self.decode(s.session_data)
+            self._to_cache(self.cache_key, data, s.expire_date)
+        return data
+
+    async def aload(self):
+        cache_key = await self.acache_key()
+        try:
+            data = await self._cache.aget(cache_key)
+        except Exception:
+            logger.warning('Session cache unavailable (%s), reading the database', self._cache, exc_info=True)
+            data = None
+        if data is None:
+            s = await self._aget_session_from_db()
+            if s is None:
+                return {}
+            data = self.decode(s.session_data)
+            try:
+                await self._cache.aset(cache_key, data, self._cache_timeout(s.expire_date))
+            except Exception:
+                logger.warning('Session cache unavailable (%s)', self._cache, exc_info=True)
+        return data
+
+    def save(self, must_create=False):
+        DBStore.save(self, must_create)
+        self._to_cache(self.cache_key, self._session)
+
+    async def asave(self, must_create=False):
+        await DBStore.asave(self, must_create)
+        try:
+            await self._cache.aset(await self.acache_key(), self._session, self._cache_timeout())
+        except Exception:
+            logger.warning('Session cache unavailable (%s)', self._cache, exc_info=True)
+
+    def delete(self, session_key=None):
+        DBStore.delete(self, session_key)
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        try:
+            self._cache.delete(self.cache_key_prefix + session_key)
+        except Exception:
+            # A dead cache also loses the entry; a partitioned one expires it
+            logger.warning('Session cache unavailable (%s)', self._cache, exc_info=True)
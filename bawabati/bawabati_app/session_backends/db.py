@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import db
+
+from ..sessions import PurgeExpiredMixin
+
+
+class SessionStore(PurgeExpiredMixin, db.SessionStore):
+    pass
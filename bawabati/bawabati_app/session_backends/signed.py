@@ -0,0 +1,26 @@
+from django.contrib.sessions.backends import signed_cookies
+from django.core import signing
+
+from .. import tenancy
+
+SALT = 'bawabati_app.session_backends.signed'
+
+
+class SessionStore(signed_cookies.SessionStore):
+    """Django's signed cookie sessions, signed for the active tenant only."""
+
+    def load(self):
+        try:
+            return signing.loads(
+                self.session_key,
+                serializer=self.serializer,
+                max_age=self.get_session_cookie_age(),
+                salt=tenancy.scoped(SALT),
+            )
+        except Exception:
+            # A bad signature, an expired or another school's cookie: start afresh
+            self.create()
+        return {}
+
+    def _get_session_key(self):
+        return signing.dumps(self._session, compress=True, salt=tenancy.scoped(SALT), serializer=self.serializer)
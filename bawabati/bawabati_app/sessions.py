@@ -0,0 +1,100 @@
+"""Session engines that keep ``django_session`` out of the request path.
+
+``SessionMiddleware`` loads the session on every authenticated request, for
+the HTML views and DRF's ``SessionAuthentication`` alike. With Django's
+database engine, each of those loads is a query. ``SESSION_MODE`` in
+settings.py picks one of the engines in ``session_backends``:
+
+* ``db``: Django's database engine;
+* ``cached``: the database stays the store of record, but sessions are read
+  from the ``SESSION_CACHE_ALIAS`` cache, which must be shared between the
+  workers: a logout or ``flush()`` only clears the cache it runs against.
+  ``manage.py check`` reports an error for a process-local (locmem) cache;
+  where checks do not run, its entries still expire after ``LOCAL_TIMEOUT``
+  seconds. A cache that is down only costs the database read it was saving;
+* ``signed``: the session is kept in a signed cookie. There is no storage at
+  all, but logging out cannot revoke a copied cookie, and the session must
+  stay small.
+
+The database engines purge expired sessions in batches in a background job,
+at most every ``PURGE_INTERVAL`` seconds, when sessions are created.
+``manage.py purge_sessions`` does it at once, and so does ``clearsessions``.
+``manage.py bench_sessions`` counts the queries each engine saves.
+"""
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from . import jobs
+
+DEFAULTS = {
+    'LOCAL_TIMEOUT': 60,
+    'PURGE_INTERVAL': 60 * 60,
+    'PURGE_BATCH_SIZE': 1000,
+}
+
+MODES = ('db', 'cached', 'signed')
+
+PURGE_KEY = 'sessions:purge-scheduled'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SESSIONS', {})}
+
+
+def engine(mode):
+    """The ``SESSION_ENGINE`` of a ``SESSION_MODE``."""
+    return f'bawabati_app.session_backends.{mode}'
+
+
+def purge_expired(batch_size=None):
+    """Delete expired sessions a batch at a time, so no long delete locks the table; returns the count."""
+    batch_size = batch_size or get_config()['PURGE_BATCH_SIZE']
+    now = timezone.now()
+    removed = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return removed
+        removed += Session.objects.filter(session_key__in=keys).delete()[0]
+
+
+def schedule_purge():
+    """Purge expired sessions in the background, unless a purge ran within ``PURGE_INTERVAL``."""
+    interval = get_config()['PURGE_INTERVAL']
+    if interval and cache.add(PURGE_KEY, 1, interval):
+        jobs.submit('purge_sessions', purge_expired)
+
+
+@checks.register(checks.Tags.caches)
+def check_session_cache(app_configs=None, **kwargs):
+    """Cached sessions need a cache every worker sees."""
+    if settings.SESSION_ENGINE != engine('cached'):
+        return []
+    if not isinstance(caches[settings.SESSION_CACHE_ALIAS], LocMemCache):
+        return []
+    return [checks.Error(
+        f"SESSION_MODE 'cached' needs a shared cache, but the {settings.SESSION_CACHE_ALIAS!r} cache is "
+        "process-local: a logout would not reach the other workers.",
+        hint="Set SESSION_CACHE_BACKEND to a shared backend (e.g. Redis), or use SESSION_MODE 'db'.",
+        id='bawabati_app.E001',
+    )]
+
+
+class PurgeExpiredMixin:
+    """For database session stores: new sessions trigger the periodic purge of expired ones."""
+
+    def create(self):
+        super().create()
+        schedule_purge()
+
+    async def acreate(self):
+        await super().acreate()
+        schedule_purge()
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired()
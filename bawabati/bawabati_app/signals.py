@@ -1,18 +1,220 @@
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django.db import transaction
+from .models import UserProfile, Course, Enrollment, Note, Grade, GradeReport, GradingPolicy
+from . import catalogue, events, grading, jobs, object_cache, rankings, tenancy, tokens
+
+# User fields API access tokens carry or rely on
+TOKEN_USER_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+# Set inside bulk_delete()
+_bulk_delete = ContextVar('bulk_delete', default=False)
+
+def _only_last_login(kwargs):
+    update_fields = kwargs.get('update_fields')
+    return bool(update_fields) and set(update_fields) <= {'last_login'}
+
+def _bulk_deleted(kwargs):
+    return kwargs.get('signal') is post_delete and _bulk_delete.get()
+
+@contextmanager
+def bulk_delete():
+    """Skip the per-row cache, ranking, event and catalogue receivers of the deletes in the block.
+
+    A cascade fires them once per deleted row; the caller does their work
+    once for the whole delete instead. Deleted grades are still logged.
+    """
+    token = _bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_delete.reset(token)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
-    """Create a UserProfile for every new User."""
+    """Create a UserProfile for every new User.
+
+    The role comes from ``instance._profile_role`` when the creator set it,
+    so the profile is written once instead of created and then updated.
+    """
     if created:
-        UserProfile.objects.get_or_create(user=instance)
+        role = getattr(instance, '_profile_role', None) or ('admin' if instance.is_superuser else 'student')
+        UserProfile.objects.get_or_create(user=instance, defaults={'role': role})
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, **kwargs):
     """Save the UserProfile whenever its User is saved."""
+    if created or _only_last_login(kwargs):
+        return
     try:
         instance.userprofile.save()
     except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance) 
\ No newline at end of file
+        UserProfile.objects.create(user=instance) 
+
+@receiver(pre_save, sender=User)
+def check_token_user_fields(sender, instance, **kwargs):
+    """Note whether the save deactivates the user or changes their staff flags."""
+    if instance._state.adding or _only_last_login(kwargs):
+        return
+    stored = User.objects.db_manager(kwargs.get('using')).filter(pk=instance.pk).values(*TOKEN_USER_FIELDS).first()
+    instance._revoke_tokens = bool(stored) and any(
+        stored[name] != getattr(instance, name) for name in TOKEN_USER_FIELDS)
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_access_change(sender, instance, **kwargs):
+    """Tokens issued before a deactivation or staff change stop working."""
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        tokens.revoke_tokens(instance)
+
+@receiver(post_save, sender=UserProfile)
+def revoke_tokens_on_role_change(sender, instance, created, **kwargs):
+    if not created and instance.role_changed():
+        tokens.revoke_tokens(instance.user)
+        instance.refresh_from_db(fields=['token_version'])
+    instance._loaded_role = instance.role
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_user_cache(sender, **kwargs):
+    """Drop cached data embedding users when a user or profile changes."""
+    if _only_last_login(kwargs):
+        return
+    object_cache.bump_on_commit('users')
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    """Drop cached serializations of a course and of the course lists."""
+    if _bulk_deleted(kwargs):
+        return
+    object_cache.bump_on_commit('courses', f'course:{instance.pk}')
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def invalidate_enrollment_cache(sender, instance, **kwargs):
+    """Enrolled students are part of every course serialization."""
+    if _bulk_deleted(kwargs):
+        return
+    object_cache.bump_on_commit('courses', f'course:{instance.course_id}')
+
+@receiver([post_save, post_delete], sender=Note)
+def invalidate_note_cache(sender, instance, **kwargs):
+    """Drop the cached note list of the note's course."""
+    if _bulk_deleted(kwargs):
+        return
+    object_cache.bump_on_commit(f'course:{instance.course_id}:notes')
+
+@receiver([post_save, post_delete], sender=Grade)
+@receiver([post_save, post_delete], sender=GradeReport)
+def invalidate_student_cache(sender, instance, **kwargs):
+    """Drop the cached transcript of the student whose grades changed."""
+    if _bulk_deleted(kwargs):
+        return
+    object_cache.bump_on_commit(f'student:{instance.student_id}')
+
+@receiver(post_save, sender=Grade)
+def publish_grade(sender, instance, **kwargs):
+    """Push the grade to its student and to the course staff."""
+    events.publish_on_commit(
+        [f'student:{instance.student_id}', f'course:{instance.course_id}:staff', 'all'],
+        'grade',
+        {
+            'id': instance.pk,
+            'course_id': instance.course_id,
+            'student_id': instance.student_id,
+            'semester': instance.semester,
+            'assessment_type': instance.assessment_type,
+            'final_grade': instance.final_grade,
+        },
+    )
+
+@receiver(post_delete, sender=Grade)
+def log_grade_deletion(sender, instance, **kwargs):
+    """Log every deleted grade, including cascaded and QuerySet deletes."""
+    instance.log_deletion()
+
+@receiver(post_save, sender=GradeReport)
+def publish_grade_report(sender, instance, **kwargs):
+    """Push the updated averages to the student and to the course staff."""
+    events.publish_on_commit(
+        [f'student:{instance.student_id}', f'course:{instance.course_id}:staff', 'all'],
+        'grade_report',
+        {
+            'id': instance.pk,
+            'course_id': instance.course_id,
+            'student_id': instance.student_id,
+            'semester': instance.semester,
+            'continuous_assessment_average': instance.continuous_assessment_average,
+            'exam_grade': instance.exam_grade,
+            'final_average': instance.final_average,
+        },
+    )
+
+@receiver([post_save, post_delete], sender=Note)
+def publish_note(sender, instance, **kwargs):
+    """Tell everyone in the course that its notes changed."""
+    if _bulk_deleted(kwargs):
+        return
+    if kwargs.get('created'):
+        action = 'created'
+    elif 'created' in kwargs:
+        action = 'updated'
+    else:
+        action = 'deleted'
+    events.publish_on_commit(
+        [f'course:{instance.course_id}', 'all'],
+        'note',
+        {'id': instance.pk, 'course_id': instance.course_id, 'title': instance.title, 'action': action},
+    )
+
+@receiver(post_save, sender=GradeReport)
+def refresh_rankings_on_save(sender, instance, created, **kwargs):
+    """Re-rank the report's course and semester when its final average moved."""
+    if created or instance.final_average_changed():
+        rankings.schedule_refresh(instance.course_id, instance.semester)
+
+@receiver(post_delete, sender=GradeReport)
+def refresh_rankings_on_delete(sender, instance, **kwargs):
+    if _bulk_deleted(kwargs):
+        return
+    rankings.schedule_refresh(instance.course_id, instance.semester)
+
+@receiver(post_save, sender=GradingPolicy)
+def recompute_policy_courses(sender, instance, created, **kwargs):
+    """Recompute every course on a policy whose weights were edited.
+
+    The rewritten grades are logged as changed by ``instance._changed_by_id``,
+    set by the view saving the policy.
+    """
+    if not created:
+        policy_id, changed_by_id = instance.pk, getattr(instance, '_changed_by_id', None)
+        transaction.on_commit(
+            lambda: jobs.submit('apply_grading_policy', grading.apply_policy, policy_id, changed_by_id),
+            using=tenancy.db_alias())
+
+@receiver(post_save, sender=Course)
+def recompute_course_on_policy_switch(sender, instance, created, **kwargs):
+    """Recompute a course's grades when it moves to another policy."""
+    if not created and instance.grading_policy_changed():
+        course_id, changed_by_id = instance.pk, getattr(instance, '_changed_by_id', None)
+        transaction.on_commit(
+            lambda: jobs.submit('recompute_course_grades', grading.recompute, [course_id], changed_by_id),
+            using=tenancy.db_alias())
+    instance._loaded_grading_policy_id = instance.grading_policy_id
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Enrollment)
+def publish_catalogue(sender, **kwargs):
+    """Courses and their seats left are in the static catalogue."""
+    if _bulk_deleted(kwargs):
+        return
+    catalogue.schedule_publish()
+
+@receiver(post_save, sender=User)
+def publish_catalogue_teacher(sender, instance, created, **kwargs):
+    """Teacher names are in the static catalogue too."""
+    if not created and not _only_last_login(kwargs) and instance.course_set.exists():
+        catalogue.schedule_publish()
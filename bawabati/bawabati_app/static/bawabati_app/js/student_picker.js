@@ -0,0 +1,125 @@
+// Search-as-you-type student picker for StudentSearchWidget (bawabati_app/forms.py).
+// The <select multiple data-student-picker="<search url>"> only holds the chosen
+// students; it is hidden and kept in sync with a list of them and a search box.
+(function () {
+  'use strict';
+
+  var DEBOUNCE_MS = 250;
+
+  function label(student) {
+    var name = (student.first_name + ' ' + student.last_name).trim();
+    return name ? name + ' (' + student.username + ')' : student.username;
+  }
+
+  function el(tag, className, text) {
+    var node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text) node.textContent = text;
+    return node;
+  }
+
+  function init(select) {
+    var url = select.getAttribute('data-student-picker');
+    var chosen = el('ul', 'list-group mb-2');
+    var search = el('input', 'form-control');
+    var results = el('div', 'list-group mt-1');
+    var more = el('button', 'btn btn-link btn-sm', 'More students');
+    var timer = null;
+    var next = null;
+    var request = 0;
+
+    search.type = 'search';
+    search.placeholder = 'Search students by name, username or email';
+    more.type = 'button';
+    more.hidden = true;
+    select.hidden = true;
+    // A hidden control cannot show the browser's "required" message; the server checks it
+    select.required = false;
+    select.after(chosen, search, results, more);
+
+    function renderChosen() {
+      chosen.replaceChildren();
+      Array.prototype.forEach.call(select.options, function (option) {
+        var item = el('li', 'list-group-item d-flex justify-content-between align-items-center', option.text);
+        var remove = el('button', 'btn btn-sm btn-outline-danger', 'Remove');
+        remove.type = 'button';
+        remove.addEventListener('click', function () {
+          option.remove();
+          renderChosen();
+        });
+        item.appendChild(remove);
+        chosen.appendChild(item);
+      });
+    }
+
+    function isChosen(id) {
+      return Array.prototype.some.call(select.options, function (option) {
+        return option.value === String(id);
+      });
+    }
+
+    function choose(student) {
+      if (!isChosen(student.id)) {
+        select.appendChild(new Option(label(student), student.id, true, true));
+        renderChosen();
+      }
+    }
+
+    function load(append) {
+      var current = ++request;
+      var params = new URLSearchParams({ q: search.value.trim() });
+      if (append && next) params.set('after', next);
+      fetch(url + '?' + params, { credentials: 'same-origin', headers: { Accept: 'application/json' } })
+        .then(function (response) {
+          if (!response.ok) throw new Error('Student search returned ' + response.status);
+          return response.json();
+        })
+        .then(function (page) {
+          // An answer to an older query arriving late is dropped
+          if (current !== request) return;
+          if (!append) results.replaceChildren();
+          page.results.forEach(function (student) {
+            var item = el('button', 'list-group-item list-group-item-action', label(student));
+            item.type = 'button';
+            item.disabled = isChosen(student.id);
+            item.addEventListener('click', function () {
+              choose(student);
+              item.disabled = true;
+            });
+            results.appendChild(item);
+          });
+          next = page.next;
+          more.hidden = !next;
+        })
+        .catch(function (error) {
+          console.error(error);
+        });
+    }
+
+    search.addEventListener('input', function () {
+      clearTimeout(timer);
+      if (!search.value.trim()) {
+        request++;
+        results.replaceChildren();
+        more.hidden = true;
+        return;
+      }
+      timer = setTimeout(function () { load(false); }, DEBOUNCE_MS);
+    });
+    // Enter searches at once rather than submitting the course form
+    search.addEventListener('keydown', function (event) {
+      if (event.key === 'Enter') {
+        event.preventDefault();
+        clearTimeout(timer);
+        load(false);
+      }
+    });
+    more.addEventListener('click', function () { load(true); });
+
+    renderChosen();
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-student-picker]').forEach(init);
+  });
+})();
@@ -0,0 +1,84 @@
+"""Content-hashed, precompressed static files.
+
+``CompressedManifestStaticFilesStorage`` is Django's manifest storage (every
+file also stored under a name containing a hash of its content) that, once
+collectstatic has finished hashing, writes a ``.gz`` and, when the optional
+``brotli`` package is installed, a ``.br`` next to each compressible file.
+
+``middleware.PrecompressedStaticMiddleware`` serves ``STATIC_ROOT`` with the
+best encoding the client accepts. Hashed names never change content, so they
+are sent with a one year ``immutable`` lifetime; other files are revalidated.
+"""
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Already compressed formats (images, fonts, archives) are left alone
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.html', '.htm', '.svg', '.txt', '.xml', '.ico', '.ttf', '.eot', '.otf',
+}
+
+# Variants saving less than this are not worth the extra file
+MIN_SAVING = 0.05
+
+# Prefix of the React build in STATIC_ROOT; its build/static/ files already
+# carry content hashes in their names
+FRONTEND_PREFIX = 'frontend/'
+FRONTEND_HASHED_PREFIX = FRONTEND_PREFIX + 'static/'
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def compressible(name):
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _write_if_smaller(path, original_size, data):
+    if len(data) <= original_size * (1 - MIN_SAVING):
+        with open(path, 'wb') as f:
+            f.write(data)
+        return True
+    return False
+
+
+def compress_file(path):
+    """Write the ``.gz`` (and ``.br``) variants of ``path``; returns how many were written."""
+    with open(path, 'rb') as f:
+        content = f.read()
+    # mtime=0 keeps the output identical between runs
+    written = _write_if_smaller(path + '.gz', len(content), gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        written += _write_if_smaller(path + '.br', len(content), brotli.compress(content))
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            names.add(name)
+            if hashed_name:
+                names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        # Compress once hashing is over: CSS files are rewritten in several passes
+        files = [self.path(name) for name in sorted(names) if compressible(name) and self.exists(name)]
+        # zlib and brotli release the GIL, so threads use every core
+        with ThreadPoolExecutor() as pool:
+            list(pool.map(compress_file, files))
+
+    def immutable_names(self):
+        """The stored names whose content can never change."""
+        return set(self.hashed_files.values())
+
+
+def is_immutable(name, hashed_names):
+    return name in hashed_names or name.startswith(FRONTEND_HASHED_PREFIX)
@@ -52,6 +52,18 @@ def regroup_by(grades, field):
     
     return [{'grouper': key, 'list': groups[key]} for key in sorted_keys]
 
+@register.filter
+def get_item(mapping, key):
+    """Look up a key in a dict, also trying it as an integer"""
+    if not mapping:
+        return None
+    if key in mapping:
+        return mapping[key]
+    try:
+        return mapping.get(int(key))
+    except (TypeError, ValueError):
+        return None
+
 @register.filter
 def ordinal(n):
     """Convert number to ordinal string (1st, 2nd, etc.)"""
@@ -0,0 +1,202 @@
+"""Serving several schools (tenants) from one deployment.
+
+``settings.TENANTS`` maps each tenant's slug to the hosts it is served on and
+to the ``DATABASES['default']`` keys its own database overrides; settings.py
+adds that database as the ``tenant_<slug>`` alias. ``TenantMiddleware``
+resolves the tenant of each request from its host (or, when
+``TENANCY['HEADER']`` is set, from that header) and activates it:
+
+* ``TenantRouter`` sends every query to the tenant's database. Code opening
+  transactions or registering ``on_commit`` callbacks passes
+  ``using=db_alias()``, as Django would otherwise use ``default``;
+* ``make_cache_key``, the ``CACHES`` ``KEY_FUNCTION``, puts the slug in every
+  cache key; in-process caches and event channels use ``scoped()`` names;
+* ``TenantFileSystemStorage`` keeps media under ``MEDIA_ROOT/tenants/<slug>/``,
+  and ``serve_media`` only serves a tenant's media on its own hosts;
+* ``jobs.submit`` runs each job for the tenant that queued it.
+
+Hosts no tenant claims are served from the ``default`` database, unless
+``TENANCY['REQUIRED']`` is set. Management commands run for a tenant through
+``manage.py tenant_command <slug> <command>``.
+"""
+import os
+import posixpath
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+from django.http.request import split_domain_port
+from django.views.static import serve
+
+DEFAULTS = {
+    # Request header naming the tenant (e.g. 'X-Tenant'), for API clients
+    # behind a shared host; only enable it behind a proxy that sets it
+    'HEADER': None,
+    # Whether hosts no tenant claims get a 404 instead of the default database
+    'REQUIRED': False,
+}
+
+SLUG_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]*$')
+
+_current = ContextVar('tenant', default=None)
+
+
+class UnknownTenant(LookupError):
+    pass
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TENANCY', {})}
+
+
+def get_tenants():
+    tenants = getattr(settings, 'TENANTS', {})
+    for slug in tenants:
+        if not SLUG_PATTERN.match(slug):
+            raise ImproperlyConfigured(f'Tenant slug {slug!r} must be lowercase letters, digits and dashes.')
+    return tenants
+
+
+def alias_for(slug):
+    return f'tenant_{slug}'
+
+
+def get_current():
+    """The active tenant's slug, or None for the default database."""
+    return _current.get()
+
+
+def db_alias():
+    """The database alias of the active tenant."""
+    slug = _current.get()
+    return alias_for(slug) if slug else DEFAULT_DB_ALIAS
+
+
+def activate(slug):
+    """Make ``slug`` (None for the default database) the active tenant; returns a token for ``deactivate``."""
+    if slug is not None and slug not in get_tenants():
+        raise UnknownTenant(slug)
+    return _current.set(slug)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def use_tenant(slug):
+    token = activate(slug)
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+def scoped(name):
+    """``name`` made unique to the active tenant, for keys of process-wide state."""
+    slug = _current.get()
+    return f'{slug}/{name}' if slug else name
+
+
+def tenant_path(directory):
+    """The active tenant's subdirectory of ``directory``."""
+    slug = _current.get()
+    return os.path.join(directory, 'tenants', slug) if slug else directory
+
+
+def tenant_for_host(host):
+    domain = split_domain_port(host)[0]
+    for slug, tenant in get_tenants().items():
+        if domain in (h.lower() for h in tenant.get('HOSTS', ())):
+            return slug
+    return None
+
+
+def resolve(request):
+    """The slug of the tenant ``request`` is for; raises UnknownTenant when there is none."""
+    header = get_config()['HEADER']
+    if header:
+        value = request.META.get('HTTP_' + header.upper().replace('-', '_'))
+        if value:
+            if value not in get_tenants():
+                raise UnknownTenant(value)
+            return value
+    slug = tenant_for_host(request.get_host())
+    if slug is None and get_config()['REQUIRED']:
+        raise UnknownTenant(request.get_host())
+    return slug
+
+
+def make_cache_key(key, key_prefix, version):
+    """Django's default cache key, with the active tenant's slug in it."""
+    slug = _current.get()
+    if slug:
+        return f'{key_prefix}:{version}:{slug}:{key}'
+    return f'{key_prefix}:{version}:{key}'
+
+
+class TenantRouter:
+    """Routes every query to the active tenant's database; defers to the next router otherwise."""
+
+    def db_for_read(self, model, **hints):
+        slug = _current.get()
+        return alias_for(slug) if slug else None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows of different schools never reference each other
+        db1, db2 = obj1._state.db, obj2._state.db
+        if db1 != db2 and any(db and db.startswith('tenant_') for db in (db1, db2)):
+            return False
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every tenant database holds the full schema
+        return None
+
+
+class TenantFileSystemStorage(FileSystemStorage):
+    """Media storage keeping each tenant's files under ``tenants/<slug>/``."""
+
+    @property
+    def base_location(self):
+        return tenant_path(self._value_or_setting(self._location, settings.MEDIA_ROOT))
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        base_url = self._value_or_setting(self._base_url, settings.MEDIA_URL)
+        if base_url and not base_url.endswith('/'):
+            base_url += '/'
+        slug = _current.get()
+        return f'{base_url}tenants/{slug}/' if slug else base_url
+
+
+def serve_tenant_files(request, path, document_root=None, show_indexes=False):
+    """``django.views.static.serve`` from the active tenant's subdirectory of ``document_root``.
+
+    For files written under ``tenant_path()`` and fetched at one URL by every
+    school, like the published catalogue.
+    """
+    if posixpath.normpath(path).lstrip('/').split('/')[0] == 'tenants':
+        raise Http404('Not found')
+    return serve(request, path, document_root=tenant_path(document_root), show_indexes=show_indexes)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """``django.views.static.serve`` limited to the active tenant's media."""
+    slug = _current.get()
+    parts = posixpath.normpath(path).lstrip('/').split('/')
+    own = len(parts) > 2 and parts[0] == 'tenants' and parts[1] == slug
+    if (slug or parts[0] == 'tenants') and not own:
+        raise Http404('Not found')
+    return serve(request, path, document_root=document_root, show_indexes=show_indexes)
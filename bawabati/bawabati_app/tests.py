@@ -0,0 +1,1397 @@
+"""Tests of the bawabati app.
+
+Run with the SQLite test settings::
+
+    python manage.py test bawabati_app --settings=bawabati.settings_test
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.conf import global_settings, settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import signing
+from django.core.cache import cache
+from django.contrib.sessions.models import Session
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import connection, router, transaction
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import (api_views, archive, catalogue, events, grade_history, grading, jobs, metrics, object_cache, profiling,
+               provisioning, rankings, renderers, report_cards, routers, sessions, tenancy, throttling, tokens,
+               transcripts, uploads)
+from .db_backends.pool import ConnectionPool
+from .middleware import PIN_COOKIE, PrecompressedStaticMiddleware, PrimaryPinningMiddleware
+from .models import Course, CourseArchive, Enrollment, Grade, GradeChange, GradeReport, GradingPolicy, Note, UserProfile
+
+
+def make_user(username, role='student', password='secret-pass-1', **fields):
+    user = User(username=username, **fields)
+    user._profile_role = role
+    user.set_password(password)
+    user.save()
+    return user
+
+
+def make_admin(username='admin'):
+    return make_user(username, role='admin', is_staff=True, is_superuser=True)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # SQLite's in-memory mirror is another connection to the same database:
+    # it only sees committed rows, so no test-wide transaction
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        token = routers.start_request()
+        self.addCleanup(routers.end_request, token)
+
+    def test_request_reads_go_to_the_replica(self):
+        self.assertEqual(router.db_for_read(User), 'replica')
+        self.assertEqual(router.db_for_write(User), 'default')
+
+    def test_write_pins_the_rest_of_the_request(self):
+        User.objects.create(username='pinned')
+        self.assertTrue(routers.has_written())
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_replica_mirrors_the_primary_under_tests(self):
+        user = User.objects.create(username='mirrored')
+        token = routers.start_request()
+        try:
+            queryset = User.objects.filter(pk=user.pk)
+            self.assertEqual(queryset.db, 'replica')
+            self.assertTrue(queryset.exists())
+        finally:
+            routers.end_request(token)
+
+    def test_session_tables_stay_on_the_primary(self):
+        from django.contrib.sessions.models import Session
+        self.assertEqual(router.db_for_read(Session), 'default')
+
+    def test_use_primary(self):
+        with routers.use_primary():
+            self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_read(User), 'replica')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class OutsideRequestRoutingTests(SimpleTestCase):
+    def test_reads_outside_a_request_go_to_the_primary(self):
+        # Management commands, jobs and on_commit callbacks read their own writes
+        self.assertFalse(routers.has_written())
+        self.assertTrue(routers.is_pinned())
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_stats_are_counted_under_concurrency(self):
+        before = routers.get_stats().get('writes', 0)
+
+        def write():
+            for _ in range(1000):
+                router.db_for_write(User)
+
+        threads = [threading.Thread(target=write) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(routers.get_stats()['writes'] - before, 8000)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryPinningMiddlewareTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_writing_request_sets_the_pin_cookie(self):
+        def view(request):
+            self.assertEqual(router.db_for_read(User), 'replica')
+            User.objects.create(username='writer')
+            self.assertEqual(router.db_for_read(User), 'default')
+            return HttpResponse()
+
+        response = PrimaryPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_from_the_primary(self):
+        def view(request):
+            self.assertEqual(router.db_for_read(User), 'default')
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response = PrimaryPinningMiddleware(view)(request)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_methods_start_pinned(self):
+        def view(request):
+            self.assertEqual(router.db_for_read(User), 'default')
+            return HttpResponse()
+
+        PrimaryPinningMiddleware(view)(RequestFactory().post('/'))
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_released_connections_are_reused(self):
+        pool = ConnectionPool('test', max_size=1)
+        first = FakeConnection()
+        pool.opened()
+        pool.release(first)
+        self.assertIs(pool.acquire(lambda connection: True), first)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_pool_keeps_at_most_max_size_idle_connections(self):
+        pool = ConnectionPool('test', max_size=1)
+        first, second = FakeConnection(), FakeConnection()
+        pool.opened()
+        pool.opened()
+        pool.release(first)
+        pool.release(second)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.stats()['idle'], 1)
+        self.assertEqual(pool.stats()['peak_in_use'], 2)
+
+    def test_dead_and_unreusable_connections_are_discarded(self):
+        pool = ConnectionPool('test', check_after=0)
+        dead, broken = FakeConnection(), FakeConnection()
+        pool.release(dead)
+        self.assertIsNone(pool.acquire(lambda connection: False))
+        self.assertTrue(dead.closed)
+        pool.release(broken, reusable=False)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['discarded'], 2)
+
+
+class ReportCardArchiveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_archive_is_written_outside_media_and_downloaded_by_admins(self):
+        result = report_cards.build_archive(1, workers=1)
+        self.addCleanup(os.remove, result['path'])
+        self.assertEqual(result['count'], 0)
+        self.assertFalse(os.path.abspath(result['path']).startswith(os.path.abspath(settings.MEDIA_ROOT)))
+        self.assertEqual(os.path.dirname(result['path']), report_cards.get_config()['DIR'])
+
+        self.client.force_authenticate(make_admin())
+        response = self.client.get(result['url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('attachment', response['Content-Disposition'])
+        response.close()
+
+    def test_archives_of_the_same_second_do_not_collide(self):
+        first = report_cards.build_archive(1, workers=1)
+        second = report_cards.build_archive(1, workers=1)
+        self.addCleanup(os.remove, first['path'])
+        self.addCleanup(os.remove, second['path'])
+        self.assertNotEqual(first['path'], second['path'])
+
+    def test_only_admins_download_archives(self):
+        result = report_cards.build_archive(2, workers=1)
+        self.addCleanup(os.remove, result['path'])
+        self.assertIn(self.client.get(result['url']).status_code, (401, 403))
+        self.client.force_authenticate(make_user('student'))
+        self.assertEqual(self.client.get(result['url']).status_code, 403)
+
+    def test_only_generated_archive_names_are_served(self):
+        self.assertIsNone(report_cards.archive_path('../../settings.py'))
+        self.assertIsNone(report_cards.archive_path('semester-1-20260101-120000.zip'))
+        self.client.force_authenticate(make_admin())
+        response = self.client.get('/api/report-cards/semester-1-20260101-120000-0123abcd.zip/')
+        self.assertEqual(response.status_code, 404)
+
+
+def wait_for_job(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get_job(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'Job {job_id} did not finish')
+
+
+def active_tenant():
+    return tenancy.get_current(), tenancy.db_alias()
+
+
+class TenancyTests(TestCase):
+    databases = {'default', 'tenant_north', 'tenant_south'}
+
+    def setUp(self):
+        self.admins, self.courses = {}, {}
+        for slug in ('north', 'south'):
+            with tenancy.use_tenant(slug):
+                self.admins[slug] = make_admin()
+                teacher = make_user('teacher', role='teacher')
+                self.courses[slug] = Course.objects.create(
+                    title=f'{slug} course', description='', assigned_teacher=teacher)
+
+    def client_for(self, slug):
+        client = APIClient(HTTP_HOST=f'{slug}.testserver')
+        client.force_authenticate(self.admins[slug])
+        return client
+
+    def test_queries_go_to_the_active_tenants_database(self):
+        self.assertTrue(User.objects.using('tenant_north').filter(username='teacher').exists())
+        self.assertTrue(User.objects.using('tenant_south').filter(username='teacher').exists())
+        self.assertFalse(User.objects.filter(username='teacher').exists())
+        with tenancy.use_tenant('north'):
+            self.assertEqual(router.db_for_read(Course), 'tenant_north')
+            self.assertEqual(list(Course.objects.values_list('title', flat=True)), ['north course'])
+
+    def test_requests_are_served_from_their_hosts_database(self):
+        for slug in ('north', 'south', 'north'):
+            response = self.client_for(slug).get('/api/courses/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([course['title'] for course in response.json()], [f'{slug} course'])
+
+    def test_rows_of_two_schools_cannot_be_related(self):
+        with tenancy.use_tenant('north'):
+            student = make_user('student')
+        self.assertFalse(router.allow_relation(student, self.courses['south']))
+
+    @override_settings(TENANCY={'REQUIRED': True})
+    def test_unknown_host_is_refused_when_tenancy_is_required(self):
+        response = APIClient(HTTP_HOST='elsewhere.testserver').get('/api/courses/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Unknown school'})
+
+    @override_settings(TENANCY={'HEADER': 'X-Tenant'})
+    def test_header_selects_the_tenant(self):
+        factory = RequestFactory()
+        self.assertEqual(tenancy.resolve(factory.get('/', HTTP_X_TENANT='south')), 'south')
+        self.assertEqual(tenancy.resolve(factory.get('/', HTTP_HOST='north.testserver')), 'north')
+        with self.assertRaises(tenancy.UnknownTenant):
+            tenancy.resolve(factory.get('/', HTTP_X_TENANT='west'))
+
+    def test_cache_keys_are_per_tenant(self):
+        with tenancy.use_tenant('north'):
+            cache.set('tenancy-test', 'north')
+        with tenancy.use_tenant('south'):
+            self.assertIsNone(cache.get('tenancy-test'))
+            self.assertEqual(tenancy.scoped('channel'), 'south/channel')
+        self.assertIsNone(cache.get('tenancy-test'))
+        with tenancy.use_tenant('north'):
+            self.assertEqual(cache.get('tenancy-test'), 'north')
+            cache.delete('tenancy-test')
+
+    def test_media_is_stored_per_tenant(self):
+        with tenancy.use_tenant('north'):
+            name = default_storage.save('notes/tenancy.txt', ContentFile(b'north'))
+            self.addCleanup(default_storage.delete, name)
+            path = default_storage.path(name)
+            url = default_storage.url(name)
+        self.assertTrue(path.startswith(os.path.join(settings.MEDIA_ROOT, 'tenants', 'north') + os.sep))
+        self.assertTrue(url.startswith('/media/tenants/north/notes/'))
+        with tenancy.use_tenant('south'):
+            self.assertFalse(default_storage.exists(name))
+
+    def test_media_is_only_served_to_its_tenant(self):
+        with tenancy.use_tenant('north'):
+            name = default_storage.save('notes/served.txt', ContentFile(b'north'))
+            self.addCleanup(default_storage.delete, name)
+        request = RequestFactory().get('/')
+        served = f'tenants/north/{name}'
+        with tenancy.use_tenant('north'):
+            response = tenancy.serve_media(request, served, document_root=settings.MEDIA_ROOT)
+            self.assertEqual(b''.join(response.streaming_content), b'north')
+            with self.assertRaises(Http404):
+                tenancy.serve_media(request, f'tenants/north/../../{name}', document_root=settings.MEDIA_ROOT)
+        for slug in ('south', None):
+            with tenancy.use_tenant(slug), self.assertRaises(Http404):
+                tenancy.serve_media(request, served, document_root=settings.MEDIA_ROOT)
+
+    def test_catalogue_is_served_from_the_requests_school(self):
+        for slug in ('north', 'south'):
+            with tenancy.use_tenant(slug):
+                catalogue.publish(force=True)
+        request = RequestFactory().get('/')
+        document_root = catalogue.get_config()['DIR']
+
+        def fetch(path):
+            response = tenancy.serve_tenant_files(request, path, document_root=document_root)
+            return json.loads(b''.join(response.streaming_content))
+
+        for slug in ('north', 'south'):
+            with tenancy.use_tenant(slug):
+                [entry] = fetch('catalogue.json')['specialisations']
+                self.assertEqual([course['title'] for course in fetch(entry['json'])['courses']], [f'{slug} course'])
+        with self.assertRaises(Http404):
+            tenancy.serve_tenant_files(request, 'tenants/north/catalogue.json', document_root=document_root)
+
+    def test_report_card_archives_are_per_tenant(self):
+        with tenancy.use_tenant('north'):
+            result = report_cards.build_archive(1, workers=1)
+        self.addCleanup(os.remove, result['path'])
+        directory = os.path.join(report_cards.get_config()['DIR'], 'tenants', 'north')
+        self.assertEqual(os.path.dirname(result['path']), directory)
+        self.assertEqual(self.client_for('south').get(result['url']).status_code, 404)
+        response = self.client_for('north').get(result['url'])
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_jobs_run_for_the_tenant_that_queued_them(self):
+        with tenancy.use_tenant('north'):
+            job = jobs.submit('tenancy_test', active_tenant)
+            self.assertEqual(wait_for_job(job['id'])['result'], ('north', 'tenant_north'))
+        with tenancy.use_tenant('south'):
+            self.assertIsNone(jobs.get_job(job['id']))
+
+
+class TokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('token-user')
+        self.pair = tokens.issue_tokens(self.user)
+        self.client = APIClient()
+
+    def get_current_user(self, access):
+        return self.client.get('/api/auth/user/', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def assertRevoked(self, token, verify=tokens.verify_access_token):
+        with self.assertRaisesMessage(tokens.InvalidToken, 'Token has been revoked.'):
+            verify(token)
+
+    def test_access_token_authenticates_api_requests(self):
+        response = self.get_current_user(self.pair['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'token-user')
+
+    def test_forged_and_misused_tokens_are_rejected(self):
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify_access_token(self.pair['access'][:-2] + 'xx')
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify_access_token(self.pair['refresh'])
+        self.assertIn(self.get_current_user(self.pair['refresh']).status_code, (401, 403))
+
+    def test_revoked_tokens_are_rejected(self):
+        tokens.revoke_tokens(self.user)
+        self.assertRevoked(self.pair['access'])
+        self.assertRevoked(self.pair['refresh'], tokens.verify_refresh_token)
+        self.assertIn(self.get_current_user(self.pair['access']).status_code, (401, 403))
+        tokens.verify_access_token(tokens.issue_tokens(self.user)['access'])
+
+    def test_saving_a_loaded_profile_keeps_the_revocation(self):
+        user = User.objects.select_related('userprofile').get(pk=self.user.pk)
+        tokens.revoke_tokens(user)
+        user.userprofile.save()
+        self.assertRevoked(self.pair['access'])
+
+    @override_settings(API_TOKEN_VERSION_CACHE_TIMEOUT=1)
+    def test_cached_version_expires(self):
+        # Another worker revoking only clears its own process-local cache
+        cache.clear()
+        tokens.verify_access_token(self.pair['access'])
+        UserProfile.objects.filter(user=self.user).update(token_version=5)
+        tokens.verify_access_token(self.pair['access'])
+        time.sleep(1.1)
+        self.assertRevoked(self.pair['access'])
+
+    def test_deactivation_revokes_tokens(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertRevoked(self.pair['access'])
+        self.assertEqual(self.client.post('/api/auth/token/refresh/', {'refresh': self.pair['refresh']}).status_code, 401)
+
+    def test_staff_change_revokes_tokens(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertRevoked(self.pair['access'])
+
+    def test_role_change_revokes_tokens(self):
+        profile = User.objects.get(pk=self.user.pk).userprofile
+        profile.role = 'teacher'
+        profile.save()
+        self.assertRevoked(self.pair['access'])
+
+    def test_other_saves_keep_tokens_valid(self):
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.user.save(update_fields=['last_login'])
+        profile = User.objects.get(pk=self.user.pk).userprofile
+        profile.bio = 'Unchanged role'
+        profile.save()
+        tokens.verify_access_token(self.pair['access'])
+
+    def test_tokens_are_only_valid_at_the_issuing_school(self):
+        with self.assertRaises(tokens.InvalidToken), tenancy.use_tenant('north'):
+            tokens.verify_access_token(self.pair['access'])
+
+
+@override_settings(LOGIN_THROTTLE={'IP_RATE': (6, 0.01), 'USERNAME_RATE': (4, 0.01), 'BACKOFF_AFTER': 2,
+                                   'BACKOFF_BASE': 60})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(throttling, '_memory_store', throttling.MemoryStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = make_user('victim', password='right-password')
+
+    def login(self, ip, username='victim', password='wrong-password'):
+        request = RequestFactory().post('/', REMOTE_ADDR=ip)
+        return throttling.throttled_authenticate(request, username, password)
+
+    def test_failures_back_off_the_username_from_that_address(self):
+        for _ in range(3):
+            self.assertIsNone(self.login('10.6.6.6'))
+        with self.assertRaises(throttling.LoginThrottled) as raised:
+            self.login('10.6.6.6', password='right-password')
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    def test_attacks_from_other_addresses_do_not_lock_the_user_out(self):
+        for attacker in range(20):
+            for _ in range(4):
+                try:
+                    self.login(f'10.6.0.{attacker}')
+                except throttling.LoginThrottled:
+                    pass
+        self.assertEqual(self.login('10.0.0.10', password='right-password'), self.user)
+
+    def test_address_bucket_limits_guesses_across_usernames(self):
+        for i in range(6):
+            self.login('10.6.6.6', username=f'guess-{i}')
+        with self.assertRaises(throttling.LoginThrottled):
+            self.login('10.6.6.6', username='another')
+
+    def test_successful_logins_are_refunded(self):
+        # A classroom behind one NAT address
+        for _ in range(20):
+            self.assertEqual(self.login('10.0.0.1', password='right-password'), self.user)
+
+    def test_usernames_are_case_insensitive(self):
+        for _ in range(3):
+            self.login('10.6.6.6', username='VICTIM')
+        with self.assertRaises(throttling.LoginThrottled):
+            self.login('10.6.6.6', username='victim')
+
+    def test_api_login_answers_429_with_retry_after(self):
+        client = APIClient(REMOTE_ADDR='10.6.6.6')
+        for _ in range(3):
+            client.post('/api/auth/login/', {'username': 'victim', 'password': 'wrong-password'})
+        response = client.post('/api/auth/login/', {'username': 'victim', 'password': 'wrong-password'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        response = APIClient(REMOTE_ADDR='10.0.0.10').post(
+            '/api/auth/login/', {'username': 'victim', 'password': 'right-password'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_every_default_hasher_still_verifies(self):
+        from bawabati import settings as project_settings
+
+        # New passwords use PBKDF2; hashes of Django's other defaults are upgraded on login
+        self.assertEqual(project_settings.PASSWORD_HASHERS[0], 'django.contrib.auth.hashers.PBKDF2PasswordHasher')
+        self.assertEqual(set(project_settings.PASSWORD_HASHERS), set(global_settings.PASSWORD_HASHERS))
+
+
+class EnrollmentExportTests(TestCase):
+    def setUp(self):
+        teacher = make_user('teacher', role='teacher')
+        self.course = Course.objects.create(title='Control\x0bchars\x00 course', description='', assigned_teacher=teacher)
+        other = Course.objects.create(title='Other', description='', assigned_teacher=teacher)
+        for i in range(3):
+            student = make_user(f'student-{i}')
+            Enrollment.objects.create(course=self.course, student=student)
+            Enrollment.objects.create(course=other, student=student)
+        self.client = APIClient()
+        self.client.force_authenticate(make_admin())
+
+    def export(self, **params):
+        response = self.client.get('/api/enrollments/export/', params)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_invalid_course_is_refused_before_streaming(self):
+        response, _content = self.export(course='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+    def test_csv_export_of_one_course(self):
+        response, content = self.export(course=self.course.pk)
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0][:3], ['Course ID', 'Course', 'Username'])
+        self.assertEqual([row[2] for row in rows[1:]], ['student-0', 'student-1', 'student-2'])
+
+    def test_xlsx_export_strips_characters_xml_forbids(self):
+        response, content = self.export(filetype='xlsx')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        texts = [node.text for node in sheet.iter('{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')]
+        self.assertIn('Controlchars course', texts)
+        self.assertEqual(len(sheet[0]), 7)
+
+    def test_only_admins_export_enrollments(self):
+        self.client.force_authenticate(make_user('nosy'))
+        self.assertEqual(self.client.get('/api/enrollments/export/').status_code, 403)
+
+
+class StudentSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_admin())
+        teacher = make_user('teacher', role='teacher', first_name='Sara')
+        self.course = Course.objects.create(title='Course', description='', assigned_teacher=teacher)
+        # Seven students sharing one name, paged by their usernames
+        self.usernames = [f'sara{n}' for n in range(7)]
+        for username in self.usernames:
+            make_user(username, first_name='Sara', last_name='Haddad')
+        Enrollment.objects.create(student=User.objects.get(username='sara3'), course=self.course)
+        make_user('omar', first_name='Omar', last_name='Haddad')
+
+    def search(self, **params):
+        response = self.client.get('/api/students/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_continue_after_the_cursor(self):
+        seen, after = [], None
+        while True:
+            page = self.search(q='sara haddad', page_size=3, **({'after': after} if after else {}))
+            self.assertLessEqual(len(page['results']), 3)
+            seen += [row['username'] for row in page['results']]
+            after = page['next']
+            if after is None:
+                break
+            self.assertEqual(after, seen[-1])
+        self.assertEqual(seen, self.usernames)
+
+    def test_only_students_match(self):
+        # The teacher shares the name but is not a student
+        self.assertEqual(len(self.search(q='sara', page_size=100)['results']), 7)
+        self.assertEqual([row['username'] for row in self.search(q='Haddad Om')['results']], ['omar'])
+        self.assertEqual(self.search(q='teacher'), {'results': [], 'next': None})
+
+    def test_course_marks_enrolled_students(self):
+        results = self.search(q='sara', course=self.course.pk)['results']
+        self.assertEqual([row['username'] for row in results if row['enrolled']], ['sara3'])
+
+    def test_requires_an_admin(self):
+        for role in ('teacher', 'student'):
+            self.client.force_authenticate(make_user(f'searching-{role}', role=role))
+            self.assertEqual(self.client.get('/api/students/search/', {'q': 'sara'}).status_code, 403)
+        self.client.force_authenticate(make_user('staff-teacher', role='teacher', is_staff=True))
+        self.assertEqual(len(self.search(q='sara')['results']), 7)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get('/api/students/search/').status_code, (401, 403))
+
+    def test_invalid_page_sizes_are_rejected(self):
+        for page_size in ('many', '0'):
+            response = self.client.get('/api/students/search/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 400)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_admin())
+        teacher = make_user('teacher', role='teacher')
+        self.courses = [Course.objects.create(title=title, description='', assigned_teacher=teacher)
+                        for title in ('Physics', 'Philosophy', 'Algebra')]
+        self.student = make_user('student')
+        for course in self.courses:
+            Grade.objects.create(student=self.student, course=course, semester=1, assessment_type='exam',
+                                 written_grade=10)
+
+    def changelist(self, **params):
+        response = self.client.get('/admin/bawabati_app/grade/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def titles(self, response):
+        return sorted(grade.course.title for grade in response.context['cl'].result_list)
+
+    def test_unfiltered_changelist_uses_the_estimated_count(self):
+        with mock.patch('bawabati_app.admin._estimated_rows', return_value=25000) as estimated:
+            response = self.changelist()
+            self.assertEqual(response.context['cl'].paginator.count, 25000)
+            self.assertContains(response, '25000 grades')
+            # Filtered lists and small tables are counted exactly
+            self.assertEqual(self.changelist(semester=1).context['cl'].paginator.count, 3)
+            estimated.return_value = 50
+            self.assertEqual(self.changelist().context['cl'].paginator.count, 3)
+        self.assertEqual(estimated.call_count, 2)
+
+    def test_input_filter_matches_ids_and_title_prefixes(self):
+        self.assertEqual(self.titles(self.changelist(course='ph')), ['Philosophy', 'Physics'])
+        self.assertEqual(self.titles(self.changelist(course=self.courses[2].pk)), ['Algebra'])
+        self.assertEqual(self.titles(self.changelist(course='  ')), ['Algebra', 'Philosophy', 'Physics'])
+
+    def test_input_filter_escapes_its_value(self):
+        response = self.changelist(course='"><script>x</script>', semester=1)
+        self.assertNotContains(response, '"><script>x</script>')
+        self.assertContains(response, 'value="&quot;&gt;&lt;script&gt;x&lt;/script&gt;"')
+        # The other filters are resubmitted with the form
+        self.assertContains(response, '<input type="hidden" name="semester" value="1">', html=True)
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(object_cache, '_local', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def get(self):
+        return object_cache.get_or_set('test-entry', ['courses'], self.compute)
+
+    def test_entries_are_computed_once_until_their_scope_is_bumped(self):
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 1)
+        object_cache.bump('courses')
+        self.assertEqual(self.get(), 2)
+
+    def test_bumps_wait_for_the_commit(self):
+        self.assertEqual(self.get(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            object_cache.bump_on_commit('courses')
+            object_cache.bump_on_commit('courses', 'users')
+            # A reader before the commit must not cache the old rows under new versions
+            self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 2)
+
+    def test_rolled_back_writes_do_not_bump(self):
+        self.assertEqual(self.get(), 1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                object_cache.bump_on_commit('courses')
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.get(), 1)
+
+    def test_course_saves_invalidate_the_course_list_on_commit(self):
+        teacher = make_user('teacher', role='teacher')
+        client = APIClient()
+        client.force_authenticate(teacher)
+        self.assertEqual(client.get('/api/courses/').json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='New course', description='', assigned_teacher=teacher)
+            self.assertEqual(client.get('/api/courses/').json(), [])
+        self.assertEqual([course['title'] for course in client.get('/api/courses/').json()], ['New course'])
+
+
+class RosterTests(TestCase):
+    def parse(self, *lines):
+        return provisioning.parse_roster('username,role,email\n' + '\n'.join(lines) + '\n')
+
+    def errors(self, *lines):
+        with self.assertRaises(provisioning.RosterError) as raised:
+            self.parse(*lines)
+        return raised.exception.errors
+
+    def test_valid_roster(self):
+        rows = self.parse('alice,student,alice@example.com', 'bob,Teacher,')
+        self.assertEqual([(row['username'], row['role']) for row in rows], [('alice', 'student'), ('bob', 'teacher')])
+
+    def test_usernames_and_emails_are_validated(self):
+        errors = self.errors('bad name,student,', 'x' * 151 + ',student,', 'carol,student,not-an-email')
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith('Line 2: username:'))
+        self.assertTrue(errors[1].startswith('Line 3: username:'))
+        self.assertTrue(errors[2].startswith('Line 4: email:'))
+
+    def test_duplicates_are_case_insensitive(self):
+        self.assertEqual(self.errors('alice,student,', 'Alice,student,'), ['Line 3: duplicate username Alice'])
+
+    def test_existing_users_are_case_insensitive(self):
+        make_user('Alice')
+        self.assertEqual(self.errors('bob,student,', 'alice,student,'), ['Line 3: user alice already exists'])
+
+
+class GradeHistoryTests(TestCase):
+    def setUp(self):
+        self.teacher = make_user('teacher', role='teacher')
+        self.student = make_user('student')
+        self.course = Course.objects.create(title='Course', description='', assigned_teacher=self.teacher)
+
+    def grade(self, assessment_type='control_1', written_grade=12):
+        return Grade.objects.create(student=self.student, course=self.course, semester=1,
+                                    assessment_type=assessment_type, written_grade=written_grade,
+                                    graded_by=self.teacher)
+
+    def actions(self, grade):
+        return list(grade_history.history(grade.pk).values_list('action', flat=True))
+
+    def test_saves_log_the_changed_fields(self):
+        grade = self.grade()
+        grade.written_grade = 15
+        grade.save()
+        change = grade_history.history(grade.pk).last()
+        self.assertEqual(change.action, GradeChange.UPDATE)
+        self.assertEqual(set(change.changes), {'written_grade', 'final_grade'})
+        self.assertEqual(change.changed_by_id, self.teacher.pk)
+
+    def test_recomputed_grades_replay_to_their_new_values(self):
+        grade = Grade.objects.create(student=self.student, course=self.course, semester=1,
+                                     assessment_type='exam', written_grade=10, participation=20, homework=20)
+        self.course.grading_policy = GradingPolicy.objects.create(
+            name='Written only', written_weight=1, participation_weight=0, homework_weight=0)
+        self.course.save()
+        grading.recompute([self.course.pk])
+        self.assertEqual(grade_history.history(grade.pk).last().changes, {'final_grade': '10.00'})
+        [replayed] = grade_history.grades_as_of(self.course.pk, timezone.now())
+        self.assertEqual(replayed['final_grade'], '10.00')
+
+    def test_queryset_deletes_are_logged_once(self):
+        grade = self.grade()
+        Grade.objects.filter(pk=grade.pk).delete()
+        self.assertEqual(self.actions(grade), [GradeChange.CREATE, GradeChange.DELETE])
+
+    def test_cascaded_deletes_are_logged(self):
+        grades = [self.grade('control_1'), self.grade('exam')]
+        self.teacher.delete()
+        for grade in grades:
+            self.assertEqual(self.actions(grade), [GradeChange.CREATE, GradeChange.DELETE])
+        # The deleted teacher is not referenced by the entries
+        self.assertFalse(GradeChange.objects.filter(action=GradeChange.DELETE, changed_by__isnull=False).exists())
+        self.assertEqual(grade_history.grades_as_of(self.course.pk, timezone.now()), [])
+
+    def test_recording_batches_deletes_and_attributes_them(self):
+        admin = make_admin()
+        grades = [self.grade('control_1'), self.grade('control_2'), self.grade('exam')]
+        with CaptureQueriesContext(connection) as queries, grade_history.recording(changed_by_id=admin.pk):
+            self.course.delete()
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "bawabati_app_gradechange"')]
+        self.assertEqual(len(inserts), 1)
+        deletions = GradeChange.objects.filter(action=GradeChange.DELETE)
+        self.assertEqual(sorted(deletions.values_list('grade_id', flat=True)), sorted(grade.pk for grade in grades))
+        self.assertEqual(set(deletions.values_list('changed_by_id', flat=True)), {admin.pk})
+
+
+class RankingRefreshTests(TestCase):
+    def setUp(self):
+        # Drop refreshes left pending by earlier tests, whose transactions never commit
+        rankings._pending.__dict__.clear()
+
+    def test_partitions_are_refreshed_once_per_commit(self):
+        with mock.patch.object(rankings, 'refresh') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for semester in (1, 2, 1, 2, 1):
+                    rankings.schedule_refresh(7, semester)
+                refresh.assert_not_called()
+        self.assertEqual(refresh.call_args_list, [mock.call(7, 1), mock.call(7, 2)])
+
+    def test_rolled_back_refreshes_wait_for_the_next_commit(self):
+        with mock.patch.object(rankings, 'refresh') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    rankings.schedule_refresh(7, 1)
+                    transaction.set_rollback(True)
+            refresh.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                rankings.schedule_refresh(7, 2)
+        self.assertEqual(refresh.call_args_list, [mock.call(7, 1), mock.call(7, 2)])
+
+
+class RolloverTests(TestCase):
+    def setUp(self):
+        teacher = make_user('teacher', role='teacher')
+        self.students = [make_user(f'student-{i}') for i in range(3)]
+        self.course = Course.objects.create(title='Ended', description='', assigned_teacher=teacher,
+                                            end_date=timezone.localdate() - timezone.timedelta(days=1))
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+            for assessment_type in ('control_1', 'exam'):
+                Grade.objects.create(student=student, course=self.course, semester=1,
+                                     assessment_type=assessment_type, written_grade=12)
+            GradeReport.objects.create(student=student, course=self.course, semester=1)
+        Note.objects.create(title='Note', course=self.course, uploaded_by=teacher, content='')
+
+    def test_rollover_batches_the_delete_side_effects(self):
+        with mock.patch.object(events, 'publish') as publish, \
+                mock.patch.object(rankings, 'refresh') as refresh, \
+                mock.patch.object(catalogue, 'schedule_publish') as schedule_publish, \
+                mock.patch.object(object_cache, 'bump') as bump, \
+                self.captureOnCommitCallbacks(execute=True):
+            summary = archive.rollover()
+        self.assertEqual(summary['grades'], 6)
+        publish.assert_not_called()
+        refresh.assert_not_called()
+        schedule_publish.assert_called_once_with()
+        bump.assert_called_once()
+        # Also holds the scopes setUp left pending, whose commit never ran
+        self.assertLessEqual({
+            'courses', f'course:{self.course.pk}', f'course:{self.course.pk}:notes',
+            *(f'student:{student.pk}' for student in self.students)}, set(bump.call_args.args))
+        self.assertTrue(CourseArchive.objects.filter(course_id=self.course.pk).exists())
+
+    def test_rollover_logs_the_deleted_grades(self):
+        with CaptureQueriesContext(connection) as queries:
+            archive.rollover()
+        deletions = GradeChange.objects.filter(course_id=self.course.pk, action=GradeChange.DELETE)
+        self.assertEqual(deletions.count(), 6)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "bawabati_app_gradechange"')]
+        self.assertEqual(len(inserts), 1)
+
+
+class MetricsWorkerTests(SimpleTestCase):
+    def test_forked_workers_get_their_own_registry_and_file(self):
+        parent = metrics.get_registry()
+        parent_id = metrics._worker_id
+        child_pid = os.getpid() + 1
+        with mock.patch('os.getpid', return_value=child_pid):
+            child = metrics.get_registry()
+            self.assertIsNot(child, parent)
+            self.assertTrue(metrics._worker_id.startswith(f'{child_pid}-'))
+            self.assertIs(metrics.get_registry(), child)
+        self.assertNotEqual(metrics._worker_id, parent_id)
+
+
+class RendererTests(SimpleTestCase):
+    def render(self, data):
+        return renderers.FastJSONRenderer().render(data), JSONRenderer().render(data)
+
+    def test_api_values_render_the_same_bytes_as_drf(self):
+        data = {'average': Decimal('12.35'), 'rank': 0.25, 'count': 3, 'when': timezone.now(),
+                'day': timezone.localdate(), 'title': 'Cours\u2028été', 'missing': None, 'ids': [1, 2]}
+        fast, drf = self.render(data)
+        self.assertEqual(fast, drf)
+
+    def test_exponent_floats_parse_to_the_same_numbers(self):
+        fast, drf = self.render([1e16, 1e-05])
+        self.assertEqual(json.loads(fast), json.loads(drf))
+
+    def test_msgpack_is_only_offered_when_installed(self):
+        offered = 'bawabati_app.renderers.MessagePackRenderer' in settings.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        self.assertEqual(offered, renderers.msgpack is not None)
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.teacher = make_user('teacher', role='teacher')
+        self.course = Course.objects.create(title='Course', description='', assigned_teacher=self.teacher)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def batch(self, *items):
+        response = self.client.post('/api/batch/', {'requests': list(items)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(entry['status'], entry['body']) for entry in response.json()['responses']]
+
+    def test_api_requests_are_dispatched(self):
+        [(status, body)] = self.batch({'path': f'/api/courses/{self.course.pk}/rankings/'})
+        self.assertEqual((status, body), (200, []))
+
+    def test_only_named_api_routes_can_be_batched(self):
+        results = self.batch(
+            {'method': 'POST', 'path': f'/courses/{self.course.pk}/delete/'},
+            {'method': 'POST', 'path': '/api/users/bulk/'},
+            {'method': 'POST', 'path': '/api/batch/'},
+            {'method': 'POST', 'path': '/api/nowhere/'},
+        )
+        self.assertEqual([status for status, body in results], [400, 400, 400, 404])
+        self.assertTrue(Course.objects.filter(pk=self.course.pk).exists())
+
+    def test_failing_requests_get_their_own_500(self):
+        with mock.patch.object(rankings, 'course_rankings', side_effect=RuntimeError('boom')), \
+                self.assertLogs('bawabati_app.batch', 'ERROR'):
+            results = self.batch(
+                {'path': f'/api/courses/{self.course.pk}/rankings/'},
+                {'method': 'POST', 'path': '/api/batch/'},
+                {'path': '/api/courses/'},
+            )
+        self.assertEqual([status for status, body in results], [500, 400, 200])
+        self.assertEqual(results[0][1], {'error': 'Internal server error'})
+
+    def test_anonymous_batches_are_refused(self):
+        response = APIClient().post('/api/batch/', {'requests': [{'path': '/api/courses/'}]}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@override_settings(UPLOADS={**settings.UPLOADS, 'CHUNK_SIZE': 4})
+class UploadTests(TestCase):
+    content = b'lecture-notes'
+
+    def setUp(self):
+        self.teacher = make_user('teacher', role='teacher')
+        self.course = Course.objects.create(title='Course', description='', assigned_teacher=self.teacher)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def start(self, **fields):
+        data = {'title': 'Lecture', 'filename': '../lecture.txt', 'size': len(self.content),
+                'sha256': sha256(self.content), **fields}
+        response = self.client.post(f'/api/courses/{self.course.pk}/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload, index, data=None, checksum=None):
+        if data is None:
+            data = self.content[index * 4:(index + 1) * 4]
+        return self.client.put(f"/api/uploads/{upload['id']}/chunks/{index}/", data,
+                               content_type='application/octet-stream',
+                               HTTP_X_CHUNK_SHA256=checksum or sha256(data))
+
+    def complete(self, upload):
+        return self.client.post(f"/api/uploads/{upload['id']}/complete/")
+
+    def test_chunks_sent_in_any_order_are_joined_into_the_note(self):
+        upload = self.start()
+        self.assertEqual((upload['filename'], upload['chunk_count']), ('lecture.txt', 4))
+        for index in (3, 1, 0, 1):
+            self.assertEqual(self.put_chunk(upload, index).status_code, 200)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload['id']}/").json()['missing'], [2])
+        self.assertEqual(self.complete(upload).status_code, 409)
+
+        self.assertEqual(self.put_chunk(upload, 2).status_code, 200)
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 201)
+        note = Note.objects.get(pk=response.json()['note']['id'])
+        self.addCleanup(note.file.delete, save=False)
+        with note.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        # Completing again is harmless and the chunks are gone
+        self.assertEqual(self.complete(upload).json()['note']['id'], note.pk)
+        self.assertFalse(os.path.exists(os.path.join(uploads.get_config()['DIR'], upload['id'])))
+
+    def test_damaged_chunks_are_refused(self):
+        upload = self.start()
+        self.assertEqual(self.put_chunk(upload, 0, checksum=sha256(b'else')).status_code, 400)
+        self.assertEqual(self.put_chunk(upload, 0, data=b'short').status_code, 400)
+        self.assertEqual(self.put_chunk(upload, 4).status_code, 404)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload['id']}/").json()['received'], [])
+
+    def test_assembled_file_must_match_the_upload_checksum(self):
+        upload = self.start(sha256=sha256(b'something else'))
+        for index in range(upload['chunk_count']):
+            self.put_chunk(upload, index)
+        self.assertEqual(self.complete(upload).status_code, 422)
+        self.assertFalse(Note.objects.exists())
+
+    def test_uploads_belong_to_their_uploader(self):
+        upload = self.start()
+        other = APIClient()
+        other.force_authenticate(make_user('other', role='teacher'))
+        self.assertEqual(other.get(f"/api/uploads/{upload['id']}/").status_code, 404)
+        self.assertEqual(other.post(f"/api/uploads/{upload['id']}/complete/").status_code, 404)
+        other.force_authenticate(make_user('student'))
+        response = other.post(f'/api/courses/{self.course.pk}/uploads/',
+                              {'title': 'x', 'filename': 'x', 'size': 1}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_stale_sessions_are_collected(self):
+        upload = self.start()
+        self.put_chunk(upload, 0)
+        uploads.collect_garbage(max_age_hours=0)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload['id']}/").status_code, 404)
+        self.assertFalse(os.path.exists(os.path.join(uploads.get_config()['DIR'], upload['id'])))
+
+
+class GradingPolicyTests(TestCase):
+    weights = {'written_weight': Decimal('0.50'), 'participation_weight': Decimal('0.25'),
+               'homework_weight': Decimal('0.25'), 'continuous_weight': Decimal('0.50'),
+               'exam_weight': Decimal('0.50')}
+
+    def setUp(self):
+        self.admin = make_admin()
+        teacher = make_user('teacher', role='teacher')
+        self.course = Course.objects.create(title='Course', description='', assigned_teacher=teacher)
+        self.policy = GradingPolicy.objects.create(name='Policy')
+        marks = [(12, 20, 4), (8, None, 18), (15, 10, 10)]
+        for index, (written, participation, homework) in enumerate(marks):
+            student = make_user(f'student-{index}')
+            for assessment_type in ('control_1', 'control_2', 'exam'):
+                grade = Grade.objects.create(student=student, course=self.course, semester=1,
+                                             assessment_type=assessment_type, written_grade=written,
+                                             participation=participation, homework=homework)
+            GradeReport.objects.create(student=student, course=self.course, semester=1, exam_grade=grade.final_grade)
+
+    def test_weights_fall_back_to_the_defaults(self):
+        self.assertEqual(GradingPolicy.weights_for_course(self.course.pk), GradingPolicy.DEFAULT_WEIGHTS)
+        self.assertEqual(GradingPolicy.weights_for_course(None), GradingPolicy.DEFAULT_WEIGHTS)
+        policy = GradingPolicy.objects.create(name='Custom', **self.weights)
+        Course.objects.filter(pk=self.course.pk).update(grading_policy=policy)
+        self.assertEqual(GradingPolicy.weights_for_course(self.course.pk), self.weights)
+
+    def test_grades_use_their_courses_weights(self):
+        Course.objects.filter(pk=self.course.pk).update(
+            grading_policy=GradingPolicy.objects.create(name='Custom', **self.weights))
+        grade = Grade.objects.create(student=make_user('new-student'), course=self.course, semester=2,
+                                     assessment_type='exam', written_grade=10, participation=20, homework=0)
+        self.assertEqual(grade.final_grade, Decimal('10.00'))
+
+    def snapshot(self):
+        return (dict(Grade.objects.values_list('id', 'final_grade')),
+                dict(GradeReport.objects.values_list('id', 'final_average')))
+
+    def test_preview_reads_only_and_matches_the_recompute(self):
+        before = self.snapshot()
+        with CaptureQueriesContext(connection) as queries:
+            preview = grading.preview([self.course.pk], self.weights)
+        self.assertEqual([query['sql'] for query in queries if not query['sql'].startswith('SELECT')], [])
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(preview['grades_changed'], 6)
+
+        GradingPolicy.objects.filter(pk=self.policy.pk).update(**self.weights)
+        Course.objects.filter(pk=self.course.pk).update(grading_policy=self.policy)
+        recomputed = grading.recompute([self.course.pk])
+        self.assertEqual(preview, recomputed)
+        self.assertNotEqual(self.snapshot(), before)
+
+    def test_recomputed_grades_are_attributed_to_the_admin_saving_the_policy(self):
+        Course.objects.filter(pk=self.course.pk).update(grading_policy=self.policy)
+        self.client.force_login(self.admin)
+        data = {'name': 'Policy', **self.weights}
+        with mock.patch.object(jobs, 'submit', side_effect=lambda name, func, *args: func(*args)), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/bawabati_app/gradingpolicy/{self.policy.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        updates = GradeChange.objects.filter(action=GradeChange.UPDATE)
+        self.assertEqual(updates.count(), 6)
+        self.assertEqual(set(updates.values_list('changed_by_id', flat=True)), {self.admin.pk})
+
+
+class SessionTests(TestCase):
+    def store(self, mode, session_key=None):
+        return import_module(sessions.engine(mode)).SessionStore(session_key)
+
+    def test_cached_sessions_need_a_shared_cache(self):
+        with override_settings(SESSION_ENGINE=sessions.engine('cached')):
+            [error] = sessions.check_session_cache()
+        self.assertEqual(error.id, 'bawabati_app.E001')
+        for mode in ('db', 'signed'):
+            with override_settings(SESSION_ENGINE=sessions.engine(mode)):
+                self.assertEqual(sessions.check_session_cache(), [])
+
+    def test_cached_sessions_survive_a_cache_outage(self):
+        session = self.store('db')
+        session['user'] = 'alice'
+        session.save()
+        store = self.store('cached', session.session_key)
+        store._cache = mock.Mock(**{'get.side_effect': ConnectionError, 'set.side_effect': ConnectionError,
+                                    'delete.side_effect': ConnectionError})
+        with self.assertLogs('bawabati_app.session_backends.cached', 'WARNING'):
+            self.assertEqual(store.load(), {'user': 'alice'})
+            store['user'] = 'bob'
+            store.save()
+            self.assertEqual(self.store('db', session.session_key).load(), {'user': 'bob'})
+            store.delete()
+        self.assertFalse(Session.objects.filter(session_key=session.session_key).exists())
+
+    def test_cached_sessions_are_read_from_the_cache(self):
+        store = self.store('cached')
+        store['user'] = 'alice'
+        store.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store('cached', store.session_key).load(), {'user': 'alice'})
+        store.flush()
+        self.assertEqual(self.store('cached', store.session_key).load(), {})
+
+    def make_sessions(self, expired, live):
+        now = timezone.now()
+        for index in range(expired + live):
+            expire_date = now - timedelta(days=1) if index < expired else now + timedelta(days=1)
+            Session.objects.create(session_key=f'session-{index:04d}', session_data='', expire_date=expire_date)
+
+    def test_expired_sessions_are_purged_in_batches(self):
+        self.make_sessions(expired=5, live=2)
+        with self.assertNumQueries(7):  # Three batches of two and a last empty read
+            self.assertEqual(sessions.purge_expired(batch_size=2), 5)
+        self.assertEqual(Session.objects.count(), 2)
+
+    def test_purge_sessions_command(self):
+        self.make_sessions(expired=3, live=1)
+        out = io.StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('Removed 3 expired sessions.', out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)
+
+    @override_settings(SESSIONS={'PURGE_INTERVAL': 60})
+    def test_new_sessions_schedule_one_purge_per_interval(self):
+        cache.delete(sessions.PURGE_KEY)
+        self.addCleanup(cache.delete, sessions.PURGE_KEY)
+        with mock.patch.object(jobs, 'submit') as submit:
+            for _ in range(3):
+                self.store('db').create()
+        submit.assert_called_once_with('purge_sessions', sessions.purge_expired)
+
+
+class TranscriptTests(TestCase):
+    def setUp(self):
+        self.student = make_user('student')
+        teacher = make_user('teacher', role='teacher')
+        self.courses = {title: Course.objects.create(title=title, description='', assigned_teacher=teacher)
+                        for title in ('Physics', 'Algebra')}
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def grade(self, course, semester, marks):
+        """Grade the student with ``{assessment_type: written_grade}`` and write their report."""
+        for assessment_type, written_grade in marks.items():
+            grade = Grade.objects.create(student=self.student, course=course, semester=semester,
+                                         assessment_type=assessment_type, written_grade=written_grade)
+        return GradeReport.objects.create(student=self.student, course=course, semester=semester,
+                                          exam_grade=grade.final_grade)
+
+    def test_semesters_courses_and_grades_are_ordered_and_averaged(self):
+        physics = self.grade(self.courses['Physics'], 1, {'control_1': 10, 'control_2': 20, 'exam': 20})
+        algebra = self.grade(self.courses['Algebra'], 1, {'control_1': 18, 'exam': 10})
+        self.grade(self.courses['Physics'], 2, {'control_1': 12, 'exam': 12})
+
+        transcript = transcripts.build_transcript(self.student)
+        self.assertEqual([semester['semester'] for semester in transcript['semesters']], [1, 2])
+        first = transcript['semesters'][0]
+        self.assertEqual([course['course_title'] for course in first['courses']], ['Algebra', 'Physics'])
+        self.assertEqual(first['average'], round((physics.final_average + algebra.final_average) / 2, 2))
+        self.assertEqual([grade['assessment_type'] for grade in first['courses'][1]['grades']],
+                         ['control_1', 'control_2', 'exam'])
+        self.assertEqual(first['courses'][1]['report']['final_average'], physics.final_average)
+
+    def get(self):
+        response = self.client.get('/api/students/me/transcript/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cached_transcript_follows_grade_saves_and_course_renames(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grade(self.courses['Physics'], 1, {'control_1': 10, 'exam': 20})
+        course = self.get()['semesters'][0]['courses'][0]
+        self.assertEqual((course['course_title'], course['grades'][0]['written_grade']), ('Physics', 10.0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grade = Grade.objects.get(assessment_type='control_1')
+            grade.written_grade = 15
+            grade.save()
+        self.assertEqual(self.get()['semesters'][0]['courses'][0]['grades'][0]['written_grade'], 15.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.courses['Physics'].title = 'Mechanics'
+            self.courses['Physics'].save()
+        self.assertEqual(self.get()['semesters'][0]['courses'][0]['course_title'], 'Mechanics')
+
+    def test_only_students_have_a_transcript(self):
+        self.client.force_authenticate(make_user('other-teacher', role='teacher'))
+        self.assertEqual(self.client.get('/api/students/me/transcript/').status_code, 403)
+
+
+class EventTests(TestCase):
+    def setUp(self):
+        self.teacher = make_user('teacher', role='teacher')
+        self.course = Course.objects.create(title='Physics', description='', assigned_teacher=self.teacher)
+        self.other_course = Course.objects.create(title='Algebra', description='',
+                                                  assigned_teacher=make_user('other-teacher', role='teacher'))
+        self.student = make_user('student')
+        self.classmate = make_user('classmate')
+        for student in (self.student, self.classmate):
+            Enrollment.objects.create(student=student, course=self.course)
+        self.admin = make_admin()
+
+    def test_channels_for_each_role(self):
+        course = self.course.pk
+        self.assertEqual(events.channels_for(self.admin), ['all'])
+        self.assertEqual(events.channels_for(self.teacher), [f'course:{course}', f'course:{course}:staff'])
+        self.assertEqual(events.channels_for(self.student), [f'student:{self.student.pk}', f'course:{course}'])
+        with tenancy.use_tenant('north'):
+            self.assertEqual(events.channels_for(self.admin), ['north/all'])
+
+    def test_publish_fans_out_to_the_subscribed_roles(self):
+        users = {'admin': self.admin, 'teacher': self.teacher, 'student': self.student, 'classmate': self.classmate}
+        channels = {name: events.channels_for(user) for name, user in users.items()}
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def subscribe():
+            return {name: broker.subscribe(user_channels) for name, user_channels in channels.items()}
+
+        broker = events.MemoryBroker()
+        with mock.patch.object(events, '_broker', broker):
+            subscriptions = loop.run_until_complete(subscribe())
+            with self.captureOnCommitCallbacks(execute=True):
+                Grade.objects.create(student=self.student, course=self.course, semester=1,
+                                     assessment_type='control_1', written_grade=12)
+                Note.objects.create(course=self.course, title='Homework', content='', uploaded_by=self.teacher)
+                Note.objects.create(course=self.other_course, title='Elsewhere', content='', uploaded_by=self.teacher)
+        # Deliveries are scheduled on the subscribers' loop
+        loop.run_until_complete(asyncio.sleep(0))
+
+        received = {}
+        for name, subscription in subscriptions.items():
+            received[name] = []
+            while not subscription.queue.empty():
+                event = subscription.queue.get_nowait()
+                received[name].append((event['type'], event['data'].get('title')))
+        homework, elsewhere = ('note', 'Homework'), ('note', 'Elsewhere')
+        self.assertEqual(received['admin'], [('grade', None), homework, elsewhere])
+        self.assertEqual(received['teacher'], [('grade', None), homework])
+        self.assertEqual(received['student'], [('grade', None), homework])
+        # Classmates only share the course channel, never another student's grades
+        self.assertEqual(received['classmate'], [homework])
+        self.assertFalse(any(channel.endswith(':staff') for channel in channels['student'] + channels['classmate']))
+
+    def test_stream_authenticates_with_a_token_parameter(self):
+        factory = RequestFactory()
+
+        def channels(**params):
+            request = factory.get('/api/events/', params)
+            request.user = AnonymousUser()
+            return api_views._event_stream_channels(request)
+
+        self.assertIsNone(channels())
+        self.assertIsNone(channels(token='not-a-token'))
+        self.assertEqual(channels(token=tokens.issue_tokens(self.student)['access']),
+                         [f'student:{self.student.pk}', f'course:{self.course.pk}'])
+
+    async def test_unauthenticated_stream_is_refused(self):
+        for url in ('/api/events/', '/api/events/?token=not-a-token'):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(json.loads(response.content), {'error': 'Authentication required'})
+
+
+class PrecompressedStaticTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        files = {
+            'app.css': b'body { color: red }', 'app.css.gz': b'gzip', 'app.css.br': b'brotli',
+            'app.js': b'alert(1)', 'app.js.gz': b'gzip', 'logo.png': b'png',
+        }
+        for name, content in files.items():
+            with open(os.path.join(root.name, name), 'wb') as f:
+                f.write(content)
+        settings_override = override_settings(STATIC_ROOT=root.name, STATIC_URL='/static/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse(status=404))
+
+    def get(self, name, accept_encoding=None):
+        headers = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding is not None else {}
+        response = self.middleware(RequestFactory().get(f'/static/{name}', **headers))
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        response.close()
+        return response, content
+
+    def test_best_accepted_encoding_is_served(self):
+        for accept_encoding, encoding, content in [
+            ('gzip, deflate, br', 'br', b'brotli'),
+            ('gzip', 'gzip', b'gzip'),
+            ('br;q=0, gzip;q=0.5', 'gzip', b'gzip'),
+            ('identity', None, b'body { color: red }'),
+            (None, None, b'body { color: red }'),
+        ]:
+            with self.subTest(accept_encoding):
+                response, served = self.get('app.css', accept_encoding)
+                self.assertEqual(served, content)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+                self.assertEqual(response['Content-Type'], 'text/css')
+                self.assertEqual(response['Content-Length'], str(len(content)))
+
+    def test_missing_variants_fall_back(self):
+        response, served = self.get('app.js', 'br')
+        self.assertEqual(served, b'alert(1)')
+        self.assertNotIn('Content-Encoding', response)
+        response, served = self.get('app.js', 'br, gzip')
+        self.assertEqual((response['Content-Encoding'], served), ('gzip', b'gzip'))
+
+    def test_incompressible_files_do_not_vary(self):
+        response, served = self.get('logo.png', 'gzip, br')
+        self.assertEqual(served, b'png')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('Vary', response)
+
+    def test_other_requests_pass_through(self):
+        for path in ('/static/missing.css', '/static/../settings.py', '/api/courses/'):
+            self.assertEqual(self.middleware(RequestFactory().get(path)).status_code, 404)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        settings_override = override_settings(PROFILING={'ENABLED': True, 'DIR': self.dir})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = make_admin()
+        self.client.force_login(self.admin)
+
+    def get(self, token):
+        response = self.client.get('/api/courses/', {profiling.QUERY_PARAM: token})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_only_an_admin_token_profiles(self):
+        teacher = make_user('teacher', role='teacher', is_staff=True)
+        unsigned = signing.dumps({'u': self.admin.pk}, salt='another.salt')
+        for token in ('not-a-token', unsigned, profiling.make_token(teacher)):
+            with self.subTest(token):
+                self.assertNotIn('X-Profile-Id', self.get(token))
+        self.assertEqual(os.listdir(self.dir), [])
+
+        profile_id = self.get(profiling.make_token(self.admin))['X-Profile-Id']
+        summary, stats = profiling.load(profile_id)
+        self.assertEqual((summary['path'], summary['user'], summary['status']), ('/api/courses/', 'admin', 200))
+        self.assertGreater(summary['sql']['count'], 0)
+        self.assertEqual(sorted(os.listdir(self.dir)), [f'{profile_id}.{ext}' for ext in ('folded', 'json', 'prof')])
+
+    def store(self, profile_id, age_days=0):
+        mtime = time.time() - age_days * 24 * 60 * 60
+        for extension in profiling.EXTENSIONS:
+            path = os.path.join(profiling.profile_dir(), f'{profile_id}.{extension}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(json.dumps({'id': profile_id}) if extension == 'json' else '')
+            os.utime(path, (mtime, mtime))
+
+    def stored(self):
+        return [summary['id'] for summary in profiling.list_profiles()]
+
+    def test_retention_removes_old_and_excess_profiles(self):
+        self.store('20240101-000000-old', age_days=8)
+        for n in range(4):
+            self.store(f'20240102-00000{n}-recent')
+        with override_settings(PROFILING={'DIR': self.dir, 'MAX_PROFILES': 3, 'MAX_AGE_DAYS': 7}):
+            self.assertEqual(profiling.prune(), 2)
+        self.assertEqual(self.stored(), [f'20240102-00000{n}-recent' for n in (3, 2, 1)])
+        self.assertEqual(len(os.listdir(self.dir)), 9)
+
+    def test_profiles_are_kept_per_tenant(self):
+        self.store('20240101-000000-default')
+        with tenancy.use_tenant('north'):
+            self.assertEqual(profiling.profile_dir(), os.path.join(self.dir, 'tenants', 'north'))
+            self.store('20240101-000000-north')
+            self.assertEqual(self.stored(), ['20240101-000000-north'])
+            with self.assertRaises(FileNotFoundError):
+                profiling.load('20240101-000000-default')
+        with tenancy.use_tenant('south'):
+            self.assertEqual(self.stored(), [])
+        self.assertEqual(self.stored(), ['20240101-000000-default'])
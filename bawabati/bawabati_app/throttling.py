@@ -0,0 +1,220 @@
+"""Login throttling.
+
+Every login attempt takes a token from two buckets, one keyed by client IP and
+one by the username *from that IP*. Successful logins give the tokens back, so
+a classroom full of students behind one NAT address is never throttled while a
+credential-stuffing burst drains the buckets after a few tries. Repeated
+failures for a username from one IP add an exponential backoff on top of the
+bucket, and a per-process semaphore caps how many password hashes can run at
+once so a burst cannot pin every CPU.
+
+The username limits are per client IP so that guessing someone's password from
+one address never locks them out from another: the owner of the account, with
+the right password, can always log in from their own address.
+
+Buckets live in process memory by default; set ``LOGIN_THROTTLE['STORE']`` to
+``'cache'`` to share them between workers through the default cache.
+
+Password hashes are upgraded on successful logins by ``check_password`` whenever
+the first entry of ``PASSWORD_HASHERS`` (or its iteration count) changes.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+
+from . import tenancy
+
+DEFAULTS = {
+    'ENABLED': True,
+    'STORE': 'memory',
+    # (burst capacity, tokens refilled per second)
+    'IP_RATE': (10, 0.1),
+    'USERNAME_RATE': (5, 0.1),
+    # Failures before backoff kicks in, then base * 2**n seconds up to the max
+    'BACKOFF_AFTER': 3,
+    'BACKOFF_BASE': 1,
+    'BACKOFF_MAX': 300,
+    # Concurrent password checks per process and how long to wait for a slot
+    'HASH_CONCURRENCY': 4,
+    'HASH_WAIT': 5,
+}
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Too many login attempts. Retry in {retry_after} seconds.')
+        self.retry_after = retry_after
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LOGIN_THROTTLE', {})}
+
+
+class MemoryStore:
+    """Thread-safe in-process key/value store with expiry."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        key = tenancy.scoped(key)
+        value, expires = self._data.get(key, (None, 0))
+        return value if expires >= time.monotonic() else None
+
+    def update(self, key, func, timeout):
+        """Atomically replace the value under ``key`` with ``func(old)``; return the result."""
+        key = tenancy.scoped(key)
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._data.get(key, (None, 0))
+            if expires < now:
+                value = None
+            new, result = func(value)
+            if new is None:
+                self._data.pop(key, None)
+            else:
+                self._data[key] = (new, now + timeout)
+            if len(self._data) > 10000:
+                self._data = {k: v for k, v in self._data.items() if v[1] >= now}
+            return result
+
+
+class CacheStore:
+    """Store backed by the default cache, shared between worker processes.
+
+    Updates are read-modify-write and therefore best effort under contention,
+    which is acceptable for throttling.
+    """
+    prefix = 'login-throttle:'
+
+    def get(self, key):
+        return cache.get(self.prefix + key)
+
+    def update(self, key, func, timeout):
+        key = self.prefix + key
+        new, result = func(cache.get(key))
+        if new is None:
+            cache.delete(key)
+        else:
+            cache.set(key, new, math.ceil(timeout))
+        return result
+
+
+_memory_store = MemoryStore()
+_cache_store = CacheStore()
+
+
+def get_store():
+    return _cache_store if get_config()['STORE'] == 'cache' else _memory_store
+
+
+def _take(store, key, capacity, rate, amount):
+    """Take ``amount`` tokens (negative to refund). Return seconds until allowed, 0 if allowed."""
+    now = time.time()
+
+    def func(state):
+        tokens, updated = state or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < amount:
+            return (tokens, now), math.ceil((amount - tokens) / rate)
+        return (min(capacity, tokens - amount), now), 0
+
+    return store.update(key, func, capacity / rate)
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _username_key(kind, request, username):
+    """Key of a per-username limit, which only applies to attempts from the same client IP."""
+    return f'{kind}:{client_ip(request)}:{(username or "").lower()}'
+
+
+def check_login(request, username):
+    """Charge a login attempt. Raise ``LoginThrottled`` if it must be refused."""
+    config = get_config()
+    if not config['ENABLED']:
+        return
+    store = get_store()
+
+    backoff = store.get(_username_key('backoff', request, username))
+    if backoff and backoff[1] > time.time():
+        raise LoginThrottled(math.ceil(backoff[1] - time.time()))
+
+    wait = _take(store, f'ip:{client_ip(request)}', *config['IP_RATE'], 1)
+    if wait:
+        raise LoginThrottled(wait)
+    wait = _take(store, _username_key('user', request, username), *config['USERNAME_RATE'], 1)
+    if wait:
+        _take(store, f'ip:{client_ip(request)}', *config['IP_RATE'], -1)
+        raise LoginThrottled(wait)
+
+
+def login_succeeded(request, username):
+    """Refund the attempt and clear any backoff for ``username`` from the client's IP."""
+    config = get_config()
+    if not config['ENABLED']:
+        return
+    store = get_store()
+    _take(store, f'ip:{client_ip(request)}', *config['IP_RATE'], -1)
+    _take(store, _username_key('user', request, username), *config['USERNAME_RATE'], -1)
+    store.update(_username_key('backoff', request, username), lambda state: (None, None), 0)
+
+
+def login_failed(request, username):
+    """Record a failed attempt and extend the backoff for ``username`` from the client's IP."""
+    config = get_config()
+    if not config['ENABLED']:
+        return
+
+    def func(state):
+        failures = (state[0] if state else 0) + 1
+        blocked_until = 0
+        if failures > config['BACKOFF_AFTER']:
+            delay = config['BACKOFF_BASE'] * 2 ** (failures - config['BACKOFF_AFTER'] - 1)
+            blocked_until = time.time() + min(delay, config['BACKOFF_MAX'])
+        return (failures, blocked_until), None
+
+    get_store().update(_username_key('backoff', request, username), func, config['BACKOFF_MAX'])
+
+
+_hash_slots = None
+_hash_slots_lock = threading.Lock()
+
+
+@contextmanager
+def password_check_slot():
+    """Limit the number of concurrent password checks in this process."""
+    global _hash_slots
+    config = get_config()
+    if not config['ENABLED']:
+        yield
+        return
+    with _hash_slots_lock:
+        if _hash_slots is None:
+            _hash_slots = threading.BoundedSemaphore(config['HASH_CONCURRENCY'])
+    if not _hash_slots.acquire(timeout=config['HASH_WAIT']):
+        raise LoginThrottled(1)
+    try:
+        yield
+    finally:
+        _hash_slots.release()
+
+
+def throttled_authenticate(request, username, password):
+    """``authenticate()`` behind the login throttle. Raises ``LoginThrottled``."""
+    check_login(request, username)
+    with password_check_slot():
+        user = authenticate(request, username=username, password=password)
+    if user is None:
+        login_failed(request, username)
+    else:
+        login_succeeded(request, username)
+    return user
@@ -0,0 +1,141 @@
+"""Stateless signed access/refresh tokens for the REST API.
+
+Tokens are HMAC-signed with ``SECRET_KEY`` through ``django.core.signing`` so
+they can be verified without touching the database. Each token carries the
+user's ``token_version``; bumping that counter (see ``revoke_tokens``) revokes
+every token issued before it. Deactivating a user or changing their role or
+staff flags bumps it too (see signals.py). The current version is read through
+the default cache for ``API_TOKEN_VERSION_CACHE_TIMEOUT`` seconds, so
+verification stays off the database on the hot path. ``revoke_tokens`` drops
+the cached version, which only reaches every worker at once when the default
+cache is shared between them; with a per-process cache, other workers accept
+revoked tokens until their cached version expires.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject
+
+from . import tenancy
+from .models import UserProfile
+
+ACCESS_SALT = 'bawabati_app.tokens.access'
+REFRESH_SALT = 'bawabati_app.tokens.refresh'
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(InvalidToken):
+    pass
+
+
+def _version_cache_key(user_id):
+    return f'token-version:{user_id}'
+
+
+def _version_cache_timeout():
+    return getattr(settings, 'API_TOKEN_VERSION_CACHE_TIMEOUT', 30)
+
+
+def get_token_version(user_id):
+    """Return the current token version for a user, or None if the user is gone."""
+    key = _version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = UserProfile.objects.filter(user_id=user_id).values_list('token_version', flat=True).first()
+        if version is None:
+            return None
+        cache.set(key, version, _version_cache_timeout())
+    return version
+
+
+def revoke_tokens(user):
+    """Invalidate every access and refresh token issued to ``user`` so far."""
+    UserProfile.objects.filter(user_id=user.pk).update(token_version=F('token_version') + 1)
+    cache.delete(_version_cache_key(user.pk))
+    # A profile loaded with the user would write the old version back when saved
+    state = user.__dict__.get('_state')
+    profile = state.fields_cache.get('userprofile') if state else None
+    if profile is not None:
+        profile.refresh_from_db(fields=['token_version'])
+
+
+def issue_tokens(user):
+    """Return a fresh access/refresh token pair for ``user``."""
+    version = get_token_version(user.pk) or 0
+    claims = {
+        'uid': user.pk,
+        'usr': user.username,
+        'stf': user.is_staff,
+        'su': user.is_superuser,
+        'ver': version,
+    }
+    return {
+        # Salted per tenant, so a token is only valid at the school that issued it
+        'access': signing.dumps(claims, salt=tenancy.scoped(ACCESS_SALT)),
+        'refresh': signing.dumps({'uid': user.pk, 'ver': version}, salt=tenancy.scoped(REFRESH_SALT)),
+        'access_expires_in': settings.API_TOKEN_ACCESS_LIFETIME,
+        'refresh_expires_in': settings.API_TOKEN_REFRESH_LIFETIME,
+    }
+
+
+def _load(token, salt, max_age):
+    try:
+        claims = signing.loads(token, salt=tenancy.scoped(salt), max_age=max_age)
+    except signing.SignatureExpired:
+        raise ExpiredToken('Token has expired.')
+    except signing.BadSignature:
+        raise InvalidToken('Invalid token.')
+    if claims.get('ver') != get_token_version(claims.get('uid')):
+        raise InvalidToken('Token has been revoked.')
+    return claims
+
+
+def verify_access_token(token):
+    """Check an access token's signature, age and version and return its claims."""
+    return _load(token, ACCESS_SALT, settings.API_TOKEN_ACCESS_LIFETIME)
+
+
+def verify_refresh_token(token):
+    """Check a refresh token's signature, age and version and return its claims."""
+    return _load(token, REFRESH_SALT, settings.API_TOKEN_REFRESH_LIFETIME)
+
+
+class TokenUser(SimpleLazyObject):
+    """User built from access-token claims.
+
+    Identity checks (``pk``, ``username``, ``is_staff``...) are answered from the
+    claims; the full ``User`` row (with its profile) is only loaded when a view
+    touches anything else.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    # Deactivation revokes the user's tokens, so a verified token's user is active
+    is_active = True
+
+    def __init__(self, claims):
+        user_id = claims['uid']
+        super().__init__(lambda: User.objects.select_related('userprofile').get(pk=user_id))
+        self.__dict__['claims'] = claims
+
+    @property
+    def pk(self):
+        return self.__dict__['claims']['uid']
+
+    id = pk
+
+    @property
+    def username(self):
+        return self.__dict__['claims']['usr']
+
+    @property
+    def is_staff(self):
+        return self.__dict__['claims']['stf']
+
+    @property
+    def is_superuser(self):
+        return self.__dict__['claims']['su']
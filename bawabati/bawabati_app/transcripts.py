@@ -0,0 +1,71 @@
+"""A student's grades across every course and semester.
+
+Built from exactly two queries: one for the grades and one for the reports.
+The report query also computes each semester's overall average in the
+database with a window function, so no per-course report recomputation
+happens on read.
+"""
+from django.db.models import Avg, DecimalField, F, Window
+from django.db.models.functions import Round
+
+from .models import Grade, GradeReport
+
+GRADE_FIELDS = ['id', 'course_id', 'semester', 'assessment_type', 'written_grade', 'participation',
+                'homework', 'final_grade', 'comments', 'updated_at']
+REPORT_FIELDS = ['course_id', 'course__title', 'semester', 'continuous_assessment_average', 'exam_grade',
+                 'final_average', 'updated_at']
+
+
+def build_transcript(student):
+    reports = (
+        GradeReport.objects
+        .filter(student=student)
+        .annotate(semester_average=Round(
+            Window(Avg('final_average'), partition_by=[F('semester')]), 2,
+            output_field=DecimalField(max_digits=4, decimal_places=2),
+        ))
+        .order_by('semester', 'course__title')
+        .values(*REPORT_FIELDS, 'semester_average')
+    )
+    grades = (
+        Grade.objects
+        .filter(student=student)
+        .order_by('semester', 'course_id', 'assessment_type')
+        .values(*GRADE_FIELDS, 'course__title')
+    )
+
+    semesters = {}
+    courses = {}
+
+    def semester_entry(semester):
+        if semester not in semesters:
+            semesters[semester] = {
+                'semester': semester,
+                'label': dict(Grade.SEMESTER_CHOICES).get(semester),
+                'average': None,
+                'courses': [],
+            }
+        return semesters[semester]
+
+    def course_entry(semester, course_id, title):
+        key = (semester, course_id)
+        if key not in courses:
+            courses[key] = {'course_id': course_id, 'course_title': title, 'report': None, 'grades': []}
+            semester_entry(semester)['courses'].append(courses[key])
+        return courses[key]
+
+    for report in reports:
+        semester_entry(report['semester'])['average'] = report.pop('semester_average')
+        course_entry(report['semester'], report['course_id'], report.pop('course__title'))['report'] = report
+    for grade in grades:
+        course_entry(grade['semester'], grade['course_id'], grade.pop('course__title'))['grades'].append(grade)
+
+    return {
+        'student': {
+            'id': student.id,
+            'username': student.username,
+            'first_name': student.first_name,
+            'last_name': student.last_name,
+        },
+        'semesters': [semesters[semester] for semester in sorted(semesters)],
+    }
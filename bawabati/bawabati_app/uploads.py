@@ -0,0 +1,226 @@
+"""Resumable note uploads.
+
+A client that cannot send a large file in one request (lecture recordings over
+campus Wi-Fi) instead:
+
+1. ``POST api/courses/<id>/uploads/`` with ``title``, ``filename``, ``size``
+   and optionally the ``sha256`` of the whole file, and gets an upload id and
+   the ``chunk_size`` to use;
+2. ``PUT api/uploads/<id>/chunks/<n>/`` every chunk, numbered from 0, as the
+   raw request body with its hex SHA-256 in the ``X-Chunk-SHA256`` header.
+   A chunk may be sent again, in any order;
+3. after an interruption, ``GET api/uploads/<id>/`` lists the chunks already
+   received, so only the missing ones are sent again;
+4. ``POST api/uploads/<id>/complete/`` joins the chunks into the note's file.
+
+Chunks are streamed from the request to a file in ``UPLOADS['DIR']`` and
+never held in memory whole. Sessions untouched for ``MAX_AGE_HOURS`` are
+removed by ``manage.py purge_uploads``.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import tenancy
+from .models import Note, UploadSession
+
+DEFAULTS = {
+    'DIR': os.path.join(settings.MEDIA_ROOT, 'uploads'),
+    'CHUNK_SIZE': 8 * 1024 * 1024,
+    'MAX_SIZE': 2 * 1024 * 1024 * 1024,
+    'MAX_AGE_HOURS': 24,
+}
+
+CHECKSUM_HEADER = 'HTTP_X_CHUNK_SHA256'
+
+# Bytes read from the request or a chunk at a time
+READ_SIZE = 64 * 1024
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'UPLOADS', {})}
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def session_dir(session):
+    return os.path.join(tenancy.tenant_path(get_config()['DIR']), str(session.pk))
+
+
+def _chunk_path(session, index):
+    return os.path.join(session_dir(session), f'{index:06d}.part')
+
+
+def received_chunks(session):
+    try:
+        names = os.listdir(session_dir(session))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-5]) for name in names if name.endswith('.part'))
+
+
+def describe(session):
+    received = [] if session.is_complete else received_chunks(session)
+    return {
+        'id': str(session.pk),
+        'title': session.title,
+        'filename': session.filename,
+        'size': session.size,
+        'sha256': session.sha256,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'received': received,
+        'missing': sorted(set(range(session.chunk_count)) - set(received)) if not session.is_complete else [],
+        'note': session.note_id,
+        'updated_at': session.updated_at,
+    }
+
+
+def _checksum(value, name):
+    value = (value or '').strip().lower()
+    if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+        raise UploadError(f'{name} must be a hex SHA-256 digest.')
+    return value
+
+
+def start(course, user, title, filename, size, sha256=''):
+    config = get_config()
+    filename = os.path.basename(str(filename or '').replace('\\', '/'))
+    if not title:
+        raise UploadError('Note title is required')
+    if not filename:
+        raise UploadError('filename is required')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size must be the file size in bytes.')
+    if not 0 < size <= config['MAX_SIZE']:
+        raise UploadError(f"size must be between 1 and {config['MAX_SIZE']} bytes.", status=413 if size > 0 else 400)
+    return UploadSession.objects.create(
+        course=course, uploaded_by=user, title=title, filename=filename, size=size,
+        chunk_size=config['CHUNK_SIZE'], sha256=_checksum(sha256, 'sha256') if sha256 else '',
+    )
+
+
+def write_chunk(session, index, stream, content_length, checksum):
+    """Stream one chunk of ``content_length`` bytes from ``stream`` to disk, checking its SHA-256."""
+    if session.is_complete:
+        raise UploadError('This upload is already complete.', status=409)
+    if not 0 <= index < session.chunk_count:
+        raise UploadError(f'Chunks are numbered from 0 to {session.chunk_count - 1}.', status=404)
+    checksum = _checksum(checksum, 'The X-Chunk-SHA256 header')
+    expected = session.chunk_length(index)
+    if content_length is None:
+        raise UploadError('Content-Length is required.', status=411)
+    if content_length != expected:
+        raise UploadError(f'Chunk {index} must be {expected} bytes, not {content_length}.')
+
+    directory = session_dir(session)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        remaining = expected
+        with os.fdopen(fd, 'wb') as f:
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise UploadError(f'Chunk {index} was cut short; send it again.')
+                digest.update(data)
+                f.write(data)
+                remaining -= len(data)
+        if digest.hexdigest() != checksum:
+            raise UploadError(f'Chunk {index} does not match its checksum; send it again.')
+        # Written under a temporary name first, so a chunk on disk is always whole
+        os.replace(tmp_path, _chunk_path(session, index))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+
+
+class AssembledFile(File):
+    """A file already on disk; the file system storage moves it rather than copying it."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _assemble(session):
+    """Join the chunks into one file in the session directory and return its path."""
+    path = os.path.join(session_dir(session), 'assembled')
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for index in range(session.chunk_count):
+            with open(_chunk_path(session, index), 'rb') as chunk:
+                while data := chunk.read(READ_SIZE):
+                    digest.update(data)
+                    out.write(data)
+    if session.sha256 and digest.hexdigest() != session.sha256:
+        os.remove(path)
+        raise UploadError('The assembled file does not match the upload checksum.', status=422)
+    return path
+
+
+def complete(session):
+    """Create the note from the received chunks; completing twice returns the same note."""
+    with transaction.atomic(using=tenancy.db_alias()):
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.is_complete:
+            return session.note
+        missing = sorted(set(range(session.chunk_count)) - set(received_chunks(session)))
+        if missing:
+            raise UploadError(f'Chunks {missing[:20]} have not been received.', status=409)
+        path = _assemble(session)
+        with open(path, 'rb') as f:
+            note = Note(course=session.course, title=session.title, uploaded_by=session.uploaded_by)
+            note.file.save(session.filename, AssembledFile(f, name=path), save=False)
+        note.save()
+        session.note = note
+        session.save(update_fields=['note', 'updated_at'])
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    return note
+
+
+def abort(session):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    session.delete()
+
+
+def collect_garbage(max_age_hours=None):
+    """Remove sessions untouched for ``max_age_hours`` and chunk directories without a session."""
+    config = get_config()
+    cutoff = timezone.now() - timedelta(hours=config['MAX_AGE_HOURS'] if max_age_hours is None else max_age_hours)
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in stale:
+        shutil.rmtree(session_dir(session), ignore_errors=True)
+    UploadSession.objects.filter(pk__in=[session.pk for session in stale]).delete()
+
+    orphans = 0
+    directory = tenancy.tenant_path(config['DIR'])
+    if os.path.isdir(directory):
+        known = {str(pk) for pk in UploadSession.objects.values_list('pk', flat=True)}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            # The default tenant's directory also holds the other tenants' ones
+            if (name not in known and name != 'tenants' and os.path.isdir(path)
+                    and os.path.getmtime(path) < cutoff.timestamp()):
+                shutil.rmtree(path, ignore_errors=True)
+                orphans += 1
+    return {
+        'sessions': len(stale),
+        'incomplete': sum(not session.is_complete for session in stale),
+        'orphan_dirs': orphans,
+    }
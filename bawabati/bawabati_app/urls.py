@@ -1,5 +1,4 @@
 from django.urls import path, include
-from django.contrib.auth import views as auth_views
 from django.contrib.auth import logout as auth_logout
 from django.shortcuts import redirect
 from rest_framework.routers import DefaultRouter
@@ -17,7 +16,7 @@ router.register(r'users', api_views.UserViewSet)
 urlpatterns = [
     # Authentication URLs
     path('register/', views.register, name='register'),
-    path('login/', auth_views.LoginView.as_view(template_name='bawabati_app/login.html'), name='login'),
+    path('login/', views.ThrottledLoginView.as_view(), name='login'),
     path('logout/', logout_view, name='logout'),
     
     # Dashboard & Profile
@@ -54,6 +53,8 @@ urlpatterns = [
     path('api/auth/register/', api_views.register_user, name='api_register'),
     path('api/auth/login/', api_views.login_user, name='api_login'),
     path('api/auth/logout/', api_views.logout_user, name='api_logout'),
+    path('api/auth/token/refresh/', api_views.refresh_token, name='api_token_refresh'),
+    path('api/auth/token/revoke/', api_views.revoke_user_tokens, name='api_token_revoke'),
     path('api/auth/user/', api_views.get_current_user, name='api_current_user'),
     path('api/users/profile/', api_views.update_profile, name='api_update_profile'),
     path('api/dashboard/admin/', api_views.admin_dashboard_data, name='api_admin_dashboard'),
@@ -63,12 +64,39 @@ urlpatterns = [
     path('api/courses/<int:pk>/', api_views.course_detail, name='api_course_detail'),
     path('api/courses/add/', api_views.create_course, name='api_create_course'),
     path('api/courses/<int:pk>/edit/', api_views.update_course, name='api_update_course'),
+    # Used by the frontend, previously only reachable through the duplicate api/ mount
+    path('api/courses/<int:pk>/enroll/', views.enroll_course, name='api_enroll_course'),
     path('api/courses/<int:course_id>/notes/', api_views.list_notes, name='api_list_notes'),
     path('api/courses/<int:course_id>/notes/upload/', api_views.upload_note, name='api_upload_note'),
     path('api/notes/<int:note_id>/', api_views.delete_note, name='api_delete_note'),
+    path('api/courses/<int:course_id>/uploads/', api_views.start_upload, name='api_start_upload'),
+    path('api/uploads/<uuid:upload_id>/', api_views.upload_detail, name='api_upload_detail'),
+    path('api/uploads/<uuid:upload_id>/chunks/<int:index>/', api_views.upload_chunk, name='api_upload_chunk'),
+    path('api/uploads/<uuid:upload_id>/complete/', api_views.complete_upload, name='api_complete_upload'),
     path('api/teachers/', api_views.list_teachers, name='api_list_teachers'),
     path('api/students/', api_views.list_students, name='api_list_students'),
+    path('api/students/search/', api_views.search_students, name='api_search_students'),
+    path('api/students/me/transcript/', api_views.student_transcript, name='api_student_transcript'),
     path('api/courses/<int:course_id>/grades/', api_views.list_grades, name='api_list_grades'),
     path('api/courses/<int:course_id>/students/<int:student_id>/grades/', api_views.add_grade, name='api_add_grade'),
+    path('api/courses/<int:course_id>/grades/export/', api_views.export_grades, name='api_export_grades'),
+    path('api/courses/<int:course_id>/grades/history/', api_views.grades_as_of, name='api_grades_as_of'),
+    path('api/courses/<int:course_id>/rankings/', api_views.course_rankings, name='api_course_rankings'),
+    path('api/courses/<int:course_id>/grading/preview/', api_views.preview_grading_policy, name='api_preview_grading_policy'),
+    path('api/grades/<int:grade_id>/history/', api_views.grade_change_history, name='api_grade_change_history'),
+    path('api/courses/<int:course_id>/reports/export/', api_views.export_reports, name='api_export_reports'),
+    path('api/enrollments/export/', api_views.export_enrollments, name='api_export_enrollments'),
+    path('api/report-cards/', api_views.generate_report_cards, name='api_generate_report_cards'),
+    path('api/report-cards/<str:name>/', api_views.download_report_cards, name='api_download_report_cards'),
+    path('api/jobs/<str:job_id>/', api_views.job_status, name='api_job_status'),
+    path('api/db/stats/', api_views.database_stats, name='api_database_stats'),
+    path('api/cache/stats/', api_views.cache_stats, name='api_cache_stats'),
+    path('api/metrics/', api_views.metrics_view, name='api_metrics'),
+    path('api/events/', api_views.event_stream, name='api_event_stream'),
+    path('api/batch/', api_views.batch_requests, name='api_batch'),
+    path('api/archive/courses/', api_views.archived_course_list, name='api_archived_course_list'),
+    path('api/archive/courses/<int:pk>/', api_views.archived_course_detail, name='api_archived_course_detail'),
+    path('api/archive/rollover/', api_views.rollover_courses, name='api_rollover_courses'),
+    path('api/profiling/token/', api_views.profiling_token, name='api_profiling_token'),
     path('api/', include(router.urls)),
 ] 
\ No newline at end of file
@@ -2,11 +2,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.contrib.auth import views as auth_views
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.http import HttpResponseForbidden
 from .models import UserProfile, Course, Note, Enrollment, Grade, GradeReport
 from .forms import UserProfileForm, CourseForm, NoteForm, UserCreateForm, GradeForm
+from .grade_history import recording
+from .rankings import rankings_by_semester
+from .throttling import LoginThrottled, check_login, login_failed, login_succeeded, password_check_slot
 from django.contrib.auth import login
 from django.contrib import messages
 
@@ -56,6 +60,29 @@ def register(request):
         form = UserCreateForm()
     return render(request, 'bawabati_app/register.html', {'form': form})
 
+class ThrottledLoginView(auth_views.LoginView):
+    template_name = 'bawabati_app/login.html'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            check_login(request, request.POST.get('username'))
+            with password_check_slot():
+                return super().post(request, *args, **kwargs)
+        except LoginThrottled as e:
+            # Unbound form so rendering it does not trigger another password check
+            context = self.get_context_data(form=self.form_class(request), retry_after=e.retry_after)
+            response = self.render_to_response(context, status=429)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+
+    def form_valid(self, form):
+        login_succeeded(self.request, form.get_user().username)
+        return super().form_valid(form)
+
+    def form_invalid(self, form):
+        login_failed(self.request, self.request.POST.get('username'))
+        return super().form_invalid(form)
+
 @login_required
 def dashboard(request):
     user = request.user
@@ -129,7 +156,15 @@ class UserUpdateView(AdminRequiredMixin, UpdateView):
     template_name = 'bawabati_app/user_form.html'
     success_url = reverse_lazy('user_list')
 
-class UserDeleteView(AdminRequiredMixin, DeleteView):
+class GradeCascadeDeleteMixin:
+    """Batch the change log entries of the grades a delete cascades to."""
+    def form_valid(self, form):
+        # A user deleting their own account cannot be referenced by the log
+        deleted_by = None if self.object == self.request.user else self.request.user.pk
+        with recording(changed_by_id=deleted_by):
+            return super().form_valid(form)
+
+class UserDeleteView(AdminRequiredMixin, GradeCascadeDeleteMixin, DeleteView):
     model = User
     template_name = 'bawabati_app/user_confirm_delete.html'
     success_url = reverse_lazy('user_list')
@@ -186,7 +221,7 @@ class CourseUpdateView(AdminRequiredMixin, UpdateView):
     template_name = 'bawabati_app/course_form.html'
     success_url = reverse_lazy('course_list')
 
-class CourseDeleteView(AdminRequiredMixin, DeleteView):
+class CourseDeleteView(AdminRequiredMixin, GradeCascadeDeleteMixin, DeleteView):
     model = Course
     template_name = 'bawabati_app/course_confirm_delete.html'
     success_url = reverse_lazy('course_list')
@@ -443,11 +478,14 @@ def view_grades(request, course_pk):
     else:
         reports = GradeReport.objects.filter(course=course)
     
+    staff = is_teacher(request.user) or is_admin(request.user)
     context = {
         'course': course,
         'grades': grades,
         'reports': reports,
-        'is_teacher': is_teacher(request.user) or is_admin(request.user),
+        'is_teacher': staff,
+        # Ranks are shown to the course staff only
+        'rankings': rankings_by_semester(course.pk) if staff else {},
     }
     
     return render(request, 'bawabati_app/grade_list.html', context) 
\ No newline at end of file
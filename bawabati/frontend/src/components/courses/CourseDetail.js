@@ -2,6 +2,8 @@ import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import axios from 'axios';
 import NoteForm from '../notes/NoteForm';
+import { batchResponses } from '../../utils/batch';
+import { subscribeToUpdates } from '../../utils/events';
 
 const CourseDetail = () => {
   const { id } = useParams();
@@ -11,10 +13,34 @@ const CourseDetail = () => {
   const [error, setError] = useState('');
 
   useEffect(() => {
-    fetchCourseDetails();
-    fetchNotes();
+    fetchCourseAndNotes();
+    // Reload the notes when one is added or removed in this course
+    return subscribeToUpdates((type, data) => {
+      if (String(data.course_id) === String(id)) {
+        fetchNotes();
+      }
+    }, ['note']);
   }, [id]);
 
+  // Initial load: the course and its notes in one batched request
+  const fetchCourseAndNotes = async () => {
+    try {
+      const [courseRes, notesRes] = await batchResponses([`/api/courses/${id}/`, `/api/courses/${id}/notes/`]);
+      if (courseRes.status >= 400) {
+        throw new Error(`Course request failed with status ${courseRes.status}`);
+      }
+      setCourse(courseRes.body);
+      if (notesRes.status < 400) {
+        setNotes(notesRes.body);
+      }
+    } catch (error) {
+      setError('Failed to load course details. Please try again.');
+      console.error('Error fetching course details:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const fetchCourseDetails = async () => {
     try {
       const response = await axios.get(`/api/courses/${id}/`);
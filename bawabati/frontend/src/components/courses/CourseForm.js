@@ -1,7 +1,9 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { batchRequests } from '../../utils/batch';
 import { useNavigate, useParams } from 'react-router-dom';
 import { getCSRFToken } from '../../utils/csrf';
+import StudentPicker from './StudentPicker';
 
 const CourseForm = ({ isEdit = false }) => {
   const { id } = useParams();
@@ -16,71 +18,64 @@ const CourseForm = ({ isEdit = false }) => {
     end_date: ''
   });
   const [teachers, setTeachers] = useState([]);
-  const [students, setStudents] = useState([]);
+  // Ids enrolled when the course was loaded, to send only the changes
+  const [initialStudentIds, setInitialStudentIds] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
 
   useEffect(() => {
-    fetchTeachers();
-    fetchStudents();
-    if (isEdit && id) {
-      fetchCourse();
-    }
+    fetchFormData();
     // eslint-disable-next-line
   }, [id, isEdit]);
 
-  const fetchTeachers = async () => {
-    try {
-      const res = await axios.get('/api/teachers/');
-      setTeachers(res.data);
-    } catch (err) {
-      setError('Failed to load teachers.');
-    }
-  };
-
-  const fetchStudents = async () => {
-    try {
-      const res = await axios.get('/api/students/');
-      setStudents(res.data);
-    } catch (err) {
-      setError('Failed to load students.');
+  // Teachers and the edited course come back in one batched request; students are searched as needed
+  const fetchFormData = async () => {
+    const editing = isEdit && id;
+    if (editing) {
+      setLoading(true);
     }
-  };
-
-  const fetchCourse = async () => {
-    setLoading(true);
     try {
-      const res = await axios.get(`/api/courses/${id}/`);
-      setFormData({
-        title: res.data.title || '',
-        description: res.data.description || '',
-        specialisation: res.data.specialisation || '',
-        capacity: res.data.capacity || 30,
-        assigned_teacher: res.data.assigned_teacher?.id || '',
-        students: res.data.enrolled_students ? res.data.enrolled_students.map(s => s.id) : [],
-        end_date: res.data.end_date || ''
-      });
+      const paths = ['/api/teachers/'];
+      if (editing) {
+        paths.push(`/api/courses/${id}/`);
+      }
+      const [teacherList, course] = await batchRequests(paths);
+      setTeachers(teacherList);
+      if (course) {
+        const enrolled = course.enrolled_students || [];
+        setInitialStudentIds(enrolled.map(s => s.id));
+        setFormData({
+          title: course.title || '',
+          description: course.description || '',
+          specialisation: course.specialisation || '',
+          capacity: course.capacity || 30,
+          assigned_teacher: course.assigned_teacher?.id || '',
+          students: enrolled,
+          end_date: course.end_date || ''
+        });
+      }
     } catch (err) {
-      setError('Failed to load course data.');
+      setError(editing ? 'Failed to load course data.' : 'Failed to load teachers.');
     } finally {
       setLoading(false);
     }
   };
 
   const handleChange = (e) => {
-    const { name, value, type, selectedOptions } = e.target;
-    if (type === 'select-multiple') {
-      setFormData({
-        ...formData,
-        [name]: Array.from(selectedOptions, option => option.value)
-      });
-    } else {
-      setFormData({
-        ...formData,
-        [name]: value
-      });
-    }
+    const { name, value } = e.target;
+    setFormData({
+      ...formData,
+      [name]: value
+    });
+  };
+
+  const addStudent = (student) => {
+    setFormData((data) => ({ ...data, students: [...data.students, student] }));
+  };
+
+  const removeStudent = (student) => {
+    setFormData((data) => ({ ...data, students: data.students.filter(s => s.id !== student.id) }));
   };
 
   const handleSubmit = async (e) => {
@@ -89,11 +84,14 @@ const CourseForm = ({ isEdit = false }) => {
     setError('');
     setSuccess('');
     try {
+      // Only the enrollment changes are sent, not the whole roster
+      const studentIds = formData.students.map(s => s.id);
       const payload = {
         ...formData,
         capacity: Number(formData.capacity),
         assigned_teacher_id: Number(formData.assigned_teacher),
-        student_ids: formData.students.map(Number),
+        add_student_ids: studentIds.filter(studentId => !initialStudentIds.includes(studentId)),
+        remove_student_ids: initialStudentIds.filter(studentId => !studentIds.includes(studentId)),
       };
       delete payload.assigned_teacher;
       delete payload.students;
@@ -153,11 +151,7 @@ const CourseForm = ({ isEdit = false }) => {
         </div>
         <div className="mb-3">
           <label className="form-label">Enroll Students</label>
-          <select className="form-select" name="students" value={formData.students} onChange={handleChange} multiple>
-            {students.map(student => (
-              <option key={student.id} value={student.id}>{student.first_name} {student.last_name} ({student.username})</option>
-            ))}
-          </select>
+          <StudentPicker selected={formData.students} onAdd={addStudent} onRemove={removeStudent} />
         </div>
         <button type="submit" className="btn btn-primary" disabled={loading}>
           {loading ? 'Saving...' : (isEdit ? 'Update Course' : 'Create Course')}
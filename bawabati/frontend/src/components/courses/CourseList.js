@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
+import { catalogueEnabled, loadCourses } from '../../utils/catalogue';
 
 const CourseList = () => {
   const [courses, setCourses] = useState([]);
@@ -17,6 +18,15 @@ const CourseList = () => {
     try {
       setLoading(true);
       setError('');
+      if (catalogueEnabled) {
+        try {
+          setCourses(await loadCourses(selectedSpecialisation));
+          return;
+        } catch (catalogueError) {
+          // Not published or not reachable: the API has the same courses
+          console.warn('Falling back to the API:', catalogueError);
+        }
+      }
       const url = selectedSpecialisation 
         ? `/api/courses/?specialisation=${selectedSpecialisation}`
         : '/api/courses/';
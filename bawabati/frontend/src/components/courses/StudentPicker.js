@@ -0,0 +1,102 @@
+import React, { useState, useEffect, useRef } from 'react';
+import axios from 'axios';
+
+const DEBOUNCE_MS = 250;
+
+export const studentLabel = (student) => {
+  const name = `${student.first_name || ''} ${student.last_name || ''}`.trim();
+  return name ? `${name} (${student.username})` : student.username;
+};
+
+// Search-as-you-type picker over /api/students/search/: only the chosen
+// students and one page of matches are ever loaded.
+const StudentPicker = ({ selected, onAdd, onRemove }) => {
+  const [query, setQuery] = useState('');
+  const [results, setResults] = useState([]);
+  const [next, setNext] = useState(null);
+  const [error, setError] = useState('');
+  // Answers to older queries arriving late are dropped
+  const request = useRef(0);
+
+  const search = async (term, after = null) => {
+    const current = ++request.current;
+    try {
+      const params = { q: term };
+      if (after) {
+        params.after = after;
+      }
+      const response = await axios.get('/api/students/search/', { params });
+      if (current !== request.current) {
+        return;
+      }
+      setResults((previous) => (after ? [...previous, ...response.data.results] : response.data.results));
+      setNext(response.data.next);
+      setError('');
+    } catch (err) {
+      if (current === request.current) {
+        setError('Failed to search students.');
+      }
+    }
+  };
+
+  useEffect(() => {
+    const term = query.trim();
+    if (!term) {
+      request.current++;
+      setResults([]);
+      setNext(null);
+      return undefined;
+    }
+    const timer = setTimeout(() => search(term), DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line
+  }, [query]);
+
+  const chosen = new Set(selected.map((student) => student.id));
+
+  return (
+    <div>
+      {selected.length > 0 && (
+        <ul className="list-group mb-2">
+          {selected.map((student) => (
+            <li key={student.id} className="list-group-item d-flex justify-content-between align-items-center">
+              {studentLabel(student)}
+              <button type="button" className="btn btn-sm btn-outline-danger" onClick={() => onRemove(student)}>
+                Remove
+              </button>
+            </li>
+          ))}
+        </ul>
+      )}
+      <input
+        type="search"
+        className="form-control"
+        placeholder="Search students by name, username or email"
+        value={query}
+        onChange={(e) => setQuery(e.target.value)}
+        onKeyDown={(e) => e.key === 'Enter' && e.preventDefault()}
+      />
+      {error && <div className="text-danger small mt-1">{error}</div>}
+      <div className="list-group mt-1">
+        {results.map((student) => (
+          <button
+            key={student.id}
+            type="button"
+            className="list-group-item list-group-item-action"
+            disabled={chosen.has(student.id)}
+            onClick={() => onAdd(student)}
+          >
+            {studentLabel(student)}
+          </button>
+        ))}
+      </div>
+      {next && (
+        <button type="button" className="btn btn-link btn-sm" onClick={() => search(query.trim(), next)}>
+          More students
+        </button>
+      )}
+    </div>
+  );
+};
+
+export default StudentPicker;
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { subscribeToUpdates } from '../../utils/events';
 
 const GradeList = () => {
   const { id } = useParams();
@@ -43,6 +44,12 @@ const GradeList = () => {
       }
     };
     fetchData();
+    // Reload when a grade of this course changes
+    return subscribeToUpdates((type, data) => {
+      if (String(data.course_id) === String(id)) {
+        fetchData();
+      }
+    }, ['grade', 'grade_report']);
   }, [id]);
 
   const getAssessmentTypeLabel = (type) => {
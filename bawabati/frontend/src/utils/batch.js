@@ -0,0 +1,25 @@
+import axios from 'axios';
+import { getCSRFToken } from './csrf';
+
+// Run several API calls in one round trip through /api/batch/.
+// Each entry is a path string (GET) or { method, path, body }; resolves to
+// [{ id, status, body }] in the same order.
+export async function batchResponses(requests) {
+  const payload = requests.map((request) => (typeof request === 'string' ? { path: request } : request));
+  const res = await axios.post('/api/batch/', { requests: payload }, {
+    headers: { 'X-CSRFToken': getCSRFToken() }
+  });
+  return res.data.responses;
+}
+
+// Like batchResponses, but resolves to the bodies and rejects if any call failed.
+export async function batchRequests(requests) {
+  const responses = await batchResponses(requests);
+  const failed = responses.find((response) => response.status >= 400);
+  if (failed) {
+    const error = new Error(`Batched request ${failed.id} failed with status ${failed.status}`);
+    error.response = { status: failed.status, data: failed.body };
+    throw error;
+  }
+  return responses.map((response) => response.body);
+}
@@ -0,0 +1,43 @@
+// Read the published course catalogue (see bawabati_app/catalogue.py) from
+// wherever it is hosted: REACT_APP_CATALOGUE_URL, or /catalogue/ on this site.
+// Every school's site uses the same URL; the server answers with the
+// catalogue of the school the host belongs to.
+// Set REACT_APP_CATALOGUE_URL to an empty string to always use the API.
+const CATALOGUE_URL = process.env.REACT_APP_CATALOGUE_URL ?? '/catalogue/';
+
+export const catalogueEnabled = Boolean(CATALOGUE_URL);
+
+const baseURL = CATALOGUE_URL.endsWith('/') ? CATALOGUE_URL : `${CATALOGUE_URL}/`;
+// Shards are named after their content, so each is fetched once per page load
+const shards = new Map();
+
+async function fetchJSON(path, options) {
+  const res = await fetch(`${baseURL}${path}`, options);
+  if (!res.ok) {
+    throw new Error(`Catalogue ${path} returned ${res.status}`);
+  }
+  return res.json();
+}
+
+// The manifest: specialisations with their shard paths, teachers and totals.
+// Revalidated on every call, as it changes whenever a course does.
+export function loadCatalogue() {
+  return fetchJSON('catalogue.json', { cache: 'no-cache' });
+}
+
+function loadShard(entry) {
+  if (!shards.has(entry.json)) {
+    const request = fetchJSON(entry.json).then((shard) => shard.courses);
+    request.catch(() => shards.delete(entry.json));
+    shards.set(entry.json, request);
+  }
+  return shards.get(entry.json);
+}
+
+// The courses of one specialisation, or of all of them when it is empty.
+export async function loadCourses(specialisation = '') {
+  const manifest = await loadCatalogue();
+  const entries = manifest.specialisations.filter((entry) => !specialisation || entry.name === specialisation);
+  const courses = await Promise.all(entries.map(loadShard));
+  return courses.flat();
+}
@@ -0,0 +1,14 @@
+import axios from 'axios';
+
+// Subscribe to live grade and note updates pushed by /api/events/.
+// Calls onEvent(type, data) for each event and returns a function that closes the stream.
+export function subscribeToUpdates(onEvent, types = ['grade', 'grade_report', 'note']) {
+  if (typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  const source = new EventSource(`${axios.defaults.baseURL || ''}/api/events/`, { withCredentials: true });
+  types.forEach((type) => {
+    source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+  });
+  return () => source.close();
+}